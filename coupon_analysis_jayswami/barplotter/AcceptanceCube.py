@@ -0,0 +1,217 @@
+"""
+AcceptanceCube Module
+---------------------
+
+Precomputed accept/reject counts for every column and every column pair of a dataset.
+
+The notebook calls the BarPlotter functions over and over on the same data (`df_cleaned`, `coffee_df`, the
+per-passenger `df_list`), and every call groups the rows again. An AcceptanceCube scans the data once and keeps
+dense count arrays for each single column and each column pair, optionally split by a slice column such as
+`coupon`. Every grid panel, filter bar or overall bar is then answered by indexing those arrays, so a report costs
+time proportional to the number of panels instead of panels x rows.
+
+Views narrow a cube down with equality conditions and can be passed to the BarPlotter functions in place of a
+DataFrame:
+
+    cube = AcceptanceCube(df_cleaned, slice_by='coupon')
+    coffee = cube.where(coupon='Coffee House')
+    grid_image64, grid_df = create_subplot_grid(coffee, columns_to_plot, 'Coffee House Coupon Acceptance Rates', 45)
+    df_list = [coffee.where(passenger=passenger) for passenger in ['Alone', 'Friend(s)', 'Partner', 'Kid(s)']]
+
+A query may involve at most two columns besides the slice column (grouping columns plus conditions), since that is
+what the cube stores.
+"""
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceStats import TARGET_COLUMN, _as_list, _target_codes, table_from_counts
+
+
+class CubeView:
+    """
+    A read-only view of an AcceptanceCube restricted by equality conditions.
+
+    Parameters:
+    - cube (AcceptanceCube): The cube holding the counts.
+    - conditions (dict, optional): Mapping of column name to the value rows must have. Default is None.
+    """
+
+    def __init__(self, cube, conditions=None):
+        self.cube = cube
+        self.conditions = dict(conditions or {})
+
+    def __repr__(self):
+        return f'{type(self).__name__}(rows={self.cube.n_rows}, conditions={self.conditions})'
+
+    def where(self, conditions=None, **column_values):
+        """
+        Returns a narrower view with additional equality conditions.
+
+        Parameters:
+        - conditions (dict, optional): Mapping of column name to value, for column names that are not valid
+          keyword arguments.
+        - **column_values: Column name to value conditions.
+
+        Returns:
+        - CubeView: The combined view.
+        """
+        combined = dict(self.conditions)
+        combined.update(conditions or {})
+        combined.update(column_values)
+        return CubeView(self.cube, combined)
+
+    def acceptance_table(self, grouping_columns, ordering=None):
+        """
+        Looks up acceptance counts and percentages for every category of the grouping column(s).
+
+        Parameters:
+        - grouping_columns (str or list): One or two column names.
+        - ordering (list, optional): Specific order for the categories. Default is None.
+
+        Returns:
+        - DataFrame: Same layout as AcceptanceStats.acceptance_table.
+        """
+        grouping_columns = _as_list(grouping_columns)
+        counts = self.cube._lookup(grouping_columns, self.conditions)
+        flat = counts.reshape(-1, 2)
+        total = flat.sum(axis=1)
+        observed = np.flatnonzero(total > 0)
+
+        shape = counts.shape[:-1]
+        positions = np.unravel_index(observed, shape)
+        level_uniques = [self.cube.uniques[column] for column in grouping_columns]
+        if len(grouping_columns) == 1:
+            index = pd.Index(level_uniques[0].take(positions[0]), name=grouping_columns[0])
+        else:
+            index = pd.MultiIndex.from_arrays([uniques.take(codes) for uniques, codes in zip(level_uniques, positions)],
+                                              names=grouping_columns)
+        return table_from_counts(index, total[observed], flat[observed, 1], flat[observed, 0], ordering)
+
+    def acceptance_counts(self):
+        """
+        Returns the overall counts of the view as (total_count, accept_count, reject_count).
+        """
+        counts = self.cube._lookup([], self.conditions)
+        return int(counts.sum()), int(counts[1]), int(counts[0])
+
+
+class AcceptanceCube(CubeView):
+    """
+    Accept/reject counts for every column and column pair of a dataset, built in one pass per pair.
+
+    Parameters:
+    - df (DataFrame): The dataset, containing the target column.
+    - columns (list, optional): Columns to include. Default is every column except the target.
+    - slice_by (str, optional): Column whose values split every count array, e.g. 'coupon'. Default is None.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+    """
+
+    def __init__(self, df, columns=None, slice_by=None, target_column=TARGET_COLUMN):
+        super().__init__(self)
+        if columns is None:
+            columns = df.columns
+        self.columns = [column for column in columns if column not in (target_column, slice_by)]
+        self.slice_by = slice_by
+        self.n_rows = len(df)
+
+        y = _target_codes(df[target_column].to_numpy()).astype(np.int64)
+        valid = (y == 0) | (y == 1)
+
+        # Encode every column once; codes are shared by all the single and pair arrays
+        self.codes = {}
+        self.uniques = {}
+        for column in set(self.columns) | ({slice_by} if slice_by else set()):
+            codes, uniques = pd.factorize(df[column], sort=True)
+            self.codes[column] = codes
+            self.uniques[column] = uniques
+
+        if slice_by:
+            slice_codes = self.codes[slice_by].astype(np.int64)
+            n_slices = len(self.uniques[slice_by])
+            valid &= slice_codes >= 0
+        else:
+            slice_codes = np.zeros(self.n_rows, dtype=np.int64)
+            n_slices = 1
+        self._n_slices = n_slices
+
+        self._totals = np.bincount(slice_codes[valid] * 2 + y[valid], minlength=n_slices * 2).reshape(n_slices, 2)
+        self._arrays = {}
+        for column in self.columns:
+            self._arrays[(column,)] = self._count(slice_codes, y, valid, [column])
+        for pair in combinations(self.columns, 2):
+            self._arrays[pair] = self._count(slice_codes, y, valid, list(pair))
+
+        # The raw codes are only needed while building
+        del self.codes
+
+    def _count(self, slice_codes, y, valid, columns):
+        # One bincount over (slice, code_1, ..., code_k, Y) for the given columns
+        key = slice_codes.copy()
+        keep = valid.copy()
+        shape = [self._n_slices]
+        for column in columns:
+            codes = self.codes[column]
+            size = len(self.uniques[column])
+            keep &= codes >= 0
+            key = key * size + codes
+            shape.append(size)
+        key = key * 2 + y
+        return np.bincount(key[keep], minlength=int(np.prod(shape)) * 2).reshape(shape + [2])
+
+    def _lookup(self, grouping_columns, conditions):
+        """
+        Returns counts shaped (*category counts of grouping_columns, 2) for rows matching the conditions.
+        """
+        stored = [column for column in dict.fromkeys(list(grouping_columns) + list(conditions))
+                  if column != self.slice_by]
+        if len(stored) > 2:
+            raise ValueError(f"An AcceptanceCube answers at most two columns per query besides the slice column, "
+                             f"got {stored}")
+        unknown = [column for column in stored if column not in self.columns]
+        if unknown:
+            raise ValueError(f"Columns not held by the cube: {unknown}")
+
+        if not stored:
+            counts = self._totals
+        elif tuple(stored) in self._arrays:
+            counts = self._arrays[tuple(stored)]
+        else:
+            counts = self._arrays[tuple(reversed(stored))].swapaxes(1, 2)
+
+        # Axis 0 is the slice axis (a single dummy slice when the cube is not sliced)
+        axes = [self.slice_by] + stored
+        for column, value in conditions.items():
+            axis = axes.index(column)
+            if column in grouping_columns:
+                # Keep the axis but zero out every other category
+                masked = np.zeros_like(counts)
+                code = self._code(column, value)
+                if code is not None:
+                    np.moveaxis(masked, axis, 0)[code] = counts.take(code, axis=axis)
+                counts = masked
+            else:
+                counts = self._select(counts, axis, column, value)
+                axes.pop(axis)
+
+        if axes and axes[0] == self.slice_by and self.slice_by not in grouping_columns:
+            counts = counts.sum(axis=0)
+            axes.pop(0)
+
+        # Put the axes in the order of the grouping columns, the Y axis last
+        order = [axes.index(column) for column in grouping_columns] + [len(axes)]
+        return counts.transpose(order)
+
+    def _code(self, column, value):
+        # Position of a value among the column's categories, None when the value never occurs
+        uniques = self.uniques[column]
+        matches = np.flatnonzero(np.asarray(uniques == value))
+        return int(matches[0]) if len(matches) else None
+
+    def _select(self, counts, axis, column, value):
+        code = self._code(column, value)
+        if code is None:
+            return np.zeros_like(counts.take(0, axis=axis))
+        return counts.take(code, axis=axis)
@@ -0,0 +1,298 @@
+"""
+AcceptanceSketch Module
+-----------------------
+
+Fixed-memory, approximate acceptance counts for groupings with too many categories to count exactly.
+
+Grouping by three or four columns such as `occupation`, `income`, `age` and `passenger` can produce more groups than
+an exact table holds comfortably on the full log. An AcceptanceSketch keeps two count-min sketches instead, one for
+accepted and one for rejected offers, plus a fixed number of heavy-hitter groups: the largest groups seen so far.
+
+- Each sketch is a `depth x width` table of counters. A group is hashed to one counter per row, and its count is
+  estimated as the smallest of those counters.
+- With `width = e / epsilon` and `depth = ln(1 / delta)`, an estimate never undercounts. It overcounts by more than
+  `epsilon` times the number of accepted (or rejected) offers with a probability of at most `delta`.
+- Heavy hitters are re-ranked by their estimated size after every chunk.
+
+Memory is `2 * depth * width` counters plus `top` groups, whatever the number of distinct groups. Rows are processed
+in chunks of CHUNK_ROWS, so the transient hashing memory is bounded as well.
+
+A filled sketch can be passed to `create_stacked_bar_plot_multi` (or any function grouping by the same columns) in
+place of a DataFrame. It draws the heavy-hitter groups with error bars spanning the count bounds. The results add
+lower count bounds and an acceptance rate interval (BOUND_COLUMNS) to the usual columns.
+
+Example usage:
+    columns = ['occupation', 'income', 'age', 'passenger']
+    sketch = AcceptanceSketch.from_source(pd.read_csv('../data/coupons.csv', chunksize=1_000_000), columns,
+                                          epsilon=1e-4, top=30)
+    image64, result_df = create_stacked_bar_plot_multi(columns, 'Largest Driver Groups', sketch, rotation=90)
+
+    # or let the plot build the sketch itself
+    image64, result_df = create_stacked_bar_plot_multi(columns, 'Largest Driver Groups', df_cleaned, rotation=90,
+                                                       approximate={'epsilon': 1e-4, 'top': 30})
+"""
+
+import hashlib
+import math
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceStats import TARGET_COLUMN, _as_list, _target_codes, count_acceptance, iter_frames, table_from_counts
+
+# Rows hashed and counted at a time
+CHUNK_ROWS = 1_000_000
+
+
+class AcceptanceSketch:
+    """
+    Count-min sketches of accepted and rejected offers per group, with the heaviest groups tracked by key.
+
+    Parameters:
+    - grouping_columns (str or list): Column name(s) to group by.
+    - epsilon (float, optional): Relative error bound; estimates exceed the true count by at most epsilon times the
+      accepted (or rejected) offers, except with probability delta. Default is 1e-4.
+    - delta (float, optional): Probability of exceeding the error bound. Default is 0.01.
+    - top (int, optional): Number of heavy-hitter groups tracked and reported. Default is 50.
+    - seed (int, optional): Seed of the hash functions; only sketches with equal settings can be merged. Default is 0.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+    """
+
+    def __init__(self, grouping_columns, epsilon=1e-4, delta=0.01, top=50, seed=0, target_column=TARGET_COLUMN):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon and delta must be between 0 and 1")
+        if top < 1:
+            raise ValueError("top must be at least 1")
+        self.grouping_columns = _as_list(grouping_columns)
+        self.epsilon = epsilon
+        self.delta = delta
+        self.top = top
+        self.seed = seed
+        self.target_column = target_column
+
+        # Multiply-shift hashing into a power-of-two width, one odd multiplier per sketch row
+        self._width_bits = max(math.ceil(math.log2(math.e / epsilon)), 1)
+        self.width = 1 << self._width_bits
+        self.depth = max(math.ceil(math.log(1 / delta)), 1)
+        rng = np.random.default_rng(seed)
+        self._multipliers = rng.integers(0, 1 << 63, self.depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._offsets = rng.integers(0, 1 << 63, self.depth, dtype=np.uint64)
+
+        self._accept = np.zeros((self.depth, self.width), dtype=np.int64)
+        self._reject = np.zeros((self.depth, self.width), dtype=np.int64)
+        self._totals = np.zeros(3, dtype=np.int64)
+        self._heavy_hashes = np.empty(0, dtype=np.uint64)
+        self._heavy_keys = []
+        self._fingerprint = None
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(grouping_columns={self.grouping_columns}, epsilon={self.epsilon}, '
+                f'delta={self.delta}, top={self.top}, rows={int(self._totals[0])})')
+
+    @classmethod
+    def from_source(cls, source, grouping_columns, **options):
+        """
+        Builds a sketch from a DataFrame or a chunked source in one pass.
+
+        Parameters:
+        - source (DataFrame or iterable): The data, or DataFrame chunks / CSV partition paths (see
+          AcceptanceStats.iter_frames).
+        - grouping_columns (str or list): Column name(s) to group by.
+        - **options: epsilon, delta, top, seed and target_column, see AcceptanceSketch.
+
+        Returns:
+        - AcceptanceSketch: The filled sketch.
+        """
+        sketch = cls(grouping_columns, **options)
+        for frame in [source] if isinstance(source, pd.DataFrame) else iter_frames(source):
+            sketch.add(frame)
+        return sketch
+
+    def add(self, df):
+        """
+        Folds the offers of a DataFrame into the sketch.
+
+        Returns:
+        - AcceptanceSketch: The sketch itself, so calls can be chained.
+
+        Raises:
+        - ValueError: If the DataFrame lacks a grouping column or the target column.
+        """
+        missing = [column for column in self.grouping_columns + [self.target_column] if column not in df.columns]
+        if missing:
+            raise ValueError(f"DataFrame is missing columns used by the sketch: {missing}")
+        for start in range(0, len(df), CHUNK_ROWS):
+            self._add_chunk(df.iloc[start:start + CHUNK_ROWS])
+        self._fingerprint = None
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another sketch with the same grouping and settings, e.g. one filled by another worker.
+
+        Returns:
+        - AcceptanceSketch: The sketch itself.
+
+        Raises:
+        - ValueError: If the sketches differ in grouping, size or seed.
+        """
+        settings = ('grouping_columns', 'width', 'depth', 'seed', 'target_column')
+        if any(getattr(self, name) != getattr(other, name) for name in settings):
+            raise ValueError("Only sketches with the same grouping, epsilon, delta and seed can be merged")
+        self._accept += other._accept
+        self._reject += other._reject
+        self._totals += other._totals
+        known = set(self._heavy_hashes.tolist())
+        added = [i for i, value in enumerate(other._heavy_hashes.tolist()) if value not in known]
+        hashes = np.concatenate([self._heavy_hashes, other._heavy_hashes[added]])
+        self._keep_heaviest(hashes, self._heavy_keys + [other._heavy_keys[i] for i in added])
+        self._fingerprint = None
+        return self
+
+    def error_bounds(self):
+        """
+        Returns how far an accept and a reject estimate may exceed the true count, as (accept_error, reject_error).
+        Both bounds hold with probability 1 - delta.
+        """
+        return self.epsilon * float(self._totals[1]), self.epsilon * float(self._totals[2])
+
+    def estimate(self, keys):
+        """
+        Estimates the accepted and rejected counts of arbitrary groups.
+
+        Parameters:
+        - keys (DataFrame): One row per group holding the grouping columns.
+
+        Returns:
+        - tuple of ndarray: (accept, reject) estimates, never below the true counts.
+        """
+        return self._estimate(_hash_keys(keys[self.grouping_columns]))
+
+    def acceptance_table(self, grouping_columns, ordering=None):
+        """
+        Returns the estimated acceptance table of the heavy-hitter groups, sorted by category.
+
+        Parameters:
+        - grouping_columns (str or list): Must be the sketch's grouping columns.
+        - ordering (list, optional): Specific order for the categories. Default is None.
+
+        Returns:
+        - DataFrame: The layout of AcceptanceStats.acceptance_table plus the BOUND_COLUMNS.
+
+        Raises:
+        - ValueError: If grouping_columns differ from the sketch's grouping.
+        """
+        if _as_list(grouping_columns) != self.grouping_columns:
+            raise ValueError(f"The sketch groups by {self.grouping_columns}, not {_as_list(grouping_columns)}")
+        accept, reject = self._estimate(self._heavy_hashes)
+        if len(self.grouping_columns) == 1:
+            index = pd.Index([key[0] for key in self._heavy_keys], name=self.grouping_columns[0])
+        else:
+            index = pd.MultiIndex.from_tuples(self._heavy_keys, names=self.grouping_columns)
+        order = index.argsort()
+
+        # Estimates only overcount, so the lower bounds subtract the error bound of each sketch
+        accept_error, reject_error = self.error_bounds()
+        accept_low = np.maximum(accept - accept_error, 0)
+        reject_low = np.maximum(reject - reject_error, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentage_low = accept_low / (accept_low + reject) * 100
+            percentage_high = accept / (accept + reject_low) * 100
+
+        table = table_from_counts(index[order], (accept + reject)[order], accept[order], reject[order])
+        table['accept_count_low'] = accept_low[order]
+        table['reject_count_low'] = reject_low[order]
+        table['accept_percentage_low'] = percentage_low[order]
+        table['accept_percentage_high'] = percentage_high[order]
+        if ordering:
+            table = table.reindex(ordering)
+            table['total_count'] = table['total_count'].fillna(0)
+        return table
+
+    def acceptance_counts(self):
+        """
+        Returns the exact overall counts as (total_count, accept_count, reject_count).
+        """
+        return tuple(int(value) for value in self._totals)
+
+    def where(self, conditions=None, **column_values):
+        """
+        Not supported: a sketch only answers its own grouping.
+        """
+        raise ValueError("An AcceptanceSketch cannot be filtered; sketch the filtered rows instead")
+
+    def stats(self):
+        """
+        Returns the size of the sketch and the rows it holds as a dict.
+        """
+        return {'rows': int(self._totals[0]), 'width': self.width, 'depth': self.depth,
+                'memory_bytes': self._accept.nbytes + self._reject.nbytes, 'heavy_hitters': len(self._heavy_keys)}
+
+    def fingerprint(self):
+        """
+        Returns a hex digest of the sketch's counts, recomputed only after an update.
+        """
+        if self._fingerprint is None:
+            hasher = hashlib.sha1()
+            hasher.update(repr((self.grouping_columns, self.width, self.depth, self.seed, self.top)).encode())
+            for array in (self._accept, self._reject, self._totals, np.sort(self._heavy_hashes)):
+                hasher.update(array.tobytes())
+            self._fingerprint = hasher.hexdigest()
+        return self._fingerprint
+
+    def _add_chunk(self, chunk):
+        keys = chunk[self.grouping_columns]
+        y = _target_codes(chunk[self.target_column])
+        self._totals += count_acceptance(y)
+
+        # Rows with a missing key or response are skipped, as in the exact tables
+        valid = (y >= 0) & keys.notna().all(axis=1).to_numpy()
+        keys = keys[valid]
+        y = y[valid]
+        hashes = _hash_keys(keys)
+        accepted = y == 1
+        for row in range(self.depth):
+            buckets = self._buckets(hashes, row)
+            self._accept[row] += np.bincount(buckets[accepted], minlength=self.width)
+            self._reject[row] += np.bincount(buckets[~accepted], minlength=self.width)
+
+        # The groups of this chunk compete with the tracked ones for the heavy-hitter slots
+        chunk_hashes, first = np.unique(hashes, return_index=True)
+        fresh = ~np.isin(chunk_hashes, self._heavy_hashes)
+        rows = first[fresh]
+        hashes = np.concatenate([self._heavy_hashes, chunk_hashes[fresh]])
+        self._keep_heaviest(hashes, self._heavy_keys, keys, rows)
+
+    def _keep_heaviest(self, hashes, known_keys, chunk_keys=None, chunk_rows=None):
+        # Keeps the top groups by estimated size; new winners get their keys from the chunk rows they were seen in
+        accept, reject = self._estimate(hashes)
+        total = accept + reject
+        if len(hashes) > self.top:
+            heaviest = np.sort(np.argpartition(-total, self.top - 1)[:self.top])
+        else:
+            heaviest = np.arange(len(hashes))
+        n_known = len(known_keys)
+        new_rows = [chunk_rows[i - n_known] for i in heaviest if i >= n_known]
+        new_keys = iter(chunk_keys.iloc[new_rows].itertuples(index=False, name=None)) if new_rows else iter(())
+        self._heavy_keys = [known_keys[i] if i < n_known else next(new_keys) for i in heaviest]
+        self._heavy_hashes = hashes[heaviest]
+
+    def _buckets(self, hashes, row):
+        # The counter of every hash in one sketch row: the top bits of (multiplier * hash + offset) mod 2**64
+        shift = np.uint64(64 - self._width_bits)
+        return ((hashes * self._multipliers[row] + self._offsets[row]) >> shift).astype(np.intp)
+
+    def _estimate(self, hashes):
+        # The smallest counter over the sketch rows, for accepted and rejected offers
+        accept = np.full(len(hashes), np.iinfo(np.int64).max)
+        reject = np.full(len(hashes), np.iinfo(np.int64).max)
+        for row in range(self.depth):
+            buckets = self._buckets(hashes, row)
+            np.minimum(accept, self._accept[row][buckets], out=accept)
+            np.minimum(reject, self._reject[row][buckets], out=reject)
+        return accept, reject
+
+
+def _hash_keys(keys):
+    # One 64-bit hash per row of grouping values; equal values hash equally whatever the column dtypes
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
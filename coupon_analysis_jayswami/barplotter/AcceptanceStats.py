@@ -0,0 +1,486 @@
+"""
+AcceptanceStats Module
+----------------------
+
+Shared aggregation core for the BarPlotter functions.
+
+Every plot in BarPlotter is driven by the same table: for each category of one or more grouping columns, the
+number of accepted (Y=1) and rejected (Y=0) offers together with the matching percentages. This module builds
+that whole table in a single vectorized pass. Each grouping column is factorized into integer codes, the codes
+are combined into one group key per row, and the accept/reject tallies are taken with `np.bincount` instead of
+a per-category Python loop.
+
+The resulting table mirrors what `df.groupby(columns + ['Y']).size().unstack().fillna(0)` produced before:
+categories are sorted the same way, rows with a missing key are dropped, and applying an `ordering` reindexes
+the table so that categories with no offers show a total of 0 and NaN counts.
+
+Data that does not fit in memory can be streamed: a CountAccumulator folds the per-group counts of each DataFrame
+chunk (e.g. from `pd.read_csv(path, chunksize=...)` or a list of partition files) into a running table, so peak
+memory is bounded by the chunk size and the number of groups, and the final table equals the in-memory one.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Name of the response column (1 = accepted, 0 = rejected)
+TARGET_COLUMN = 'Y'
+
+# Column layout shared by every results_df produced from an acceptance table
+COUNT_COLUMNS = ['total_count', 'accept_count', 'reject_count', 'accept_percentage', 'reject_percentage']
+
+# Extra columns of approximate tables (see AcceptanceSketch): lower count bounds and the acceptance rate interval
+BOUND_COLUMNS = ['accept_count_low', 'reject_count_low', 'accept_percentage_low', 'accept_percentage_high']
+
+# Columns the groups of an acceptance table can be ranked by: offers ('count') or acceptance rate ('lift', which
+# orders groups as their lift over the overall acceptance rate does)
+RANKINGS = {'count': 'total_count', 'lift': 'accept_percentage'}
+
+# Above this many possible key combinations the dense bincount is replaced by a sort-based compaction
+_DENSE_KEY_LIMIT = 1 << 22
+
+
+def _as_list(columns):
+    # Accept a single column name as well as a list of names
+    if columns is None:
+        return []
+    if not isinstance(columns, (list, tuple)):
+        return [columns]
+    return list(columns)
+
+
+def _target_codes(target):
+    """
+    Returns the response column as an int8 array with -1 marking missing values.
+    """
+    values = np.asarray(target)
+    if values.dtype.kind in 'biu':
+        return values.astype(np.int8, copy=False)
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy()
+    return np.where(np.isnan(values), -1, values).astype(np.int8)
+
+
+def count_acceptance(target, mask=None):
+    """
+    Counts accepted and rejected responses in a response vector.
+
+    Parameters:
+    - target (array-like): The Y column (1 = accepted, 0 = rejected).
+    - mask (array-like of bool, optional): Rows to include. Default is all rows.
+
+    Returns:
+    - tuple: (total_count, accept_count, reject_count) as Python ints.
+    """
+    y = _target_codes(target)
+    if mask is not None:
+        y = y[np.asarray(mask, dtype=bool)]
+    tallies = np.bincount(y[y >= 0], minlength=2)
+    return int(tallies.sum()), int(tallies[1]), int(tallies[0])
+
+
+def add_percentages(table, zero_total_percentage=np.nan):
+    """
+    Adds the accept/reject percentage columns to a table of counts.
+
+    Parameters:
+    - table (DataFrame): Must hold 'total_count', 'accept_count' and 'reject_count' columns.
+    - zero_total_percentage (float, optional): Value used where the total is 0. Default is NaN.
+
+    Returns:
+    - DataFrame: The table with the columns ordered as COUNT_COLUMNS.
+    """
+    total = table['total_count'].astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table['accept_percentage'] = table['accept_count'] / total * 100
+        table['reject_percentage'] = table['reject_count'] / total * 100
+    if not np.isnan(zero_total_percentage):
+        zero_total = total == 0
+        table.loc[zero_total, ['accept_percentage', 'reject_percentage']] = zero_total_percentage
+    return table[COUNT_COLUMNS]
+
+
+def encode_groups(df, grouping_columns, keep_missing=False):
+    """
+    Encodes one or more grouping columns into a single integer group id per row.
+
+    Parameters:
+    - df (DataFrame): The data to encode.
+    - grouping_columns (str or list): The column(s) that define a group.
+    - keep_missing (bool, optional): Treat a missing value as a group value of its own, sorted last, instead of
+      dropping the row. Default is False.
+
+    Returns:
+    - tuple: (group_ids, index) where group_ids holds one id per row (-1 for rows with a missing key) and
+      index is the sorted pandas Index (or MultiIndex) of the observed groups, position i labelling id i.
+    """
+    grouping_columns = _as_list(grouping_columns)
+    level_codes = []
+    level_uniques = []
+    for column in grouping_columns:
+        codes, uniques = pd.factorize(df[column], sort=True, use_na_sentinel=not keep_missing)
+        level_codes.append(codes)
+        level_uniques.append(uniques)
+    return encode_codes(level_codes, level_uniques, grouping_columns, len(df))
+
+
+def encode_codes(level_codes, level_uniques, grouping_columns, n_rows, valid=None):
+    """
+    Combines per-column integer codes into a single group id per row, as encode_groups does after factorizing.
+
+    Parameters:
+    - level_codes (list of ndarray): The codes of each grouping column, -1 marking a missing value. Code i of a
+      column labels uniques[i]; uniques that no row uses are left out of the groups.
+    - level_uniques (list): The sorted labels of each column's codes (Index, Categorical or array).
+    - grouping_columns (list): The column names, used to name the index.
+    - n_rows (int): Number of rows.
+    - valid (ndarray of bool, optional): Rows to include; the others get id -1. Default is all rows.
+
+    Returns:
+    - tuple: (group_ids, index), see encode_groups.
+    """
+    valid = np.ones(n_rows, dtype=bool) if valid is None else valid.copy()
+    for codes in level_codes:
+        valid &= codes >= 0
+
+    shape = tuple(max(len(uniques), 1) for uniques in level_uniques)
+    key = np.zeros(n_rows, dtype=np.int64)
+    for codes, size in zip(level_codes, shape):
+        key = key * size + codes
+    key[~valid] = -1
+
+    # Map the combined keys onto a dense 0..n_groups-1 range, keeping the lexicographic order
+    n_keys = int(np.prod(shape, dtype=np.int64))
+    if n_keys <= _DENSE_KEY_LIMIT:
+        present = np.bincount(key[valid], minlength=n_keys) > 0
+        observed_keys = np.flatnonzero(present)
+        lookup = np.full(n_keys, -1, dtype=np.int64)
+        lookup[observed_keys] = np.arange(len(observed_keys))
+        group_ids = np.where(valid, lookup[np.where(valid, key, 0)], -1)
+    else:
+        observed_keys, inverse = np.unique(key[valid], return_inverse=True)
+        group_ids = np.full(n_rows, -1, dtype=np.int64)
+        group_ids[valid] = inverse
+
+    index = _build_index(observed_keys, shape, level_uniques, grouping_columns)
+    return group_ids, index
+
+
+def _build_index(observed_keys, shape, level_uniques, grouping_columns):
+    # Translate combined keys back into one label array per grouping column
+    positions = np.unravel_index(observed_keys, shape) if len(shape) else ()
+    if len(grouping_columns) == 1:
+        return pd.Index(level_uniques[0].take(positions[0]), name=grouping_columns[0])
+    arrays = [uniques.take(codes) for uniques, codes in zip(level_uniques, positions)]
+    return pd.MultiIndex.from_arrays(arrays, names=grouping_columns)
+
+
+def tally_groups(group_ids, target, n_groups):
+    """
+    Tallies accepted, rejected and total responses per group id.
+
+    Parameters:
+    - group_ids (ndarray): One group id per row, -1 for rows to skip.
+    - target (array-like): The Y column aligned with group_ids.
+    - n_groups (int): Number of groups.
+
+    Returns:
+    - tuple of ndarray: (total, accept, reject) counts, one entry per group.
+    """
+    y = _target_codes(target)
+    keep = (group_ids >= 0) & (y >= 0)
+    ids = group_ids[keep]
+    y = y[keep]
+    total = np.bincount(ids, minlength=n_groups)
+    accept = np.bincount(ids[y == 1], minlength=n_groups)
+    reject = np.bincount(ids[y == 0], minlength=n_groups)
+    return total, accept, reject
+
+
+def table_from_counts(index, total, accept, reject, ordering=None):
+    """
+    Builds an acceptance table from per-group counts.
+
+    Parameters:
+    - index (Index): Labels of the groups.
+    - total, accept, reject (array-like): Counts aligned with index.
+    - ordering (list, optional): Specific order for the categories. Missing categories get a total of 0
+      and NaN counts. Default is None.
+
+    Returns:
+    - DataFrame: Indexed by category with the COUNT_COLUMNS columns.
+    """
+    table = pd.DataFrame({'total_count': total, 'accept_count': accept, 'reject_count': reject}, index=index)
+    if ordering:
+        table = table.reindex(ordering)
+        table['total_count'] = table['total_count'].fillna(0)
+    return add_percentages(table)
+
+
+def acceptance_table(df, grouping_columns, ordering=None, target_column=TARGET_COLUMN):
+    """
+    Computes acceptance counts and percentages for every category of the grouping column(s).
+
+    Parameters:
+    - df (DataFrame): The data, containing the grouping column(s) and the target column.
+    - grouping_columns (str or list): Column name(s) to group by.
+    - ordering (list, optional): Specific order for the categories. Default is None.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+
+    Returns:
+    - DataFrame: Indexed by category with the COUNT_COLUMNS columns.
+    """
+    group_ids, index = encode_groups(df, grouping_columns)
+    total, accept, reject = tally_groups(group_ids, df[target_column].to_numpy(), len(index))
+    return table_from_counts(index, total, accept, reject, ordering)
+
+
+def rank_groups(table, rank_by='count'):
+    """
+    Orders the groups of an acceptance table from the highest to the lowest count or acceptance rate.
+
+    Parameters:
+    - table (DataFrame): An acceptance table as returned by acceptance_table.
+    - rank_by (str, optional): 'count' ranks by total offers, 'lift' by acceptance rate. Ties keep the table's order
+      and groups without offers come last. Default is 'count'.
+
+    Returns:
+    - DataFrame: The table with its rows reordered.
+
+    Raises:
+    - ValueError: If rank_by is not one of RANKINGS.
+    """
+    if rank_by not in RANKINGS:
+        raise ValueError(f"rank_by must be one of {list(RANKINGS)}, got {rank_by!r}")
+    values = table[RANKINGS[rank_by]].to_numpy(dtype=float)
+    if rank_by == 'lift':
+        values = np.where(table['total_count'].to_numpy(dtype=float) > 0, values, np.nan)
+    # NaN sorts last, and the stable sort keeps ties in table order
+    return table.iloc[np.argsort(-values, kind='stable')]
+
+
+def top_groups(table, top, rank_by='count', other_label='Other', keep_order=False):
+    """
+    Keeps the top groups of an acceptance table and folds all the others into one row.
+
+    Parameters:
+    - table (DataFrame): An acceptance table as returned by acceptance_table.
+    - top (int): Number of groups kept.
+    - rank_by (str, optional): How the groups are ranked, see rank_groups. Default is 'count'.
+    - other_label (str, optional): Label of the folded row. Default is 'Other'.
+    - keep_order (bool, optional): Keep the kept groups in table order instead of rank order. Default is False.
+
+    Returns:
+    - DataFrame: At most top + 1 rows; the folded row, if any, comes last with the summed counts (and count bounds)
+      of the groups it holds.
+
+    Raises:
+    - ValueError: If top is not a positive integer or rank_by is not one of RANKINGS.
+    """
+    if isinstance(top, bool) or not isinstance(top, (int, np.integer)) or top < 1:
+        raise ValueError(f"top must be a positive integer, got {top!r}")
+    ranked = rank_groups(table, rank_by)
+    if len(ranked) <= top:
+        return table if keep_order else ranked
+    kept = table[table.index.isin(ranked.index[:top])] if keep_order else ranked.iloc[:top]
+    rest = ranked.iloc[top:]
+
+    other = add_percentages(pd.DataFrame({column: [rest[column].sum()] for column in COUNT_COLUMNS[:3]},
+                                         index=[other_label]))
+    if 'accept_count_low' in table.columns:
+        # The folded row's count bounds and acceptance rate interval, as AcceptanceSketch bounds a single group
+        accept, reject = other['accept_count'].iloc[0], other['reject_count'].iloc[0]
+        accept_low, reject_low = rest['accept_count_low'].sum(), rest['reject_count_low'].sum()
+        other['accept_count_low'] = accept_low
+        other['reject_count_low'] = reject_low
+        with np.errstate(divide='ignore', invalid='ignore'):
+            other['accept_percentage_low'] = np.float64(accept_low) / (accept_low + reject) * 100
+            other['accept_percentage_high'] = np.float64(accept) / (accept + reject_low) * 100
+
+    # A flat index holds the kept labels (tuples for several grouping columns) next to the folded row's label
+    folded = pd.concat([kept, other[kept.columns]])
+    folded.index = pd.Index(list(kept.index) + [other_label], tupleize_cols=False)
+    return folded
+
+
+def results_frame(table, label_column='category_label', label_prefix=None):
+    """
+    Turns an acceptance table into the results_df layout returned by the BarPlotter functions.
+
+    Parameters:
+    - table (DataFrame): An acceptance table as returned by acceptance_table.
+    - label_column (str, optional): Name of the column holding the stringified category. Default is
+      'category_label'.
+    - label_prefix (dict, optional): Constant columns placed before the category label, e.g.
+      {'subplot_label': 'Travelling Alone'}. Default is None.
+
+    Returns:
+    - DataFrame: One row per category with a fresh RangeIndex, plus the BOUND_COLUMNS of approximate tables.
+    """
+    results = pd.DataFrame({label_column: [str(label) for label in table.index]})
+    for column, value in reversed(list((label_prefix or {}).items())):
+        results.insert(0, column, value)
+    for column in COUNT_COLUMNS + [column for column in BOUND_COLUMNS if column in table.columns]:
+        results[column] = table[column].to_numpy()
+    return results
+
+
+def is_chunked(source):
+    """
+    Returns True when source is an iterable of DataFrame chunks or partition file paths rather than a DataFrame.
+    """
+    if isinstance(source, (pd.DataFrame, pd.Series, np.ndarray, str, bytes, dict)):
+        return False
+    return hasattr(source, '__iter__') and not hasattr(source, 'acceptance_table')
+
+
+def iter_frames(source, chunksize=None):
+    """
+    Yields the DataFrame chunks of a chunked source.
+
+    Parameters:
+    - source (iterable): DataFrames (e.g. a `pd.read_csv(..., chunksize=...)` reader) and/or paths of CSV partition
+      files.
+    - chunksize (int, optional): Rows per chunk when reading partition files. Default is None (whole file).
+
+    Partition files are numbered with one continuing RangeIndex, as if they had been read as a single CSV, so
+    boolean Series filters built on the full dataset line up with them.
+    """
+    offset = 0
+    for part in source:
+        if isinstance(part, (str, os.PathLike)):
+            frames = pd.read_csv(part, chunksize=chunksize) if chunksize else [pd.read_csv(part)]
+            for frame in frames:
+                frame.index = pd.RangeIndex(offset, offset + len(frame))
+                offset += len(frame)
+                yield frame
+        else:
+            offset += len(part)
+            yield part
+
+
+def _empty_index(grouping_columns):
+    if len(grouping_columns) == 1:
+        return pd.Index([], name=grouping_columns[0])
+    return pd.MultiIndex.from_arrays([[] for _ in grouping_columns], names=grouping_columns)
+
+
+class CountAccumulator:
+    """
+    Running accept/reject counts for one grouping, merged chunk by chunk.
+
+    Parameters:
+    - grouping_columns (str or list): Column name(s) to group by.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+    - counts (DataFrame, optional): Previously accumulated counts to continue from, as returned by `counts`.
+      Default is None.
+    - keep_missing (bool, optional): Count rows with a missing grouping value under a missing label instead of
+      dropping them, so narrower groupings can still be derived from the counts. Default is False.
+    """
+
+    def __init__(self, grouping_columns, target_column=TARGET_COLUMN, counts=None, keep_missing=False):
+        self.grouping_columns = _as_list(grouping_columns)
+        self.target_column = target_column
+        self._counts = counts
+        self.keep_missing = keep_missing
+
+    @property
+    def counts(self):
+        """
+        The raw 'total_count', 'accept_count' and 'reject_count' table of the observed groups, or None if empty.
+        """
+        return self._counts
+
+    def add(self, df):
+        """
+        Folds the counts of one DataFrame chunk into the running totals.
+        """
+        group_ids, index = encode_groups(df, self.grouping_columns, self.keep_missing)
+        total, accept, reject = tally_groups(group_ids, df[self.target_column].to_numpy(), len(index))
+        chunk_counts = pd.DataFrame({'total_count': total, 'accept_count': accept, 'reject_count': reject},
+                                    index=index)
+        self.add_counts(chunk_counts)
+
+    def add_counts(self, chunk_counts):
+        """
+        Folds an already aggregated table of 'total_count', 'accept_count' and 'reject_count' into the totals.
+        """
+        if self._counts is None:
+            self._counts = chunk_counts
+            return
+        combined = pd.concat([self._counts, chunk_counts])
+        # Re-sorting the merged groups keeps the order identical to a single groupby over all rows
+        self._counts = combined.groupby(level=list(range(combined.index.nlevels)), sort=True, dropna=False).sum()
+
+    def table(self, ordering=None):
+        """
+        Returns the acceptance table of everything added so far.
+
+        Parameters:
+        - ordering (list, optional): Specific order for the categories. Default is None.
+        """
+        counts = self._counts
+        if counts is None:
+            counts = pd.DataFrame({'total_count': [], 'accept_count': [], 'reject_count': []},
+                                  index=_empty_index(self.grouping_columns), dtype=np.int64)
+        return table_from_counts(counts.index, counts['total_count'].to_numpy(), counts['accept_count'].to_numpy(),
+                                 counts['reject_count'].to_numpy(), ordering)
+
+
+def acceptance_tables_from_chunks(chunks, groupings, orderings=None, target_column=TARGET_COLUMN):
+    """
+    Computes the acceptance tables of several groupings in a single pass over a chunked source.
+
+    Parameters:
+    - chunks (iterable): DataFrame chunks and/or partition file paths, see iter_frames.
+    - groupings (list): One grouping (column name or list of names) per table.
+    - orderings (list, optional): One ordering (or None) per grouping. Default is None.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+
+    Returns:
+    - list of DataFrame: One acceptance table per grouping.
+    """
+    accumulators = [CountAccumulator(grouping, target_column) for grouping in groupings]
+    for chunk in iter_frames(chunks):
+        for accumulator in accumulators:
+            accumulator.add(chunk)
+    orderings = orderings or [None] * len(groupings)
+    return [accumulator.table(ordering) for accumulator, ordering in zip(accumulators, orderings)]
+
+
+def filter_mask(df, filter_condition, offset=0):
+    """
+    Resolves a filter to a boolean row mask of df.
+
+    Parameters:
+    - df (DataFrame): The rows to filter (possibly one chunk of a larger dataset).
+    - filter_condition (str, Series, array or None): A query string, a boolean Series aligned on the index, a
+      boolean array over the full dataset, or None for all rows.
+    - offset (int, optional): Position of df's first row in the full dataset, used for boolean arrays. Default is 0.
+
+    Returns:
+    - ndarray or None: The mask, None when every row is selected.
+    """
+    if filter_condition is None:
+        return None
+    if isinstance(filter_condition, str):
+        return np.asarray(df.eval(filter_condition), dtype=bool)
+    if isinstance(filter_condition, pd.Series):
+        if not filter_condition.index.equals(df.index):
+            filter_condition = filter_condition.reindex(df.index, fill_value=False)
+        return filter_condition.to_numpy(dtype=bool)
+    return np.asarray(filter_condition, dtype=bool)[offset:offset + len(df)]
+
+
+def filtered_counts_from_chunks(chunks, filters, target_column=TARGET_COLUMN):
+    """
+    Counts (total_count, accept_count, reject_count) for each filter in a single pass over a chunked source.
+    """
+    totals = np.zeros((len(filters), 3), dtype=np.int64)
+    offset = 0
+    for chunk in iter_frames(chunks):
+        target = chunk[target_column].to_numpy()
+        for i, filter_condition in enumerate(filters):
+            totals[i] += count_acceptance(target, filter_mask(chunk, filter_condition, offset))
+        offset += len(chunk)
+    return [tuple(int(value) for value in row) for row in totals]
@@ -60,19 +60,31 @@ LICENSE file in the repository.
 """
 
 import base64
-import matplotlib.pyplot as plt
-import seaborn as sns
+import inspect
 import pandas as pd
 import numpy as np
-import plotly.graph_objs as go
-import plotly.offline as pyo
 import io
-
-# Initialize the image buffer only once
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from AcceptanceCube import CubeView
+from AcceptanceSketch import AcceptanceSketch
+from BitmapIndex import BitmapIndex
+from CountStore import StoreView
+from Engines import EngineSource, as_source
+from Instrumentation import instrumented, note, recording, stage
+from PlotlySpecs import _json_numbers, figure_spec, save_spec, stacked_bar_traces
+from SharedDataset import SharedView
+from AcceptanceStats import (acceptance_table, acceptance_tables_from_chunks, filtered_counts_from_chunks, is_chunked,
+                             iter_frames, rank_groups, results_frame, table_from_counts, top_groups)
+
+# Shared buffer kept for callers of the pyplot-based save_plot_as_base64; the create_* functions render into a
+# private buffer per call so they can run concurrently
 buffer = io.BytesIO()
 
 
-def create_stacked_bar_plot(grouping_column, plot_title, df_cleaned, rot=0, ordering=None):
+@instrumented
+def create_stacked_bar_plot(grouping_column, plot_title, df_cleaned, rot=0, ordering=None, output='base64',
+                            image_format='png', compress_level=None, backend='matplotlib', pool=None):
     """
         Creates a stacked bar plot to visualize the acceptance and rejection rates.
 
@@ -84,12 +96,21 @@ def create_stacked_bar_plot(grouping_column, plot_title, df_cleaned, rot=0, orde
         - grouping_column (str or list): Column name(s) in the DataFrame to group data by.
                                          If a string is provided, it is converted into a list.
         - plot_title (str): Title of the plot.
-        - df_cleaned (DataFrame): The cleaned DataFrame containing the data to be plotted.
+        - df_cleaned (DataFrame, BitmapIndex, CubeView, StoreView or iterable): The cleaned DataFrame containing the
+                                              data to be plotted (optionally wrapped in a BitmapIndex), an
+                                              AcceptanceCube or CountStore (view) to look the counts up from, or an
+                                              iterable of DataFrame chunks / CSV partition paths to stream.
         - rot (int, optional): Degrees of rotation for x-axis labels. Default is 0.
         - ordering (list, optional): Specific order for categories on the x-axis. Default is None.
+        - output, image_format, compress_level (optional): How the image is encoded and returned, see save_figure.
+                                                           Default is a base64-encoded PNG.
+        - backend (str, optional): 'matplotlib' renders an image, 'plotly' returns a Plotly figure JSON spec for the
+                                   browser to draw instead (see PlotlySpecs). Default is 'matplotlib'.
+        - pool (FigurePool, optional): Pool of figure templates to reuse when this chart was drawn before, so only the
+                                       bars and labels are updated. Default is None (a new figure per call).
 
         Returns:
-        - str: A base64 string representation of the generated plot.
+        - str: A base64 string representation of the generated plot (or the output chosen, see save_figure).
 
         The function calculates the acceptance and rejection counts and percentages for each
         category in the grouping column. It then creates a stacked bar plot with these values,
@@ -101,58 +122,50 @@ def create_stacked_bar_plot(grouping_column, plot_title, df_cleaned, rot=0, orde
     if not isinstance(grouping_column, list):
         grouping_column = [grouping_column]
 
-    # Preparing the data
-    acceptance_counts = df_cleaned.groupby(grouping_column + ['Y']).size().unstack().fillna(0)
-    total_responses = acceptance_counts.sum(axis=1)
-    percentages = acceptance_counts.divide(total_responses, axis=0) * 100
+    # Preparing the data (ordering is applied by the shared aggregation core)
+    counts_table = _acceptance_table(df_cleaned, grouping_column, ordering)
 
-    # Create the stacked bar plot
-    plt.figure(figsize=(12, 8))
+    if _use_plotly(backend):
+        panel = _plotly_panel(list(counts_table.index), counts_table, ' & '.join(grouping_column), showlegend=True)
+        return save_spec(figure_spec([panel], plot_title, rotation=rot, legend=True), output)
 
-    # Apply ordering if provided
-    if ordering:
-        acceptance_counts = acceptance_counts.reindex(ordering)
+    # Reuse the pooled figure of this chart if there is one, only updating its bars
+    template_key = _template_key(pool, 'create_stacked_bar_plot', (plot_title, grouping_column, rot),
+                                 [(None, counts_table)])
+    fig = _pooled_figure(pool, template_key, [counts_table])
+    pooled = fig is not None
 
-    # Plotting each segment with actual counts
-    for category in acceptance_counts.index:
-        total_count = acceptance_counts.loc[category].sum()
-        accept_count = acceptance_counts.loc[category, 1]
-        reject_count = acceptance_counts.loc[category, 0]
+    if not pooled:
+        # Create the stacked bar plot
+        fig = _new_figure(figsize=(12, 8))
+        ax = fig.add_subplot()
 
-        # Percentages for annotation
-        accept_percentage = (accept_count / total_count) * 100
-        reject_percentage = (reject_count / total_count) * 100
-
-        plt.bar(category, accept_count, label='Accepted (Y=1)' if category == acceptance_counts.index[0] else "",
-                color='green', alpha=0.6)
-        plt.bar(category, reject_count, bottom=accept_count,
-                label='Rejected (Y=0)' if category == acceptance_counts.index[0] else "", color='red', alpha=0.6)
-
-        # Annotating the bars with percentages
-        if accept_count > 0:
-            plt.text(category, accept_count / 2, f'{accept_percentage:.1f}%', ha='center', va='center', color='black')
-        if reject_count > 0:
-            plt.text(category, accept_count + reject_count / 2, f'{reject_percentage:.1f}%', ha='center', va='center',
-                     color='black')
-
-    plt.xticks(rotation=rot)
-    plt.title(plot_title)
-    plt.ylabel('Frequency')
-    plt.xlabel(' & '.join(grouping_column))
-    plt.legend()
-    plt.tight_layout()
-    plt.subplots_adjust(bottom=0.2)  # Adjust bottom margin
+        # Plotting the accepted and rejected stacks with actual counts, annotated with percentages
+        _draw_stacked_bars(ax, list(counts_table.index), counts_table, legend=True)
 
-    image_base64 = save_plot_as_base64(buffer, plt)
+        _rotate_xticks(ax, rot)
+        ax.set_title(plot_title)
+        ax.set_ylabel('Frequency')
+        ax.set_xlabel(' & '.join(grouping_column))
+        ax.legend()
+        _tight_layout(fig)
+        fig.subplots_adjust(bottom=0.2)  # Adjust bottom margin
 
-    return image_base64
+    image = save_figure(fig, output=output, image_format=image_format, compress_level=compress_level,
+                        relayout=not pooled)
+    _release_figure(pool, template_key, fig)
+
+    return image
 
 
 # Example usage:
 # image_base64 = create_stacked_bar_plot(['coupon', 'income_bracket'], df_cleaned, 45,ordering)
 
 
-def create_stacked_bar_plot_multi(grouping_columns, plot_title, df_cleaned, rotation=0, yscale='linear', ordering=None):
+@instrumented
+def create_stacked_bar_plot_multi(grouping_columns, plot_title, df_cleaned, rotation=0, yscale='linear', ordering=None,
+                                  output='base64', image_format='png', compress_level=None, backend='matplotlib',
+                                  pool=None, approximate=False, top=None, rank_by='count', page_size=None):
     """
         Create a stacked bar plot with multiple grouping columns and return the plot as a base64-encoded image string
         along with a DataFrame containing counts and acceptance rates for each category.
@@ -160,290 +173,342 @@ def create_stacked_bar_plot_multi(grouping_columns, plot_title, df_cleaned, rota
         Parameters:
         - grouping_columns (str or list): The column(s) used for grouping the data.
         - plot_title (str): The title for the stacked bar plot.
-        - df_cleaned (DataFrame): The cleaned DataFrame containing the data to be plotted.
+        - df_cleaned (DataFrame, BitmapIndex, CubeView, StoreView, AcceptanceSketch or iterable): The cleaned
+                                              DataFrame containing the data to be plotted (optionally wrapped in a
+                                              BitmapIndex), an AcceptanceCube, CountStore (view) or AcceptanceSketch
+                                              to look the counts up from, or an iterable of DataFrame chunks / CSV
+                                              partition paths to stream.
         - rotation (int, optional): The rotation angle for x-axis labels. Default is 0.
         - yscale (str, optional): The y-axis scale type ('linear' or 'log'). Default is 'linear'.
         - ordering (list, optional): A list specifying the desired order of categories. Default is None.
+        - output, image_format, compress_level (optional): How the image is encoded and returned, see save_figure.
+                                                           Default is a base64-encoded PNG.
+        - backend (str, optional): 'matplotlib' renders an image, 'plotly' returns a Plotly figure JSON spec for the
+                                   browser to draw instead (see PlotlySpecs). Default is 'matplotlib'.
+        - pool (FigurePool, optional): Pool of figure templates to reuse when this chart was drawn before, so only the
+                                       bars and labels are updated. Default is None (a new figure per call).
+        - approximate (bool or dict, optional): Count the data with an AcceptanceSketch of fixed memory and plot its
+                                                heavy-hitter groups with error bars. A dict sets the sketch's epsilon,
+                                                delta and top. Default is False (exact counts).
+        - top (int, optional): Plot only the top groups and fold the others into one 'Other' bar. Default is None
+                               (every group).
+        - rank_by (str, optional): How groups are ranked for top and page_size: 'count' by total offers, 'lift' by
+                                   acceptance rate, or None to keep the category order. The bars follow the ranking
+                                   unless an ordering is given. Default is 'count'.
+        - page_size (int, optional): Split the ranked groups into pages of page_size bars, returned as PlotPages in
+                                     place of the image; each page is rendered when it is requested. A '{page}' in an
+                                     output path is replaced by the page number. Default is None (one image).
 
         Returns:
-        - A tuple containing the base64-encoded image string and a DataFrame with counts and acceptance rates.
+        - A tuple containing the base64-encoded image string (or PlotPages) and a DataFrame with counts and
+          acceptance rates for every category.
+
+        Raises:
+        - ValueError: If top and page_size are both given, or either is not a positive integer.
 
         """
 
     # Ensure grouping_columns is a list
     if not isinstance(grouping_columns, list):
         grouping_columns = [grouping_columns]
+    if top is not None and page_size is not None:
+        raise ValueError("top and page_size cannot be combined")
+    df_cleaned = _sketched(df_cleaned, grouping_columns, approximate)
+
+    # Preparing the data: counts and percentages for every category in one vectorized pass
+    counts_table = _acceptance_table(df_cleaned, grouping_columns, ordering)
+
+    # Counts and acceptance rates for each category, whether or not it gets a bar of its own
+    results_df = results_frame(counts_table)
+
+    options = dict(rotation=rotation, yscale=yscale, output=output, image_format=image_format,
+                   compress_level=compress_level, backend=backend, pool=pool)
+    if page_size is not None:
+        ranked = counts_table if ordering or rank_by is None else rank_groups(counts_table, rank_by)
+        return PlotPages(ranked, page_size, grouping_columns, plot_title, options), results_df
+    if top is not None:
+        counts_table = top_groups(counts_table, top, rank_by or 'count', keep_order=bool(ordering) or rank_by is None)
+    image = _render_stacked_bar_plot_multi(counts_table, grouping_columns, plot_title, **options)
+    return image, results_df
+
+
+def _render_stacked_bar_plot_multi(counts_table, grouping_columns, plot_title, rotation, yscale, output, image_format,
+                                   compress_level, backend, pool):
+    # Draws one create_stacked_bar_plot_multi chart of the given acceptance table and encodes it
+    if _use_plotly(backend):
+        panel = _plotly_panel(counts_table.index, counts_table, ' & '.join(grouping_columns), showlegend=True)
+        spec = figure_spec([panel], plot_title, rotation=rotation, yscale=yscale, legend=True)
+        return save_spec(spec, output)
+
+    # Reuse the pooled figure of this chart if there is one, only updating its bars
+    template_key = _template_key(pool, 'create_stacked_bar_plot_multi',
+                                 (plot_title, grouping_columns, rotation, yscale), [(None, counts_table)])
+    fig = _pooled_figure(pool, template_key, [counts_table])
+    pooled = fig is not None
+
+    if not pooled:
+        # Create the stacked bar plot
+        fig = _new_figure(figsize=(12, 8))
+        ax = fig.add_subplot()
+
+        # Plotting the accepted and rejected stacks with actual counts (tuples are converted to strings for labeling)
+        category_labels = [str(index) for index in counts_table.index]
+        _draw_stacked_bars(ax, category_labels, counts_table, legend=True)
+
+        # Customize plot appearance and labels
+        _rotate_xticks(ax, rotation)
+        ax.set_title(plot_title)
+        ax.set_ylabel('Frequency')
+        ax.set_xlabel(' & '.join(grouping_columns))
+        ax.legend()
+        _tight_layout(fig)
+        fig.subplots_adjust(bottom=0.2)  # Adjust bottom margin
+
+    image = save_figure(fig, rotation, yscale, output=output, image_format=image_format,
+                        compress_level=compress_level, relayout=not pooled)
+    _release_figure(pool, template_key, fig)
+    return image
+
+
+class PlotPages:
+    """
+    The pages of a paginated create_stacked_bar_plot_multi chart, each rendered only when it is requested.
 
-    # Preparing the data
-    acceptance_counts = df_cleaned.groupby(grouping_columns + ['Y']).size().unstack().fillna(0)
-
-    # Calculate total responses and percentages
-    total_responses = acceptance_counts.sum(axis=1)
-    percentages = acceptance_counts.divide(total_responses, axis=0) * 100
-
-    # Create the stacked bar plot
-    plt.figure(figsize=(12, 8))
-
-    # Apply ordering if provided
-    if ordering:
-        acceptance_counts = acceptance_counts.reindex(ordering)
-
-    # Create a list to accumulate results
-    results_list = []
-
-    # Plotting each segment with actual counts
-    for index, row in acceptance_counts.iterrows():
-        category_label = str(index)  # Convert tuple to string for labeling
-        total_count = row.sum()
-        accept_count = row.get(1, 0)
-        reject_count = row.get(0, 0)
-
-        # Percentages for annotation
-        accept_percentage = (accept_count / total_count) * 100
-        reject_percentage = (reject_count / total_count) * 100
+    The ranked groups are split into pages of page_size bars. `pages[0]` renders the first page with the output
+    options of the create call and `len(pages)` is the number of pages, so serving one page costs one chart of at
+    most page_size bars however many groups there are.
 
-        # Append results for this category
-        results_list.append({
-            'category_label': category_label,
-            'total_count': total_count,
-            'accept_count': accept_count,
-            'reject_count': reject_count,
-            'accept_percentage': accept_percentage,
-            'reject_percentage': reject_percentage
-        })
+    Example usage:
+        pages, results_df = create_stacked_bar_plot_multi(['occupation', 'income'], 'Occupation and Income',
+                                                          df_cleaned, 45, page_size=20)
+        first_image64 = pages[0]
+    """
 
-        plt.bar(category_label, accept_count, label='Accepted (Y=1)' if index == acceptance_counts.index[0] else "",
-                color='green', alpha=0.6)
-        plt.bar(category_label, reject_count, bottom=accept_count,
-                label='Rejected (Y=0)' if index == acceptance_counts.index[0] else "", color='red', alpha=0.6)
-
-        # Annotating the bars with percentages
-        if accept_count > 0:
-            plt.text(category_label, accept_count / 2, f'{accept_percentage:.1f}%', ha='center', va='center',
-                     color='black')
-        if reject_count > 0:
-            plt.text(category_label, accept_count + reject_count / 2, f'{reject_percentage:.1f}%', ha='center',
-                     va='center', color='black')
-
-    # Customize plot appearance and labels
-    plt.xticks(rotation=rotation)
-    plt.title(plot_title)
-    plt.ylabel('Frequency')
-    plt.xlabel(' & '.join(grouping_columns))
-    plt.legend()
-    plt.tight_layout()
-    plt.subplots_adjust(bottom=0.2)  # Adjust bottom margin
+    def __init__(self, table, page_size, grouping_columns, plot_title, options):
+        if isinstance(page_size, bool) or not isinstance(page_size, (int, np.integer)) or page_size < 1:
+            raise ValueError(f"page_size must be a positive integer, got {page_size!r}")
+        self.table = table
+        self.page_size = int(page_size)
+        self.grouping_columns = grouping_columns
+        self.plot_title = plot_title
+        self.options = options
+
+    def __len__(self):
+        return max(-(-len(self.table) // self.page_size), 1)
+
+    def __getitem__(self, page):
+        if isinstance(page, slice):
+            return [self[number] for number in range(*page.indices(len(self)))]
+        number = page + len(self) if page < 0 else page
+        if not 0 <= number < len(self):
+            raise IndexError(f"page {page} out of range for {len(self)} pages")
+        return _stacked_bar_plot_multi_page(self, number)
+
+    def __iter__(self):
+        return (self[number] for number in range(len(self)))
+
+    def __getstate__(self):
+        # Figure pools hold live figures, so a pickled PlotPages renders without one
+        return dict(self.__dict__, options=dict(self.options, pool=None))
+
+    def page_table(self, page):
+        """
+        Returns the acceptance table of the groups on one page.
+        """
+        return self.table.iloc[page * self.page_size:(page + 1) * self.page_size]
 
-    image_base64 = save_plot_as_base64(buffer, plt, rotation, yscale)
+    def page_results(self, page):
+        """
+        Returns the results DataFrame of the groups on one page.
+        """
+        return results_frame(self.page_table(page))
 
-    # Convert the results list to a DataFrame
-    results_df = pd.DataFrame(results_list)
 
-    return image_base64, results_df
+@instrumented
+def _stacked_bar_plot_multi_page(pages, page):
+    # Renders one page of a PlotPages chart, titled with its page number
+    options = dict(pages.options)
+    if isinstance(options['output'], str) and '{page}' in options['output']:
+        options['output'] = options['output'].format(page=page + 1)
+    title = f'{pages.plot_title} (page {page + 1} of {len(pages)})'
+    table = pages.page_table(page)
+    if recording():
+        note(categories=len(table))
+    return _render_stacked_bar_plot_multi(table, pages.grouping_columns, title, **options)
 
 
 # Example usage:
 # image_base64 = create_stacked_bar_plot(['Department', 'Experience_Level'], 'Department and Experience Level Acceptance Rate', df_cleaned, ordering=['Sales', 'HR', 'IT'])
-def create_subplot_grid(df, columns, plot_title, rotation=0, yscale='linear'):
+@instrumented
+def create_subplot_grid(df, columns, plot_title, rotation=0, yscale='linear', output='base64', image_format='png',
+                        compress_level=None, backend='matplotlib', pool=None):
     """
     Creates a grid of subplot stacked bar plots for the given DataFrame and columns.
 
     Parameters:
-    - df (DataFrame): The DataFrame containing the data to plot.
+    - df (DataFrame, BitmapIndex, CubeView, StoreView or iterable): The DataFrame containing the data to plot
+      (optionally wrapped in a BitmapIndex), an AcceptanceCube or CountStore (view) to look the counts up from, or an
+      iterable of DataFrame chunks / CSV partition paths, streamed in a single pass.
     - columns (list): A list of column names in the DataFrame to create subplots for.
     - plot_title (str): The title for the overall figure.
     - rotation (int): The rotation angle for x-axis labels. Default is 0.
     - yscale (str): The y-axis scale type ('linear' or 'log'). Default is 'linear'.
+    - output, image_format, compress_level (optional): How the image is encoded and returned, see save_figure. Default
+      is a base64-encoded PNG.
+    - backend (str, optional): 'matplotlib' renders an image, 'plotly' returns a Plotly figure JSON spec for the
+      browser to draw instead (see PlotlySpecs). Default is 'matplotlib'.
+    - pool (FigurePool, optional): Pool of figure templates to reuse when this chart was drawn before, so only the bars
+      and labels are updated. Default is None (a new figure per call).
 
     Returns:
     - A tuple containing the base64 encoded image string and a DataFrame of results.
     """
 
-    # List to collect DataFrame rows for results
-    results_list = []
-
-    # Create a 3x2 subplot grid
-    fig, axes = plt.subplots(2, 3, figsize=(15, 10), sharex=False)
-    axes = axes.flatten()
-
-    # Iterate over each column to create a subplot
-    for i, column in enumerate(columns):
-        # Group by the specified column and 'Y', calculate counts
-        acceptance_counts = df.groupby([column, 'Y']).size().unstack().fillna(0)
-        total_responses = acceptance_counts.sum(axis=1)
-
-        # Plotting each category within the column
-        for index, row in acceptance_counts.iterrows():
-            category_label = str(index)
-            total_count = row.sum()
-            accept_count = row.get(1, 0)
-            reject_count = row.get(0, 0)
-            accept_percentage = (accept_count / total_count) * 100
-            reject_percentage = (reject_count / total_count) * 100
-
-            # Append results for this category
-            results_list.append({
-                'subplot_label': f'Stacked Bar Plot for {column}',
-                'category': category_label,
-                'total_count': total_count,
-                'accept_count': accept_count,
-                'reject_count': reject_count,
-                'accept_percentage': accept_percentage,
-                'reject_percentage': reject_percentage
-            })
-
-            # Plotting and annotating bars
-            axes[i].bar(category_label, accept_count, color='green', alpha=0.6)
-            axes[i].bar(category_label, reject_count, bottom=accept_count, color='red', alpha=0.6)
-            if accept_count > 0:
-                axes[i].text(category_label, accept_count / 2, f'{accept_percentage:.1f}%', ha='center', va='center', color='black')
-            if reject_count > 0:
-                axes[i].text(category_label, accept_count + reject_count / 2, f'{reject_percentage:.1f}%', ha='center', va='center', color='black')
-
-        # Setting subplot titles and labels
-        axes[i].set_title(f'Stacked Bar Plot for {column}')
-        axes[i].set_xlabel(column)
-        axes[i].set_ylabel('Frequency')
-        axes[i].tick_params(axis='x', rotation=rotation)
-
-    # Adjust layout and titles
-    plt.tight_layout()
-    plt.subplots_adjust(top=0.9, hspace=0.6)
-    fig.suptitle(plot_title, fontsize=16)
-    fig.subplots_adjust(wspace=0.4)
-
-    # Hide unused subplots
-    for j in range(i + 1, len(axes)):
-        axes[j].axis('off')
+    # Count accepted and rejected offers for every category of each column (one pass for chunked input)
+    panels = _subplot_grid_panels(df, columns)
+
+    if _use_plotly(backend):
+        plotly_panels = [_plotly_panel(counts_table.index, counts_table, column, subplot_label, panel=i)
+                         for i, (column, (subplot_label, counts_table)) in enumerate(zip(columns, panels))]
+        spec = figure_spec(plotly_panels, plot_title, 2, 3, rotation, yscale)
+        return save_spec(spec, output), _panel_results(panels)
+
+    # Reuse the pooled figure of this chart if there is one, only updating its bars
+    template_key = _template_key(pool, 'create_subplot_grid', (plot_title, columns, rotation, yscale), panels)
+    fig = _pooled_figure(pool, template_key, [counts_table for _, counts_table in panels])
+    pooled = fig is not None
+
+    if not pooled:
+        # Create a 3x2 subplot grid
+        fig = _new_figure(figsize=(15, 10))
+        axes = fig.subplots(2, 3, sharex=False).flatten()
+
+        # Iterate over each column to create a subplot
+        for i, (column, (subplot_label, counts_table)) in enumerate(zip(columns, panels)):
+            # Plotting and annotating the bars of every category within the column
+            _draw_stacked_bars(axes[i], [str(index) for index in counts_table.index], counts_table)
+
+            # Setting subplot titles and labels
+            axes[i].set_title(subplot_label)
+            axes[i].set_xlabel(column)
+            axes[i].set_ylabel('Frequency')
+            axes[i].tick_params(axis='x', rotation=rotation)
+
+        # Adjust layout and titles
+        _tight_layout(fig)
+        fig.subplots_adjust(top=0.9, hspace=0.6)
+        fig.suptitle(plot_title, fontsize=16)
+        fig.subplots_adjust(wspace=0.4)
+
+        # Hide unused subplots
+        for j in range(i + 1, len(axes)):
+            axes[j].axis('off')
 
     # Save the plot as a base64 encoded image
-    image_base64 = save_plot_as_base64(buffer, plt, rotation, yscale)
+    image = save_figure(fig, rotation, yscale, output=output, image_format=image_format,
+                        compress_level=compress_level, relayout=not pooled)
+    _release_figure(pool, template_key, fig)
 
-    # Convert results list to DataFrame
-    results_df = pd.concat([pd.DataFrame([row]) for row in results_list], ignore_index=True)
+    # Combine the per-subplot results into one DataFrame
+    results_df = _panel_results(panels)
 
-    return image_base64, results_df
+    return image, results_df
 
 
 
-def create_overall_stacked_bar_plot(plot_title, df_cleaned, rotation=0, yscale='linear'):
-    plt.figure(figsize=(12, 8))
+@instrumented
+def create_overall_stacked_bar_plot(plot_title, df_cleaned, rotation=0, yscale='linear', output='base64',
+                                    image_format='png', compress_level=None, backend='matplotlib', pool=None):
+    # Calculate overall acceptance counts and percentages
+    overall_df = overall_stacked_bar_plot_results(df_cleaned)
 
-    # Calculate overall acceptance counts
-    overall_acceptance = df_cleaned['Y'].value_counts().reindex([0, 1], fill_value=0)
-    overall_total = overall_acceptance.sum()
-    overall_accept_count = overall_acceptance.get(1, 0)
-    overall_reject_count = overall_acceptance.get(0, 0)
+    if _use_plotly(backend):
+        panel = _plotly_panel(['Overall'], overall_df, 'Overall Data', showlegend=True)
+        return save_spec(figure_spec([panel], plot_title, rotation=rotation, yscale=yscale, legend=True), output)
 
-    # Overall percentages for annotation
-    overall_accept_percentage = (overall_accept_count / overall_total) * 100 if overall_total > 0 else 0
-    overall_reject_percentage = (overall_reject_count / overall_total) * 100 if overall_total > 0 else 0
+    # Reuse the pooled figure of this chart if there is one, only updating its bars
+    template_key = _template_key(pool, 'create_overall_stacked_bar_plot', (plot_title, rotation, yscale), [])
+    fig = _pooled_figure(pool, template_key, [overall_df])
+    pooled = fig is not None
 
-    # Plot overall bars
-    plt.bar('Overall', overall_accept_count, color='green', alpha=0.6)
-    plt.bar('Overall', overall_reject_count, bottom=overall_accept_count, color='red', alpha=0.6)
+    if not pooled:
+        fig = _new_figure(figsize=(12, 8))
+        ax = fig.add_subplot()
 
-    # Annotate overall bars
-    if overall_accept_count > 0:
-        plt.text('Overall', overall_accept_count / 2, f'{overall_accept_percentage:.1f}%', ha='center', va='center',
-                 color='black')
-    if overall_reject_count > 0:
-        plt.text('Overall', overall_accept_count + overall_reject_count / 2, f'{overall_reject_percentage:.1f}%',
-                 ha='center', va='center', color='black')
-
-    # Set plot parameters
-    plt.xticks(rotation=rotation)
-    plt.title(plot_title)
-    plt.ylabel('Frequency')
-    plt.xlabel('Overall Data')
-    plt.legend(['Accepted (Y=1)', 'Rejected (Y=0)'])
-    plt.yscale(yscale)
-    plt.tight_layout()
-    plt.subplots_adjust(bottom=0.2)
+        # Plot and annotate overall bars
+        _draw_stacked_bars(ax, ['Overall'], overall_df)
 
-    image_base64 = save_plot_as_base64(buffer, plt, rotation, yscale)
+        # Set plot parameters
+        _rotate_xticks(ax, rotation)
+        ax.set_title(plot_title)
+        ax.set_ylabel('Frequency')
+        ax.set_xlabel('Overall Data')
+        ax.legend(['Accepted (Y=1)', 'Rejected (Y=0)'])
+        ax.set_yscale(yscale)
+        _tight_layout(fig)
+        fig.subplots_adjust(bottom=0.2)
 
-    return image_base64
+    image = save_figure(fig, rotation, yscale, output=output, image_format=image_format,
+                        compress_level=compress_level, relayout=not pooled)
+    _release_figure(pool, template_key, fig)
+
+    return image
 
 
 #  Example usage
 # plot_title = 'Overall Acceptance Rate'
 # image_base64 = create_overall_stacked_bar_plot(plot_title, df_cleaned, rotation=0, yscale='log')
 
+@instrumented
 def create_stacked_bar_plot_with_filters(filters, filter_labels, plot_title, group_descriptions, df_cleaned, rotation=0,
-                                         yscale='linear'):
-    plt.figure(figsize=(12, 8))
-
-    # DataFrame to store results
-    results_list = []  # List to collect DataFrame rows
-
-    # DataFrame to store results
-    #     results_df = pd.DataFrame(columns=['Group', 'Total_Count', 'Accept_Count', 'Reject_Count', 'Accept_Percentage', 'Reject_Percentage'])
-
-    # Apply each filter and plot the corresponding bar
-    for i, (filter_condition, label) in enumerate(zip(filters, filter_labels)):
-        # Apply filter
-        if filter_condition is not None:
-            filtered_df = df_cleaned.query(filter_condition) if isinstance(filter_condition, str) else df_cleaned[
-                filter_condition]
-        else:
-            filtered_df = df_cleaned
-
-        # Calculate acceptance counts
-        acceptance_counts = filtered_df['Y'].value_counts().reindex([0, 1], fill_value=0)
-        total_count = acceptance_counts.sum()
-        accept_count = acceptance_counts.get(1, 0)
-        reject_count = acceptance_counts.get(0, 0)
-
-        # Percentages for annotation
-        accept_percentage = (accept_count / total_count) * 100 if total_count else 0
-        reject_percentage = (reject_count / total_count) * 100 if total_count else 0
-
-        # Add row to results list
-        results_list.append({
-            'group_label': label,
-            'total_count': total_count,
-            'accept_count': accept_count,
-            'reject_count': reject_count,
-            'accept_percentage': accept_percentage,
-            'reject_percentage': reject_percentage
-        })
-
-        # Add results to DataFrame
-        #         results_df = results_df.append({'Group': label, 'Total_Count': total_count, 'Accept_Count': accept_count,
-        #                                         'Reject_Count': reject_count, 'Accept_Percentage': accept_percentage,
-        #                                         'Reject_Percentage': reject_percentage}, ignore_index=True)
-
-        # Plot bars
-        plt.bar(label, accept_count, color='green', alpha=0.6)
-        plt.bar(label, reject_count, bottom=accept_count, color='red', alpha=0.6)
-
-        # Annotate bars
-        if accept_count > 0:
-            plt.text(label, accept_count / 2, f'{accept_percentage:.1f}%', ha='center', va='center', color='black')
-        if reject_count > 0:
-            plt.text(label, accept_count + reject_count / 2, f'{reject_percentage:.1f}%', ha='center', va='center',
-                     color='black')
-
-    # Set plot parameters
-    plt.xticks(rotation=rotation)
-    plt.title(plot_title)
-    plt.ylabel('Frequency')
-    plt.xlabel('Groups')
-    plt.yscale(yscale)
-    plt.tight_layout()
-    plt.subplots_adjust(bottom=0.2)
-
-    if group_descriptions is not None:
-        legend_labels = [f'{key}: {value}' for key, value in group_descriptions.items()]
-        plt.legend(title='Group Descriptions', title_fontsize='13', loc='upper right', labels=legend_labels,
-                   borderaxespad=0.)
-
-    image_base64 = save_plot_as_base64(buffer, plt, rotation, yscale)
-
-    results_df = pd.concat([pd.DataFrame([row]) for row in results_list], ignore_index=True)
-
-    return image_base64, results_df
+                                         yscale='linear', output='base64', image_format='png', compress_level=None,
+                                         backend='matplotlib', pool=None):
+    # Calculate acceptance counts and percentages for every filter
+    results_df = stacked_bar_plot_with_filters_results(filters, filter_labels, df_cleaned)
+
+    if _use_plotly(backend):
+        panel = _plotly_panel(list(filter_labels[:len(results_df)]), results_df, 'Groups')
+        annotation = None
+        if group_descriptions is not None:
+            annotation = '<br>'.join(['<b>Group Descriptions</b>'] +
+                                     [f'{key}: {value}' for key, value in group_descriptions.items()])
+        spec = figure_spec([panel], plot_title, rotation=rotation, yscale=yscale, annotation=annotation)
+        return save_spec(spec, output), results_df
+
+    # Reuse the pooled figure of this chart if there is one, only updating its bars
+    template_key = _template_key(pool, 'create_stacked_bar_plot_with_filters',
+                                 (filter_labels, plot_title, group_descriptions, rotation, yscale), [])
+    fig = _pooled_figure(pool, template_key, [results_df])
+    pooled = fig is not None
+
+    if not pooled:
+        fig = _new_figure(figsize=(12, 8))
+        ax = fig.add_subplot()
+
+        # Plot and annotate the bars of all groups at once
+        accept_bars, reject_bars = _draw_stacked_bars(ax, list(filter_labels[:len(results_df)]), results_df)
+
+        # Set plot parameters
+        _rotate_xticks(ax, rotation)
+        ax.set_title(plot_title)
+        ax.set_ylabel('Frequency')
+        ax.set_xlabel('Groups')
+        ax.set_yscale(yscale)
+        _tight_layout(fig)
+        fig.subplots_adjust(bottom=0.2)
+
+        if group_descriptions is not None:
+            legend_labels = [f'{key}: {value}' for key, value in group_descriptions.items()]
+            # Descriptions pair up with the bars in drawing order: accepted then rejected for each group
+            legend_handles = [bar for pair in zip(accept_bars, reject_bars) for bar in pair][:len(legend_labels)]
+            ax.legend(legend_handles, legend_labels[:len(legend_handles)], title='Group Descriptions',
+                      title_fontsize='13', loc='upper right', borderaxespad=0.)
+
+    image = save_figure(fig, rotation, yscale, output=output, image_format=image_format,
+                        compress_level=compress_level, relayout=not pooled)
+    _release_figure(pool, template_key, fig)
+
+    return image, results_df
 
 
 # def create_stacked_bar_plot_with_filters(filters, filter_labels, plot_title, group_descriptions, df_cleaned, rotation=0, yscale='linear'):
@@ -526,82 +591,707 @@ def save_plot_as_base64(buffer, plt, rotation_angle=0, yscale='linear'):
 # image_base64 = save_plot_as_base64(buffer, plt)
 
 
+def save_figure_as_base64(fig, rotation_angle=0, yscale='linear', buffer=None):
+    """
+    Saves a Figure as a base64-encoded PNG without touching pyplot's global state.
+
+    Like save_plot_as_base64, the rotation and y-axis scale are applied to the figure's current axes.
+
+    Parameters:
+    - fig (Figure): The figure to save, created with _new_figure.
+    - rotation_angle (int, optional): Rotation of the x-axis labels. Default is 0.
+    - yscale (str, optional): The y-axis scale type ('linear' or 'log'). Default is 'linear'.
+    - buffer (BytesIO, optional): Buffer to write the PNG into. Default is None (a private buffer per call).
+
+    Returns:
+    - str: The base64-encoded PNG.
+    """
+    return save_figure(fig, rotation_angle, yscale, buffer)
+
+
+# Rendering backends of the create_* functions: server-side matplotlib images or client-side Plotly JSON specs
+BACKENDS = ('matplotlib', 'plotly')
+
+# Image formats save_figure can write; WebP is always written lossless
+IMAGE_FORMATS = ('png', 'webp', 'svg')
+
+# In-memory return types of save_figure; any other output is a file path or writable stream
+OUTPUT_MODES = ('base64', 'memoryview')
+
+
+def save_figure(fig, rotation_angle=0, yscale='linear', buffer=None, output='base64', image_format='png',
+                compress_level=None, relayout=True):
+    """
+    Saves a Figure in the requested format and hands it back as base64, as a memoryview or by writing to a sink.
+
+    Like save_plot_as_base64, the rotation and y-axis scale are applied to the figure's current axes.
+
+    Parameters:
+    - fig (Figure): The figure to save, created with _new_figure.
+    - rotation_angle (int, optional): Rotation of the x-axis labels. Default is 0.
+    - yscale (str, optional): The y-axis scale type ('linear' or 'log'). Default is 'linear'.
+    - buffer (BytesIO, optional): Buffer to render into for the in-memory outputs. Default is None (a private buffer
+      per call). A buffer with a memoryview still open cannot be reused until the view is released.
+    - output (str, path or stream, optional): 'base64' for a base64 string, 'memoryview' for a view of the rendered
+      bytes without copying them, or a file path / binary stream to write the image to directly. Default is 'base64'.
+    - image_format (str, optional): One of 'png', 'webp' (lossless) or 'svg'. Default is 'png'.
+    - compress_level (int, optional): zlib level 0-9 for PNG output. Default is None (matplotlib's default).
+    - relayout (bool, optional): Run tight_layout before saving. False keeps the figure's current layout, as pooled
+      templates do (see FigurePool). Default is True.
+
+    Returns:
+    - str, memoryview or None: The encoded image, or None when it was written to a file or stream.
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"image_format must be one of {IMAGE_FORMATS}, got {image_format!r}")
+    if compress_level is not None and image_format != 'png':
+        raise ValueError("compress_level only applies to PNG output")
+
+    # Format the plot
+    ax = fig.gca()
+    _rotate_xticks(ax, rotation_angle)
+    ax.set_yscale(yscale)
+    if relayout:
+        _tight_layout(fig)
+
+    save_options = {'format': image_format, 'bbox_inches': 'tight'}
+    if image_format == 'webp':
+        save_options['pil_kwargs'] = {'lossless': True}
+    elif compress_level is not None:
+        save_options['pil_kwargs'] = {'compress_level': compress_level}
+
+    if recording():
+        note(artists=_count_artists(fig))
+
+    if not (isinstance(output, str) and output in OUTPUT_MODES):
+        # Write straight into the caller's file or stream, with no intermediate buffer
+        with stage('savefig'):
+            fig.savefig(output, **save_options)
+        return None
+
+    if buffer is None:
+        buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+
+    # Save the plot to the buffer
+    with stage('savefig'):
+        fig.savefig(buffer, **save_options)
+
+    if output == 'memoryview':
+        return buffer.getbuffer()
+    with stage('encode'):
+        return base64.b64encode(buffer.getbuffer()).decode()
+
+
+def _new_figure(figsize):
+    # Figures are created outside pyplot with their own Agg canvas, so concurrent renders never share state.
+    # matplotlib is imported on the first render only, so stats-only callers never load it.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _tight_layout(fig):
+    # Timed as the 'layout' stage of an instrumented call
+    with stage('layout'):
+        fig.tight_layout()
+
+
+def _count_artists(fig):
+    # Bars, labels, lines and collections drawn on every axes of the figure
+    return sum(len(ax.patches) + len(ax.texts) + len(ax.lines) + len(ax.collections) for ax in fig.axes)
+
+
+def _rotate_xticks(ax, rotation):
+    # Same effect as plt.xticks(rotation=...) on the given axes
+    for label in ax.get_xticklabels():
+        label.set_rotation(rotation)
+
+
+# Sources holding precomputed counts rather than rows
+COUNT_VIEWS = (CubeView, StoreView, AcceptanceSketch)
+
+# Sources that build their own acceptance tables: count views, shared-memory datasets and engine sources
+TABLE_SOURCES = COUNT_VIEWS + (SharedView, EngineSource)
+
+
+def _sketched(source, grouping_columns, approximate):
+    # Replaces a row source by an AcceptanceSketch of it when approximate counts are requested
+    if not approximate or isinstance(source, COUNT_VIEWS):
+        return source
+    source = as_source(source)
+    if isinstance(source, BitmapIndex):
+        source = source.df
+    elif isinstance(source, SharedView):
+        source = source.frame()
+    elif isinstance(source, EngineSource):
+        # Only the grouping and response columns are read from the engine
+        source = source.chunks(list(grouping_columns) + [source.target_column])
+    options = approximate if isinstance(approximate, dict) else {}
+    with stage('aggregate'):
+        return AcceptanceSketch.from_source(_noted_chunks(source) if is_chunked(source) else source,
+                                            grouping_columns, **options)
+
+
+def _acceptance_table(source, grouping_columns, ordering=None):
+    # Precomputed cubes and count stores answer by lookup, DataFrames are aggregated in one vectorized pass
+    return _acceptance_tables(source, [grouping_columns], [ordering])[0]
+
+
+def _acceptance_tables(source, groupings, orderings=None):
+    # One acceptance table per grouping; chunked sources are streamed once for all groupings
+    orderings = orderings or [None] * len(groupings)
+    source = as_source(source)
+    if isinstance(source, BitmapIndex):
+        source = source.df
+    with stage('aggregate'):
+        if isinstance(source, EngineSource):
+            tables = source.acceptance_tables(groupings, orderings)
+        elif isinstance(source, TABLE_SOURCES):
+            tables = [source.acceptance_table(grouping, ordering) for grouping, ordering in zip(groupings, orderings)]
+        elif is_chunked(source):
+            tables = acceptance_tables_from_chunks(_noted_chunks(source), groupings, orderings)
+        else:
+            tables = [acceptance_table(source, grouping, ordering) for grouping, ordering in zip(groupings, orderings)]
+    if recording():
+        note(rows=_source_rows(source), categories=sum(len(table) for table in tables))
+    return tables
+
+
+def _filtered_acceptance_counts(source, filters):
+    # Returns (total_count, accept_count, reject_count) of the rows selected by each filter
+    source = as_source(source)
+    with stage('aggregate'):
+        if isinstance(source, COUNT_VIEWS):
+            counts = [_view_filter_counts(source, filter_condition) for filter_condition in filters]
+        elif isinstance(source, SharedView):
+            counts = [source.acceptance_counts(filter_condition) for filter_condition in filters]
+        elif isinstance(source, EngineSource):
+            counts = source.filtered_counts(filters)
+        elif is_chunked(source):
+            counts = filtered_counts_from_chunks(_noted_chunks(source), filters)
+        else:
+            # Count every filter with popcounts over shared (column, value) bitsets instead of one scan per filter
+            index = source if isinstance(source, BitmapIndex) else BitmapIndex(source)
+            counts = [index.acceptance_counts(filter_condition) for filter_condition in filters]
+    if recording():
+        note(rows=_source_rows(source), categories=len(filters))
+    return counts
+
+
+def _noted_chunks(source):
+    # Streams the chunks unchanged, adding their rows to the current instrumented call
+    if not recording():
+        return source
+    return (_note_rows(chunk) for chunk in iter_frames(source))
+
+
+def _note_rows(chunk):
+    note(rows=len(chunk))
+    return chunk
+
+
+def _source_rows(source):
+    # Rows behind the counts: the frame's length, or the total a count view stands for; streamed chunks are noted
+    # as they pass, and engines are not asked, as that would cost another scan
+    if isinstance(source, BitmapIndex):
+        return len(source.df)
+    if isinstance(source, COUNT_VIEWS):
+        return int(source.acceptance_counts()[0])
+    if isinstance(source, SharedView):
+        return len(source)
+    if isinstance(source, EngineSource):
+        return 0
+    if is_chunked(source):
+        return 0
+    return len(source)
+
+
+def _view_filter_counts(view, filter_condition):
+    if filter_condition is None:
+        return view.acceptance_counts()
+    if isinstance(filter_condition, COUNT_VIEWS):
+        return filter_condition.acceptance_counts()
+    if isinstance(filter_condition, dict):
+        return view.where(filter_condition).acceptance_counts()
+    raise ValueError("Filters on an AcceptanceCube or CountStore must be None, a dict of column values or a view")
+
+
+def _draw_stacked_bars(ax, labels, counts, legend=False):
+    """
+    Draws the accepted (green) and rejected (red) stacks of every category with one bar call per series.
+
+    Parameters:
+    - ax (Axes): The axes to draw on.
+    - labels (list): The x position or label of each bar.
+    - counts (DataFrame or dict): 'accept_count', 'reject_count', 'accept_percentage' and 'reject_percentage'
+      values aligned with labels.
+    - legend (bool, optional): Label the two series for the legend. Default is False.
+
+    Returns:
+    - tuple: The (accepted, rejected) BarContainers.
+    """
+    accept = np.asarray(counts['accept_count'], dtype=float)
+    reject = np.asarray(counts['reject_count'], dtype=float)
+
+    accept_bars = ax.bar(labels, accept, label='Accepted (Y=1)' if legend else None, color='green', alpha=0.6)
+    reject_bars = ax.bar(labels, reject, bottom=accept, label='Rejected (Y=0)' if legend else None,
+                         color='red', alpha=0.6)
+
+    _label_stacked_bars(ax, accept_bars, reject_bars, accept, reject, counts)
+    if 'accept_count_low' in counts:
+        # Approximate counts: the bar tops are upper bounds, the error bars reach down to the lower bounds
+        low = np.asarray(counts['accept_count_low'], dtype=float) + np.asarray(counts['reject_count_low'], dtype=float)
+        ax.errorbar(labels, accept + reject, yerr=[accept + reject - low, np.zeros(len(low))], fmt='none',
+                    ecolor='black', capsize=3)
+    return accept_bars, reject_bars
+
+
+def _label_stacked_bars(ax, accept_bars, reject_bars, accept, reject, counts):
+    # Annotating the bars with percentages, one bar_label call per stack
+    ax.bar_label(accept_bars, labels=_percentage_labels(accept, counts['accept_percentage']), label_type='center',
+                 color='black')
+    ax.bar_label(reject_bars, labels=_percentage_labels(reject, counts['reject_percentage']), label_type='center',
+                 color='black')
+
+
+def _template_key(pool, function, arguments, panels):
+    # Pooled figures are shared by calls drawing the same text: same arguments, panel titles and category labels
+    if pool is None or any('accept_count_low' in table for _, table in panels):
+        # Error bars of approximate counts are not updated in place, so those charts are always drawn afresh
+        return None
+    labels = tuple((repr(title), tuple(repr(label) for label in table.index)) for title, table in panels)
+    return function, repr(arguments), labels
+
+
+def _pooled_figure(pool, key, tables):
+    """
+    Checks out the pooled figure of a chart and updates its stacked bars to new counts.
+
+    Parameters:
+    - pool (FigurePool or None): The pool to take the figure from.
+    - key (tuple): The chart's template key, see _template_key.
+    - tables (list): The counts of every panel, in drawing order.
+
+    Returns:
+    - Figure or None: The updated figure, or None when the chart has to be drawn from scratch.
+    """
+    if pool is None or key is None:
+        return None
+    fig = pool.checkout(key)
+    if fig is None:
+        return None
+
+    # The panels are the axes holding bars, in the order they were drawn
+    bar_axes = [ax for ax in fig.axes if ax.containers]
+    for ax, counts in zip(bar_axes, tables):
+        accept = np.asarray(counts['accept_count'], dtype=float)
+        reject = np.asarray(counts['reject_count'], dtype=float)
+        accept_bars, reject_bars = ax.containers[:2]
+        for accept_bar, reject_bar, accepted, rejected in zip(accept_bars, reject_bars, accept, reject):
+            accept_bar.set_height(accepted)
+            reject_bar.set_y(accepted)
+            reject_bar.set_height(rejected)
+            # A bar's bottom is a sticky edge that autoscaling does not pad past (the bottom of a log axis)
+            reject_bar.sticky_edges.y[:] = [accepted]
+
+        # Replace the percentage labels and rescale the y-axis to the new stacks
+        for text in list(ax.texts):
+            text.remove()
+        _label_stacked_bars(ax, accept_bars, reject_bars, accept, reject, counts)
+        ax.relim()
+        ax.autoscale_view()
+    return fig
+
+
+def _release_figure(pool, key, fig):
+    # Hands a rendered figure back to the pool as the template of its chart
+    if pool is not None and key is not None:
+        pool.checkin(key, fig)
+
+
+def _use_plotly(backend):
+    # True for the client-side Plotly backend, False for matplotlib
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+    return backend == 'plotly'
+
+
+def _plotly_panel(labels, counts, xlabel, title=None, panel=0, showlegend=False):
+    # The Plotly equivalent of one _draw_stacked_bars call plus its axes labels
+    accept = np.asarray(counts['accept_count'], dtype=float)
+    reject = np.asarray(counts['reject_count'], dtype=float)
+    traces = stacked_bar_traces(labels, accept, reject, _percentage_labels(accept, counts['accept_percentage']),
+                                _percentage_labels(reject, counts['reject_percentage']), panel, showlegend)
+    if 'accept_count_low' in counts:
+        # Error bars from the estimated stack top down to the lower bound of approximate counts
+        low = np.asarray(counts['accept_count_low'], dtype=float) + np.asarray(counts['reject_count_low'], dtype=float)
+        traces[1]['error_y'] = {'type': 'data', 'symmetric': False, 'array': [0] * len(low),
+                                'arrayminus': _json_numbers(accept + reject - low), 'color': 'black'}
+    return {'traces': traces, 'xlabel': xlabel, 'title': title}
+
+
+def _percentage_labels(counts, percentages):
+    # Bars with a zero (or missing) count stay unlabelled
+    return [f'{percentage:.1f}%' if count > 0 else '' for count, percentage in zip(counts, percentages)]
+
+
+@instrumented
 def create_subplot_grid_dflist(dfs, column, plot_title, subplot_labels, rotation=0, yscale='linear', ordering=None,
-                               buffer=io.BytesIO()):
+                               buffer=None, output='base64', image_format='png', compress_level=None,
+                               backend='matplotlib', pool=None):
+    # Count accepted and rejected offers for the column in each DataFrame, applying the ordering if provided
+    panels = _subplot_grid_dflist_panels(dfs, column, subplot_labels, ordering)
+
+    if _use_plotly(backend):
+        plotly_panels = [_plotly_panel(counts_table.index, counts_table, column, subplot_label, panel=i)
+                         for i, (subplot_label, counts_table) in enumerate(panels)]
+        spec = figure_spec(plotly_panels, plot_title, 2, 2, rotation, yscale)
+        return save_spec(spec, output), _panel_results(panels)
+
+    # Reuse the pooled figure of this chart if there is one, only updating its bars
+    template_key = _template_key(pool, 'create_subplot_grid_dflist', (column, plot_title, rotation, yscale), panels)
+    fig = _pooled_figure(pool, template_key, [counts_table for _, counts_table in panels])
+    pooled = fig is not None
+
+    if not pooled:
+        # Create a 2x2 subplot grid
+        fig = _new_figure(figsize=(15, 10))
+        axes = fig.subplots(2, 2, sharex=False).flatten()
+
+        for i, (subplot_label, counts_table) in enumerate(panels):
+            # Plotting each segment with actual counts, annotated with percentages
+            _draw_stacked_bars(axes[i], [str(index) for index in counts_table.index], counts_table)
+
+            axes[i].set_title(subplot_label)
+            axes[i].set_xlabel(column)
+            axes[i].set_ylabel('Frequency')
+            axes[i].tick_params(axis='x', rotation=rotation)
+            axes[i].set_yscale(yscale)
+
+        # Adjust layout and add the main title
+        _tight_layout(fig)
+        fig.subplots_adjust(top=0.9, hspace=0.6)
+        fig.suptitle(plot_title, fontsize=16)
+        fig.subplots_adjust(wspace=0.4)
+
+        # Hide any unused subplots
+        for j in range(i + 1, len(axes)):
+            axes[j].axis('off')
+
+    # Save the plot as a base64 encoded image, into the caller's buffer if one was given
+    image = save_figure(fig, rotation, yscale, buffer, output, image_format, compress_level, relayout=not pooled)
+    _release_figure(pool, template_key, fig)
+
+    # Combine the per-subplot results into one DataFrame
+    results_df = _panel_results(panels)
+
+    return image, results_df
+
+
+@instrumented
+def create_subplot_grid_facets(df, facet_by, column, plot_title, facet_values=None, rotation=0, yscale='linear',
+                               ordering=None, ncols=2, buffer=None, output='base64', image_format='png',
+                               compress_level=None, backend='matplotlib', pool=None):
+    """
+    Creates one stacked bar subplot of a column per value of a facet column, from a single aggregation.
+
+    Unlike create_subplot_grid_dflist, no filtered copy of the data is made per panel: the counts of every panel come
+    from one grouping by [facet_by, column], and the grid grows to as many panels as there are facet values.
+
+    Parameters:
+    - df (DataFrame, BitmapIndex, CubeView, StoreView or iterable): The data to plot, see create_subplot_grid.
+    - facet_by (str): The column whose values split the data into panels, e.g. 'passenger'.
+    - column (str): The column plotted within each panel.
+    - plot_title (str): The title for the overall figure.
+    - facet_values (list, optional): The facet values to plot, in panel order. Default is every observed value.
+    - rotation (int, optional): The rotation angle for x-axis labels. Default is 0.
+    - yscale (str, optional): The y-axis scale type ('linear' or 'log'). Default is 'linear'.
+    - ordering (list, optional): Specific order for the categories of column. Default is None.
+    - ncols (int, optional): Number of panels per row. Default is 2.
+    - buffer (BytesIO, optional): Buffer to write the PNG into. Default is a new buffer.
+    - output, image_format, compress_level (optional): How the image is encoded and returned, see save_figure. Default
+      is a base64-encoded PNG.
+    - backend (str, optional): 'matplotlib' renders an image, 'plotly' returns a Plotly figure JSON spec for the
+      browser to draw instead (see PlotlySpecs). Default is 'matplotlib'.
+    - pool (FigurePool, optional): Pool of figure templates to reuse when this chart was drawn before, so only the bars
+      and labels are updated. Default is None (a new figure per call).
+
+    Returns:
+    - A tuple containing the base64 encoded image string and a DataFrame of results, laid out like the results of
+      create_subplot_grid_dflist with the facet values as subplot labels.
+    """
+
+    # Count accepted and rejected offers for every (facet, category) pair at once
+    panels = _subplot_grid_facets_panels(df, facet_by, column, facet_values, ordering)
+    nrows = -(-len(panels) // ncols)
+
+    if _use_plotly(backend):
+        plotly_panels = [_plotly_panel(panel_table.index, panel_table, column, facet_value, panel=i)
+                         for i, (facet_value, panel_table) in enumerate(panels)]
+        spec = figure_spec(plotly_panels, plot_title, nrows, ncols, rotation, yscale)
+        return save_spec(spec, output), _panel_results(panels)
+
+    # Reuse the pooled figure of this chart if there is one, only updating its bars
+    template_key = _template_key(pool, 'create_subplot_grid_facets', (column, plot_title, rotation, yscale, ncols),
+                                 panels)
+    fig = _pooled_figure(pool, template_key, [panel_table for _, panel_table in panels])
+    pooled = fig is not None
+
+    if not pooled:
+        # Grid with as many panels as facet values, each panel 7.5 x 5 inches
+        fig = _new_figure(figsize=(7.5 * ncols, 5 * nrows))
+        axes = fig.subplots(nrows, ncols, sharex=False, squeeze=False).flatten()
+
+        for i, (facet_value, panel_table) in enumerate(panels):
+            # Plotting each segment with actual counts, annotated with percentages
+            _draw_stacked_bars(axes[i], [str(index) for index in panel_table.index], panel_table)
+
+            axes[i].set_title(facet_value)
+            axes[i].set_xlabel(column)
+            axes[i].set_ylabel('Frequency')
+            axes[i].tick_params(axis='x', rotation=rotation)
+            axes[i].set_yscale(yscale)
+
+        # Adjust layout and add the main title
+        _tight_layout(fig)
+        fig.subplots_adjust(top=0.9, hspace=0.6)
+        fig.suptitle(plot_title, fontsize=16)
+        fig.subplots_adjust(wspace=0.4)
+
+        # Hide any unused subplots
+        for j in range(len(panels), len(axes)):
+            axes[j].axis('off')
+
+    # Save the plot as a base64 encoded image, into the caller's buffer if one was given
+    image = save_figure(fig, rotation, yscale, buffer, output, image_format, compress_level, relayout=not pooled)
+    _release_figure(pool, template_key, fig)
+
+    # Combine the per-subplot results into one DataFrame
+    results_df = _panel_results(panels)
+
+    return image, results_df
+
+
+# Stats-only entry points: the results of each create_* function without creating a figure
+
+@instrumented
+def stacked_bar_plot_results(grouping_column, df_cleaned, ordering=None):
+    """
+    Returns the counts and acceptance rates behind create_stacked_bar_plot, without rendering.
+
+    Returns:
+    - DataFrame: One row per category, laid out like the results of create_stacked_bar_plot_multi.
+    """
+    return stacked_bar_plot_multi_results(grouping_column, df_cleaned, ordering)
+
+
+@instrumented
+def stacked_bar_plot_multi_results(grouping_columns, df_cleaned, ordering=None, approximate=False):
+    """
+    Returns the results DataFrame of create_stacked_bar_plot_multi, without rendering.
+    """
+    if not isinstance(grouping_columns, list):
+        grouping_columns = [grouping_columns]
+    df_cleaned = _sketched(df_cleaned, grouping_columns, approximate)
+    return results_frame(_acceptance_table(df_cleaned, grouping_columns, ordering))
+
+
+@instrumented
+def subplot_grid_results(df, columns):
+    """
+    Returns the results DataFrame of create_subplot_grid, without rendering.
+    """
+    return _panel_results(_subplot_grid_panels(df, columns))
+
+
+@instrumented
+def overall_stacked_bar_plot_results(df_cleaned):
+    """
+    Returns the overall counts and acceptance rates behind create_overall_stacked_bar_plot, without rendering.
+
+    Returns:
+    - DataFrame: A single row labelled 'Overall', laid out like the results of create_stacked_bar_plot_with_filters.
+    """
+    return stacked_bar_plot_with_filters_results([None], ['Overall'], df_cleaned)
+
+
+@instrumented
+def stacked_bar_plot_with_filters_results(filters, filter_labels, df_cleaned):
+    """
+    Returns the results DataFrame of create_stacked_bar_plot_with_filters, without rendering.
+    """
     # DataFrame to store results
     results_list = []  # List to collect DataFrame rows
 
-    # Check if the number of DataFrames matches the number of subplot labels
-    if len(dfs) != len(subplot_labels):
-        raise ValueError("The number of DataFrames and subplot labels must be the same")
+    # Calculate acceptance counts for every filter (a single pass over chunked input)
+    filter_pairs = list(zip(filters, filter_labels))
+    filter_counts = _filtered_acceptance_counts(df_cleaned, [filter_condition for filter_condition, _ in filter_pairs])
 
-    # Create a 2x2 subplot grid
-    fig, axes = plt.subplots(2, 2, figsize=(15, 10), sharex=False)
-    axes = axes.flatten()
-
-    for i, df in enumerate(dfs):
-        # Group by the column and calculate acceptance counts
-        acceptance_counts = df.groupby([column, 'Y']).size().unstack().fillna(0)
-        total_responses = acceptance_counts.sum(axis=1)
-
-        if ordering:
-            acceptance_counts = acceptance_counts.reindex(ordering)
-
-        # Plotting each segment with actual counts
-        for index, row in acceptance_counts.iterrows():
-            category_label = str(index)
-            total_count = row.sum()
-            accept_count = row.get(1, 0)
-            reject_count = row.get(0, 0)
-            accept_percentage = (accept_count / total_count) * 100
-            reject_percentage = (reject_count / total_count) * 100
-
-            # Add row to results list
-            results_list.append({
-                'subplot_label': subplot_labels[i],
-                'category': category_label,
-                'total_count': total_count,
-                'accept_count': accept_count,
-                'reject_count': reject_count,
-                'accept_percentage': accept_percentage,
-                'reject_percentage': reject_percentage
-            })
-
-            # Plotting
-            axes[i].bar(category_label, accept_count, color='green', alpha=0.6)
-            axes[i].bar(category_label, reject_count, bottom=accept_count, color='red', alpha=0.6)
-
-            # Annotating the bars with percentages
-            if accept_count > 0:
-                axes[i].text(category_label, accept_count / 2, f'{accept_percentage:.1f}%', ha='center', va='center',
-                             color='black')
-            if reject_count > 0:
-                axes[i].text(category_label, accept_count + reject_count / 2, f'{reject_percentage:.1f}%', ha='center',
-                             va='center', color='black')
-
-        axes[i].set_title(subplot_labels[i])
-        axes[i].set_xlabel(column)
-        axes[i].set_ylabel('Frequency')
-        axes[i].tick_params(axis='x', rotation=rotation)
-        axes[i].set_yscale(yscale)
-
-    # Adjust layout and add the main title
-    plt.tight_layout()
-    plt.subplots_adjust(top=0.9, hspace=0.6)
-    fig.suptitle(plot_title, fontsize=16)
-    fig.subplots_adjust(wspace=0.4)
+    for (_, label), (total_count, accept_count, reject_count) in zip(filter_pairs, filter_counts):
+
+        # Percentages for annotation
+        accept_percentage = (accept_count / total_count) * 100 if total_count else 0
+        reject_percentage = (reject_count / total_count) * 100 if total_count else 0
+
+        # Add row to results list
+        results_list.append({
+            'group_label': label,
+            'total_count': total_count,
+            'accept_count': accept_count,
+            'reject_count': reject_count,
+            'accept_percentage': accept_percentage,
+            'reject_percentage': reject_percentage
+        })
+
+    return pd.DataFrame(results_list)
+
+
+@instrumented
+def subplot_grid_dflist_results(dfs, column, subplot_labels, ordering=None):
+    """
+    Returns the results DataFrame of create_subplot_grid_dflist, without rendering.
+    """
+    return _panel_results(_subplot_grid_dflist_panels(dfs, column, subplot_labels, ordering))
 
-    # Hide any unused subplots
-    for j in range(i + 1, len(axes)):
-        axes[j].axis('off')
 
-    # Save the plot as a base64 encoded image using the provided function
-    image_base64 = save_plot_as_base64(buffer, plt, rotation, yscale)
+@instrumented
+def subplot_grid_facets_results(df, facet_by, column, facet_values=None, ordering=None):
+    """
+    Returns the results DataFrame of create_subplot_grid_facets, without rendering.
+    """
+    return _panel_results(_subplot_grid_facets_panels(df, facet_by, column, facet_values, ordering))
 
-    # Convert results list to DataFrame
-    results_df = pd.concat([pd.DataFrame([row]) for row in results_list], ignore_index=True)
 
-    return image_base64, results_df
+# The stats-only counterpart of every create_* function
+RESULTS_FUNCTIONS = {
+    'create_stacked_bar_plot': stacked_bar_plot_results,
+    'create_stacked_bar_plot_multi': stacked_bar_plot_multi_results,
+    'create_subplot_grid': subplot_grid_results,
+    'create_overall_stacked_bar_plot': overall_stacked_bar_plot_results,
+    'create_stacked_bar_plot_with_filters': stacked_bar_plot_with_filters_results,
+    'create_subplot_grid_dflist': subplot_grid_dflist_results,
+    'create_subplot_grid_facets': subplot_grid_facets_results,
+}
+
+
+def results_only(function, *args, **kwargs):
+    """
+    Runs the stats-only counterpart of a create_* call with the same arguments, returning just the results table.
+
+    Plot-only arguments (titles, rotation, yscale, buffers, ...) are accepted and ignored, so a batch job can replay
+    the notebook's calls unchanged without importing matplotlib.
+
+    Parameters:
+    - function (callable or str): A create_* function or its name.
+    - *args, **kwargs: The arguments of the create_* call.
+
+    Returns:
+    - DataFrame: The results table the create_* function would return alongside its image.
+    """
+    name = function if isinstance(function, str) else function.__name__
+    if name not in RESULTS_FUNCTIONS:
+        raise ValueError(f"No stats-only counterpart for: {name}")
+    bound = inspect.signature(globals()[name]).bind(*args, **kwargs)
+    results_function = RESULTS_FUNCTIONS[name]
+    accepted = inspect.signature(results_function).parameters
+    return results_function(**{key: value for key, value in bound.arguments.items() if key in accepted})
 
 
+def _subplot_grid_panels(df, columns):
+    # (subplot label, acceptance table) of each column (one pass for chunked input)
+    counts_tables = _acceptance_tables(df, columns)
+    return [(f'Stacked Bar Plot for {column}', counts_table) for column, counts_table in zip(columns, counts_tables)]
 
+
+def _subplot_grid_dflist_panels(dfs, column, subplot_labels, ordering=None):
+    # Check if the number of DataFrames matches the number of subplot labels
+    if len(dfs) != len(subplot_labels):
+        raise ValueError("The number of DataFrames and subplot labels must be the same")
+    return [(label, _acceptance_table(df, column, ordering)) for df, label in zip(dfs, subplot_labels)]
+
+
+def _subplot_grid_facets_panels(df, facet_by, column, facet_values=None, ordering=None):
+    # One grouping by [facet_by, column], sliced into a (facet value, acceptance table) panel per facet
+    counts_table = _acceptance_table(df, [facet_by, column])
+    facet_level = counts_table.index.get_level_values(0)
+    if facet_values is None:
+        facet_values = list(facet_level.unique())
+    if not facet_values:
+        raise ValueError(f"No values to facet by in column '{facet_by}'")
+
+    panels = []
+    for facet_value in facet_values:
+        # Slice this panel's categories out of the shared table, applying the ordering if provided
+        panel_counts = counts_table[np.asarray(facet_level == facet_value, dtype=bool)]
+        panel_table = table_from_counts(panel_counts.index.droplevel(0), panel_counts['total_count'].to_numpy(),
+                                        panel_counts['accept_count'].to_numpy(),
+                                        panel_counts['reject_count'].to_numpy(), ordering)
+        panels.append((facet_value, panel_table))
+    return panels
+
+
+def _panel_results(panels):
+    # Combine the per-subplot results into one DataFrame
+    return pd.concat([results_frame(counts_table, 'category', {'subplot_label': label})
+                      for label, counts_table in panels], ignore_index=True)
+
+
+# Functions that can be named in a render_many plot spec
+PLOT_FUNCTIONS = {
+    'create_stacked_bar_plot': create_stacked_bar_plot,
+    'create_stacked_bar_plot_multi': create_stacked_bar_plot_multi,
+    'create_subplot_grid': create_subplot_grid,
+    'create_overall_stacked_bar_plot': create_overall_stacked_bar_plot,
+    'create_stacked_bar_plot_with_filters': create_stacked_bar_plot_with_filters,
+    'create_subplot_grid_dflist': create_subplot_grid_dflist,
+    'create_subplot_grid_facets': create_subplot_grid_facets,
+}
+
+
+def _render_spec(spec):
+    # Runs one (function, args[, kwargs]) plot spec; module level so process pools can pickle it
+    function, args = spec[0], spec[1]
+    kwargs = spec[2] if len(spec) > 2 else {}
+    if isinstance(function, str):
+        if function not in PLOT_FUNCTIONS:
+            raise ValueError(f"Unknown plot function: {function}")
+        function = PLOT_FUNCTIONS[function]
+    return function(*args, **kwargs)
+
+
+def render_many(plot_specs, executor='thread', max_workers=None):
+    """
+    Renders a batch of plots concurrently.
+
+    Every create_* function renders into its own Figure and buffer, so plots can be spread across a thread or
+    process pool without locking. A process pool pickles every DataFrame argument into its task; pass a SharedDataset
+    (or a view of it) instead to have the workers read one shared copy.
+
+    Parameters:
+    - plot_specs (list): Tuples of (function, args) or (function, args, kwargs), where function is one of the create_*
+      functions or its name.
+    - executor (str, optional): 'thread' or 'process'. Default is 'thread'.
+    - max_workers (int, optional): Size of the pool. Default is None (the executor's default, based on the core count).
+
+    Returns:
+    - list: The return value of each spec, in the order of plot_specs.
+
+    Example usage:
+    # results = render_many([('create_subplot_grid', (coffee_df, columns_to_plot, 'Coffee House', 45)),
+    #                        ('create_overall_stacked_bar_plot', ('Overall Acceptance Rate', df_cleaned))],
+    #                       executor='process')
+    """
+    if executor == 'thread':
+        pool_class = ThreadPoolExecutor
+    elif executor == 'process':
+        pool_class = ProcessPoolExecutor
+    else:
+        raise ValueError("executor must be 'thread' or 'process'")
+
+    with pool_class(max_workers=max_workers) as pool:
+        return list(pool.map(_render_spec, plot_specs))
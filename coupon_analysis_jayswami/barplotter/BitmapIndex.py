@@ -0,0 +1,199 @@
+"""
+BitmapIndex Module
+------------------
+
+Precomputed bitsets for fast filter counts in `create_stacked_bar_plot_with_filters`.
+
+The notebook draws a dozen filter bars per coupon type, each a query string such as
+`coupon == 'Coffee House' and passenger == 'Alone'`. Evaluating each string against the DataFrame scans the whole
+table once per filter. A BitmapIndex keeps one packed bitset (8 rows per byte) for every (column, value) pair, built
+on first use of a column, plus bitsets of the accepted rows and of the rows with a response.
+
+Filter strings are compiled into AND / OR / NOT operations over those bitsets, and the counts are popcounts of the
+resulting mask intersected with the response bitsets, so no rows are materialized and each extra filter costs a
+handful of operations over n_rows / 8 bytes.
+
+The compiler understands the query syntax used for filters: `==`, `!=`, `<`, `<=`, `>`, `>=`, `in` and `not in`
+between a column and literal value(s), combined with `and`/`&`, `or`/`|` and `not`/`~`. Anything else (e.g.
+arithmetic or `@variable` references) falls back to `DataFrame.eval`, so every filter that worked before still does.
+
+Example usage:
+    index = BitmapIndex(df_cleaned)
+    image64, results_df = create_stacked_bar_plot_with_filters(filters, filter_labels, 'Coffee House Acceptance',
+                                                               None, index)
+"""
+
+import ast
+import operator
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceStats import TARGET_COLUMN, _target_codes, filter_mask
+
+# Comparison operators of the query syntax, applied to a column's distinct values
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+_MIRRORED = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE, ast.Eq: ast.Eq, ast.NotEq: ast.NotEq}
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(bits):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+else:
+    _BYTE_POPCOUNTS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+    def _popcount(bits):
+        return int(_BYTE_POPCOUNTS[bits].sum(dtype=np.int64))
+
+
+class _Unsupported(Exception):
+    # Raised by the compiler for expressions it leaves to DataFrame.eval
+    pass
+
+
+class BitmapIndex:
+    """
+    Packed (column, value) bitsets of a dataset for filter counting without materializing rows.
+
+    Parameters:
+    - df (DataFrame): The dataset, containing the target column.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+    """
+
+    def __init__(self, df, target_column=TARGET_COLUMN):
+        self.df = df
+        self.target_column = target_column
+        self.n_rows = len(df)
+        self._columns = {}
+
+        y = _target_codes(df[target_column].to_numpy())
+        self._all = np.packbits(np.ones(self.n_rows, dtype=bool))
+        self._responded = np.packbits(y >= 0)
+        self._accepted = np.packbits(y == 1)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(rows={self.n_rows}, indexed_columns={list(self._columns)})'
+
+    def column_bitsets(self, column):
+        """
+        Returns (values, bitsets) for a column, building them on first use.
+
+        Returns:
+        - tuple: values is a Series of the column's distinct values, missing values included, and bitsets a uint8
+          array of shape (len(values), ceil(n_rows / 8)) whose row i marks the rows holding values[i].
+        """
+        entry = self._columns.get(column)
+        if entry is None:
+            if column not in self.df.columns:
+                raise _Unsupported(column)
+            codes, uniques = pd.factorize(self.df[column], use_na_sentinel=False)
+            bitsets = np.empty((len(uniques), len(self._all)), dtype=np.uint8)
+            for code in range(len(uniques)):
+                bitsets[code] = np.packbits(codes == code)
+            entry = self._columns[column] = (pd.Series(uniques), bitsets)
+        return entry
+
+    def mask(self, filter_condition):
+        """
+        Resolves a filter to a packed row bitset.
+
+        Parameters:
+        - filter_condition (str, dict, Series, array or None): A query string, a mapping of column name to value, a
+          boolean Series or array (see AcceptanceStats.filter_mask), or None for all rows.
+
+        Returns:
+        - ndarray: The packed uint8 bitset.
+        """
+        if filter_condition is None:
+            return self._all
+        if isinstance(filter_condition, dict):
+            bits = self._all
+            for column, value in filter_condition.items():
+                bits = bits & self._values_bits(column, lambda values, value=value: values == value)
+            return bits
+        if isinstance(filter_condition, str):
+            try:
+                return self._compile(ast.parse(filter_condition.strip(), mode='eval').body)
+            except (_Unsupported, SyntaxError, TypeError):
+                # Let DataFrame.eval handle (or reject) what the compiler does not cover
+                pass
+        return np.packbits(filter_mask(self.df, filter_condition))
+
+    def acceptance_counts(self, filter_condition=None):
+        """
+        Counts the rows selected by a filter as (total_count, accept_count, reject_count).
+        """
+        bits = self.mask(filter_condition)
+        total_count = _popcount(bits & self._responded)
+        accept_count = _popcount(bits & self._accepted)
+        return total_count, accept_count, total_count - accept_count
+
+    def _values_bits(self, column, select):
+        # OR of the bitsets of every distinct value of column for which select(values) holds
+        values, bitsets = self.column_bitsets(column)
+        selected = np.asarray(select(values), dtype=bool)
+        if not selected.any():
+            return np.zeros_like(self._all)
+        return np.bitwise_or.reduce(bitsets[selected], axis=0)
+
+    def _compile(self, node):
+        if isinstance(node, ast.BoolOp):
+            combine = np.bitwise_and if isinstance(node.op, ast.And) else np.bitwise_or
+            bits = self._compile(node.values[0])
+            for value in node.values[1:]:
+                bits = combine(bits, self._compile(value))
+            return bits
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            combine = np.bitwise_and if isinstance(node.op, ast.BitAnd) else np.bitwise_or
+            return combine(self._compile(node.left), self._compile(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+            # Clear the padding bits of the last byte again
+            return ~self._compile(node.operand) & self._all
+        if isinstance(node, ast.Compare):
+            # Chained comparisons (a < b < c) are the AND of their links
+            bits = self._all
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                bits = bits & self._compile_comparison(left, op, right)
+                left = right
+            return bits
+        raise _Unsupported(ast.dump(node))
+
+    def _compile_comparison(self, left, op, right):
+        if isinstance(right, ast.Name) and not isinstance(left, ast.Name) and type(op) in _MIRRORED:
+            left, op, right = right, _MIRRORED[type(op)](), left
+        if not isinstance(left, ast.Name):
+            raise _Unsupported(ast.dump(left))
+        column = left.id
+        literal = _literal(right)
+
+        if isinstance(op, (ast.In, ast.NotIn)) or (isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(literal, list)):
+            # As in DataFrame.query, comparing against a list means membership, and a None member matches missing
+            # values
+            members = literal if isinstance(literal, list) else [literal]
+            missing = any(pd.isna(member) for member in members)
+            bits = self._values_bits(column, lambda values: values.isin(members) | (missing & values.isna()))
+            return ~bits & self._all if isinstance(op, (ast.NotIn, ast.NotEq)) else bits
+        if isinstance(op, ast.NotEq):
+            # Missing values are != everything, so negate the equality instead of selecting values
+            return ~self._values_bits(column, lambda values: values == literal) & self._all
+        if type(op) in _COMPARISONS:
+            return self._values_bits(column, lambda values: _COMPARISONS[type(op)](values, literal))
+        raise _Unsupported(ast.dump(op))
+
+
+def _literal(node):
+    # Constants, negative numbers and lists/tuples of those
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        raise _Unsupported(ast.dump(node))
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return value
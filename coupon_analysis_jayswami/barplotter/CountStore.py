@@ -0,0 +1,278 @@
+"""
+CountStore Module
+-----------------
+
+Persistent, incrementally updated accept/reject counts for daily offer batches.
+
+New offers arrive every day in the `coupons.csv` schema. Re-reading the whole history and grouping it again for
+every plot makes each refresh slower than the last. A CountStore keeps, per registered grouping (a tuple of column
+names), the accept/reject tallies of every observed group in a single local file. `append(df)` folds a new batch in
+by grouping only the batch and merging the result into the stored tallies, so a refresh costs time proportional to
+the batch plus the (small) number of stored groups, never to the history.
+
+A store, or a view narrowed with `where`, can be passed to the BarPlotter functions in place of a DataFrame. A query
+is answered from the smallest registered grouping that covers its grouping columns and conditions:
+
+    store = CountStore('../data/coupon_counts.pkl',
+                       groupings=[('coupon', column) for column in columns_to_plot] +
+                                 [('coupon', 'passenger', column) for column in columns_to_plot])
+    store.append(load_coupons('../data/batches/2024-05-01.csv'))
+    coffee = store.where(coupon='Coffee House')
+    grid_image64, grid_df = create_subplot_grid(coffee, columns_to_plot, 'Coffee House Coupon Acceptance Rates', 45)
+    df_list = [coffee.where(passenger=passenger) for passenger in ['Alone', 'Friend(s)', 'Partner', 'Kid(s)']]
+
+A grouping registered after data has been appended has to be backfilled once from the history, see `add_grouping`.
+
+Rows with a missing value in a stored column are kept under a missing label, so a narrower grouping derived from a
+wider one still counts them; missing values are dropped only from the columns a query groups by, as
+AcceptanceStats.acceptance_table drops them.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceStats import (TARGET_COLUMN, CountAccumulator, _as_list, count_acceptance, iter_frames,
+                             table_from_counts)
+
+# Version of the on-disk layout, bumped whenever it changes
+_STORE_FORMAT = 2
+
+# Raw tallies kept per group; percentages are derived at query time
+TALLY_COLUMNS = ['total_count', 'accept_count', 'reject_count']
+
+
+class StoreView:
+    """
+    A read-only view of a CountStore restricted by equality conditions.
+
+    Parameters:
+    - store (CountStore): The store holding the counts.
+    - conditions (dict, optional): Mapping of column name to the value rows must have. Default is None.
+    """
+
+    def __init__(self, store, conditions=None):
+        self.store = store
+        self.conditions = dict(conditions or {})
+
+    def __repr__(self):
+        return f'{type(self).__name__}(rows={self.store.n_rows}, conditions={self.conditions})'
+
+    def where(self, conditions=None, **column_values):
+        """
+        Returns a narrower view with additional equality conditions.
+
+        Parameters:
+        - conditions (dict, optional): Mapping of column name to value, for column names that are not valid
+          keyword arguments.
+        - **column_values: Column name to value conditions.
+
+        Returns:
+        - StoreView: The combined view.
+        """
+        combined = dict(self.conditions)
+        combined.update(conditions or {})
+        combined.update(column_values)
+        return StoreView(self.store, combined)
+
+    def acceptance_table(self, grouping_columns, ordering=None):
+        """
+        Looks up acceptance counts and percentages for every category of the grouping column(s).
+
+        Parameters:
+        - grouping_columns (str or list): Column name(s) covered by a registered grouping.
+        - ordering (list, optional): Specific order for the categories. Default is None.
+
+        Returns:
+        - DataFrame: Same layout as AcceptanceStats.acceptance_table.
+        """
+        grouping_columns = _as_list(grouping_columns)
+        counts = self.store._lookup(grouping_columns, self.conditions)
+        return table_from_counts(counts.index, counts['total_count'].to_numpy(), counts['accept_count'].to_numpy(),
+                                 counts['reject_count'].to_numpy(), ordering)
+
+    def acceptance_counts(self):
+        """
+        Returns the overall counts of the view as (total_count, accept_count, reject_count).
+        """
+        if not self.conditions:
+            return tuple(int(value) for value in self.store._totals)
+        counts = self.store._lookup([], self.conditions)
+        return tuple(int(counts[column].sum()) for column in TALLY_COLUMNS)
+
+
+class CountStore(StoreView):
+    """
+    Accept/reject tallies per registered grouping, persisted in a local file and updated batch by batch.
+
+    Parameters:
+    - path (str): File holding the store. It is loaded if it exists and rewritten after every update.
+    - groupings (list, optional): Groupings to keep, each a column name or a list/tuple of names. Required when the
+      file does not exist yet; when it does, every grouping listed must already be stored.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+
+    Raises:
+    - ValueError: If a new store has no groupings or an existing store lacks one of the requested groupings.
+    """
+
+    def __init__(self, path, groupings=None, target_column=TARGET_COLUMN):
+        super().__init__(self)
+        self.path = path
+        self.target_column = target_column
+        self._fingerprint = None
+
+        if os.path.exists(path):
+            self._load()
+            missing = [tuple(_as_list(grouping)) for grouping in groupings or []
+                       if tuple(_as_list(grouping)) not in self._accumulators]
+            if missing:
+                raise ValueError(f"Groupings not held by the store at '{path}': {missing}. "
+                                 f"Register them with add_grouping(grouping, history)")
+        else:
+            if not groupings:
+                raise ValueError("A new CountStore needs at least one grouping")
+            self._accumulators = {}
+            for grouping in groupings:
+                key = tuple(_as_list(grouping))
+                self._accumulators[key] = CountAccumulator(list(key), target_column, keep_missing=True)
+            self._totals = np.zeros(3, dtype=np.int64)
+            self.n_rows = 0
+            self.n_batches = 0
+
+    @property
+    def groupings(self):
+        """
+        The registered groupings as tuples of column names.
+        """
+        return list(self._accumulators)
+
+    def append(self, batch, save=True):
+        """
+        Folds a new batch of offers into the stored tallies.
+
+        Only the batch is grouped; its per-group counts are then merged into the stored counts, so the cost does not
+        depend on how much history the store already holds.
+
+        Parameters:
+        - batch (DataFrame or iterable): The new rows, or DataFrame chunks / CSV partition paths (see
+          AcceptanceStats.iter_frames).
+        - save (bool, optional): Rewrite the store file afterwards. Default is True.
+
+        Returns:
+        - CountStore: The store itself, so calls can be chained.
+
+        Raises:
+        - ValueError: If the batch lacks a column used by a grouping or the target column.
+        """
+        frames = [batch] if isinstance(batch, pd.DataFrame) else iter_frames(batch)
+        for frame in frames:
+            required = {self.target_column}.union(*self._accumulators)
+            missing = sorted(required.difference(frame.columns))
+            if missing:
+                raise ValueError(f"Batch is missing columns used by the store: {missing}")
+            for accumulator in self._accumulators.values():
+                accumulator.add(frame)
+            self._totals += count_acceptance(frame[self.target_column].to_numpy())
+            self.n_rows += len(frame)
+        self.n_batches += 1
+        self._fingerprint = None
+        if save:
+            self.save()
+        return self
+
+    def add_grouping(self, grouping_columns, history, save=True):
+        """
+        Registers a new grouping and backfills it from the full history, a one-off cost.
+
+        Parameters:
+        - grouping_columns (str or list): Column name(s) of the new grouping.
+        - history (DataFrame or iterable): Every row appended so far, or its chunks / partition paths.
+        - save (bool, optional): Rewrite the store file afterwards. Default is True.
+
+        Raises:
+        - ValueError: If the history does not hold as many rows as the store.
+        """
+        key = tuple(_as_list(grouping_columns))
+        if key in self._accumulators:
+            return self
+        accumulator = CountAccumulator(list(key), self.target_column, keep_missing=True)
+        n_rows = 0
+        for frame in [history] if isinstance(history, pd.DataFrame) else iter_frames(history):
+            accumulator.add(frame)
+            n_rows += len(frame)
+        if n_rows != self.n_rows:
+            raise ValueError(f"The history has {n_rows} rows but the store has counted {self.n_rows}")
+        self._accumulators[key] = accumulator
+        self._fingerprint = None
+        if save:
+            self.save()
+        return self
+
+    def save(self):
+        """
+        Writes the store to its file, atomically replacing the previous version.
+        """
+        state = {
+            'format': _STORE_FORMAT,
+            'target_column': self.target_column,
+            'counts': {key: accumulator.counts for key, accumulator in self._accumulators.items()},
+            'totals': self._totals,
+            'n_rows': self.n_rows,
+            'n_batches': self.n_batches,
+        }
+        # Write to a temporary file first so a crash mid-write never corrupts the store
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        pd.to_pickle(state, temp_path)
+        os.replace(temp_path, self.path)
+
+    def fingerprint(self):
+        """
+        Returns a hex digest of the stored counts, recomputed only after an update.
+        """
+        if self._fingerprint is None:
+            hasher = hashlib.sha1()
+            hasher.update(repr((self.n_rows, self._totals.tolist())).encode())
+            for key, accumulator in self._accumulators.items():
+                hasher.update(repr(key).encode())
+                if accumulator.counts is not None:
+                    hasher.update(pd.util.hash_pandas_object(accumulator.counts, index=True).to_numpy().tobytes())
+            self._fingerprint = hasher.hexdigest()
+        return self._fingerprint
+
+    def _load(self):
+        state = pd.read_pickle(self.path)
+        if state.get('format') != _STORE_FORMAT:
+            raise ValueError(f"'{self.path}' was written in an unsupported CountStore format: {state.get('format')}")
+        if state['target_column'] != self.target_column:
+            raise ValueError(f"'{self.path}' counts '{state['target_column']}', not '{self.target_column}'")
+        self._accumulators = {key: CountAccumulator(list(key), self.target_column, counts, keep_missing=True)
+                              for key, counts in state['counts'].items()}
+        self._totals = np.asarray(state['totals'], dtype=np.int64)
+        self.n_rows = state['n_rows']
+        self.n_batches = state['n_batches']
+
+    def _lookup(self, grouping_columns, conditions):
+        """
+        Returns the raw counts of rows matching the conditions, grouped by grouping_columns.
+        """
+        needed = set(grouping_columns) | set(conditions)
+        covering = [key for key in self._accumulators if needed.issubset(key)]
+        if not covering:
+            raise ValueError(f"No grouping in the store covers the columns {sorted(needed)}; "
+                             f"registered groupings are {self.groupings}")
+        key = min(covering, key=len)
+        counts = self._accumulators[key].counts
+        if counts is None:
+            counts = CountAccumulator(list(key)).table()[TALLY_COLUMNS].astype(np.int64)
+
+        # Filter and re-aggregate the stored groups, never the rows; groups missing a requested column are dropped
+        rows = counts.reset_index()
+        mask = np.ones(len(rows), dtype=bool)
+        for column, value in conditions.items():
+            mask &= (rows[column] == value).to_numpy()
+        rows = rows[mask]
+        if not grouping_columns:
+            return rows[TALLY_COLUMNS]
+        return rows.groupby(grouping_columns, sort=True, observed=True)[TALLY_COLUMNS].sum()
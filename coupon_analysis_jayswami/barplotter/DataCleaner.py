@@ -0,0 +1,250 @@
+"""
+DataCleaner Module
+------------------
+
+Derives the cleaned coupon dataset (data/coupons_cleaned.csv) from a raw extract such as data/coupons.csv.
+
+The cleaning steps are the ones applied by hand in the first analysis notebook:
+
+- `passanger` is renamed to `passenger` and the mostly empty `car` column is dropped.
+- `age` is bucketed into ranges: '21' becomes '21-25', '26' becomes '26-30', and so on; 'below21' and '50plus' are kept.
+- Missing answers of the visit frequency columns (Bar, CoffeeHouse, CarryAway, RestaurantLessThan20,
+  Restaurant20To50) become 'no answer'.
+- `income_bracket` groups `income` into low (less than 25K), mid (25K to 75K) and high (75K or more) incomes.
+- `travel_time_category` labels the combination of the toCoupon_GEQ5min/15min/25min flags.
+
+Every column has only a handful of distinct values, so each mapping is applied to the distinct values once and
+spread to the rows through the column's integer codes, instead of a per-row apply. The result is typed with
+DataLoader's CLEANED_SCHEMA, exactly as `load_coupons` returns it.
+
+Raw files are cleaned chunk by chunk, so files larger than memory can be processed. The cleaned CSV gets a stamp
+file holding a hash of the raw file and of the cleaning rules: cleaning an unchanged raw file again returns at once.
+
+Example usage:
+    from DataCleaner import clean_coupons, clean_coupons_file
+    df_cleaned = clean_coupons(pd.read_csv('../data/coupons.csv'))
+    clean_coupons_file('../data/coupons.csv', '../data/coupons_cleaned.csv', chunksize=1_000_000)
+
+Command line usage (from the project root):
+    python barplotter/DataCleaner.py data/coupons.csv -o data/coupons_cleaned.csv
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from DataLoader import CLEANED_SCHEMA, apply_schema, schema_fingerprint
+
+# Columns renamed and dropped from the raw extract
+RAW_RENAMES = {'passanger': 'passenger'}
+DROPPED_COLUMNS = ['car']
+
+# Raw age values and the range each one starts
+AGE_BUCKETS = {'below21': 'below21', '21': '21-25', '26': '26-30', '31': '31-35', '36': '36-40', '41': '41-45',
+               '46': '46-50', '50plus': '50plus'}
+
+# Visit frequency columns and the answer recorded where the survey left them empty
+FREQUENCY_COLUMNS = ['Bar', 'CoffeeHouse', 'CarryAway', 'RestaurantLessThan20', 'Restaurant20To50']
+MISSING_FREQUENCY = 'no answer'
+
+INCOME_BRACKETS = {
+    'Less than $12500': 'Low Income (less than 25K)',
+    '$12500 - $24999': 'Low Income (less than 25K)',
+    '$25000 - $37499': 'Mid Income (25K to 75K)',
+    '$37500 - $49999': 'Mid Income (25K to 75K)',
+    '$50000 - $62499': 'Mid Income (25K to 75K)',
+    '$62500 - $74999': 'Mid Income (25K to 75K)',
+    '$75000 - $87499': 'High Income (75K or more)',
+    '$87500 - $99999': 'High Income (75K or more)',
+    '$100000 or More': 'High Income (75K or more)',
+}
+
+# Flags combined into the travel time label, and the label of each (GEQ5min, GEQ15min, GEQ25min) combination as
+# recorded in data/coupons_cleaned.csv; other combinations are left missing
+TRAVEL_TIME_FLAGS = ['toCoupon_GEQ5min', 'toCoupon_GEQ15min', 'toCoupon_GEQ25min']
+TRAVEL_TIME_CATEGORIES = {(1, 0, 0): 'Within 25 min', (1, 1, 0): 'Within 15 min', (1, 1, 1): 'Within 5 min'}
+
+# Bytes read at a time when hashing a raw file
+_HASH_BLOCK = 1 << 20
+
+
+def cleaning_fingerprint(schema=CLEANED_SCHEMA):
+    """
+    Returns a short hash of the cleaning rules and schema, so stamps written under other rules are never reused.
+    """
+    rules = repr((RAW_RENAMES, DROPPED_COLUMNS, AGE_BUCKETS, FREQUENCY_COLUMNS, MISSING_FREQUENCY,
+                  INCOME_BRACKETS, TRAVEL_TIME_FLAGS, sorted(TRAVEL_TIME_CATEGORIES.items())))
+    return hashlib.sha1((rules + schema_fingerprint(schema)).encode()).hexdigest()[:10]
+
+
+def map_categories(series, dtype, mapping=None, missing=None):
+    """
+    Maps the values of a column onto a categorical dtype through its distinct values.
+
+    Parameters:
+    - series (Series): The raw column.
+    - dtype (CategoricalDtype): The categories of the result.
+    - mapping (dict, optional): Raw value to category; values not in the mapping are kept as they are. Default is None.
+    - missing (str, optional): Category given to missing values. Default is None (they stay missing).
+
+    Returns:
+    - Categorical: The mapped column.
+
+    Raises:
+    - ValueError: If a value maps outside the categories of dtype.
+    """
+    codes, uniques = pd.factorize(series)
+    labels = [mapping.get(value, value) for value in uniques] if mapping else list(uniques)
+    targets = dtype.categories.get_indexer(labels)
+    unknown = [value for value, target in zip(uniques, targets) if target < 0]
+    if unknown:
+        raise ValueError(f"Column '{series.name}' has values outside its categories: {sorted(map(str, unknown))}")
+    missing_code = -1 if missing is None else dtype.categories.get_loc(missing)
+    return pd.Categorical.from_codes(np.append(targets, missing_code)[codes], dtype=dtype)
+
+
+def travel_time_categories(df, dtype=CLEANED_SCHEMA['travel_time_category']):
+    """
+    Labels the travel time of every row from its toCoupon_GEQ* flags.
+
+    Returns:
+    - Categorical: One label per row, missing for flag combinations without a label.
+    """
+    key = np.zeros(len(df), dtype=np.int8)
+    for column in TRAVEL_TIME_FLAGS:
+        key = key * 2 + (df[column].to_numpy() != 0)
+    lookup = np.full(2 ** len(TRAVEL_TIME_FLAGS), -1, dtype=np.int8)
+    for flags, label in TRAVEL_TIME_CATEGORIES.items():
+        lookup[int(''.join(map(str, flags)), 2)] = dtype.categories.get_loc(label)
+    return pd.Categorical.from_codes(lookup[key], dtype=dtype)
+
+
+def clean_coupons(raw_df, schema=CLEANED_SCHEMA):
+    """
+    Cleans a raw coupon DataFrame into the layout of data/coupons_cleaned.csv.
+
+    Parameters:
+    - raw_df (DataFrame): The raw data, as read from data/coupons.csv.
+    - schema (dict, optional): Mapping of column name to dtype of the result. Default is CLEANED_SCHEMA.
+
+    Returns:
+    - DataFrame: The cleaned, typed dataset with the raw row index.
+
+    Raises:
+    - ValueError: If a column is missing or holds values outside its declared categories.
+    """
+    df = raw_df.drop(columns=[column for column in DROPPED_COLUMNS if column in raw_df.columns])
+    df = df.rename(columns=RAW_RENAMES)
+    missing = [column for column in ['age', 'income'] + FREQUENCY_COLUMNS + TRAVEL_TIME_FLAGS
+               if column not in df.columns]
+    if missing:
+        raise ValueError(f"Columns missing from the raw dataset: {missing}")
+
+    columns = {column: df[column] for column in df.columns}
+    columns['age'] = map_categories(df['age'].astype(str).where(df['age'].notna()), schema['age'], AGE_BUCKETS)
+    for column in FREQUENCY_COLUMNS:
+        columns[column] = map_categories(df[column], schema[column], missing=MISSING_FREQUENCY)
+    columns['income_bracket'] = map_categories(df['income'], schema['income_bracket'], INCOME_BRACKETS)
+    columns['travel_time_category'] = travel_time_categories(df, schema['travel_time_category'])
+    return apply_schema(pd.DataFrame(columns, index=df.index), schema)
+
+
+def file_hash(path):
+    """
+    Returns the SHA-1 hex digest of a file's contents, read in blocks.
+    """
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(_HASH_BLOCK), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def stamp_path_for(cleaned_path):
+    """
+    Returns the path of the stamp file recording which raw file a cleaned CSV was derived from.
+    """
+    return f'{cleaned_path}.stamp.json'
+
+
+def _read_stamp(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_stamp(path, stamp):
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(stamp, file, indent=1)
+    os.replace(temp_path, path)
+
+
+def clean_coupons_file(raw_path, cleaned_path=None, chunksize=None, schema=CLEANED_SCHEMA, use_cache=True):
+    """
+    Cleans a raw coupon CSV into a cleaned CSV, unless the cleaned file already comes from identical raw contents.
+
+    Parameters:
+    - raw_path (str): Path to the raw CSV, e.g. '../data/coupons.csv'.
+    - cleaned_path (str, optional): Path of the cleaned CSV. Default is the raw path with a '_cleaned' suffix.
+    - chunksize (int, optional): Rows cleaned at a time. Default is None (the whole file at once).
+    - schema (dict, optional): Mapping of column name to dtype. Default is CLEANED_SCHEMA.
+    - use_cache (bool, optional): Skip the cleaning when the stamp matches the raw file. Default is True.
+
+    Returns:
+    - str: The path of the cleaned CSV.
+    """
+    if cleaned_path is None:
+        root, extension = os.path.splitext(raw_path)
+        cleaned_path = f'{root}_cleaned{extension or ".csv"}'
+    stamp_path = stamp_path_for(cleaned_path)
+    status = os.stat(raw_path)
+    stamp = {'raw_size': status.st_size, 'raw_mtime_ns': status.st_mtime_ns, 'rules': cleaning_fingerprint(schema)}
+
+    previous = _read_stamp(stamp_path) if use_cache and os.path.exists(cleaned_path) else None
+    if previous is not None and all(previous.get(key) == stamp[key] for key in stamp):
+        # The raw file was not touched since it was cleaned, so it is not even hashed
+        return cleaned_path
+
+    raw_sha1 = file_hash(raw_path)
+    if previous is not None and previous.get('rules') == stamp['rules'] and previous.get('raw_sha1') == raw_sha1:
+        # Touched but unchanged: only the stamp is refreshed
+        _write_stamp(stamp_path, dict(previous, **stamp))
+        return cleaned_path
+
+    # Write to a temporary file first so a concurrent reader never sees a partial cleaned file
+    temp_path = f'{cleaned_path}.{os.getpid()}.tmp'
+    chunks = pd.read_csv(raw_path, chunksize=chunksize) if chunksize else [pd.read_csv(raw_path)]
+    with open(temp_path, 'w', newline='') as cleaned_file:
+        for number, chunk in enumerate(chunks):
+            clean_coupons(chunk, schema).to_csv(cleaned_file, header=number == 0, index=False)
+    os.replace(temp_path, cleaned_path)
+    _write_stamp(stamp_path, dict(stamp, raw_sha1=raw_sha1))
+    return cleaned_path
+
+
+def main(argv=None):
+    """
+    Command line entry point: cleans a raw coupon CSV.
+    """
+    parser = argparse.ArgumentParser(description='Derive the cleaned coupon dataset from a raw extract.')
+    parser.add_argument('raw', help='Raw CSV file, e.g. data/coupons.csv.')
+    parser.add_argument('-o', '--output', help='Cleaned CSV file. Default is the raw file with a _cleaned suffix.')
+    parser.add_argument('--chunksize', type=int, help='Rows cleaned at a time. Default is the whole file.')
+    parser.add_argument('--force', action='store_true', help='Clean even if the raw file has not changed.')
+    args = parser.parse_args(argv)
+
+    cleaned_path = clean_coupons_file(args.raw, args.output, args.chunksize, use_cache=not args.force)
+    print(cleaned_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
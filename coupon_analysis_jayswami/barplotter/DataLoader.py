@@ -0,0 +1,173 @@
+"""
+DataLoader Module
+-----------------
+
+Typed loader for the cleaned coupon dataset (data/coupons_cleaned.csv).
+
+Every column of the dataset has fewer than 25 distinct values, so parsing it as text into object columns wastes
+both time and memory. This module declares a schema for the dataset: ordered categoricals for the columns that have
+a natural order (age buckets, income, visit frequencies, ...), plain categoricals for the nominal columns and int8
+for the 0/1 flags such as `Y` and `toCoupon_GEQ*min`.
+
+On the first load the typed DataFrame is written to a columnar binary cache next to the CSV (Feather when pyarrow
+is installed, a pickle otherwise). The cache file name carries a fingerprint of the schema, and later loads read
+the cache directly as long as it is newer than the CSV.
+
+Note: ordered categoricals are grouped in their declared order, so BarPlotter results for e.g. `age` come back as
+below21, 21-25, ..., 50plus instead of in alphabetical order.
+
+Example usage:
+    from DataLoader import load_coupons
+    df_cleaned = load_coupons('../data/coupons_cleaned.csv')
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# Category orderings used across the analysis
+AGE_ORDER = ['below21', '21-25', '26-30', '31-35', '36-40', '41-45', '46-50', '50plus']
+INCOME_ORDER = ['Less than $12500', '$12500 - $24999', '$25000 - $37499', '$37500 - $49999', '$50000 - $62499',
+                '$62500 - $74999', '$75000 - $87499', '$87500 - $99999', '$100000 or More']
+INCOME_BRACKET_ORDER = ['Low Income (less than 25K)', 'Mid Income (25K to 75K)', 'High Income (75K or more)']
+FREQUENCY_ORDER = ['never', 'less1', '1~3', '4~8', 'gt8', 'no answer']
+TIME_ORDER = ['7AM', '10AM', '2PM', '6PM', '10PM']
+EXPIRATION_ORDER = ['2h', '1d']
+TRAVEL_TIME_ORDER = ['Within 5 min', 'Within 15 min', 'Within 25 min']
+EDUCATION_ORDER = ['Some High School', 'High School Graduate', 'Some college - no degree', 'Associates degree',
+                   'Bachelors degree', 'Graduate degree (Masters or Doctorate)']
+
+# Declared dtypes of data/coupons_cleaned.csv
+CLEANED_SCHEMA = {
+    'destination': 'category',
+    'passenger': 'category',
+    'weather': 'category',
+    'temperature': 'int8',
+    'time': pd.CategoricalDtype(TIME_ORDER, ordered=True),
+    'coupon': 'category',
+    'expiration': pd.CategoricalDtype(EXPIRATION_ORDER, ordered=True),
+    'gender': 'category',
+    'age': pd.CategoricalDtype(AGE_ORDER, ordered=True),
+    'maritalStatus': 'category',
+    'has_children': 'int8',
+    'education': pd.CategoricalDtype(EDUCATION_ORDER, ordered=True),
+    'occupation': 'category',
+    'income': pd.CategoricalDtype(INCOME_ORDER, ordered=True),
+    'Bar': pd.CategoricalDtype(FREQUENCY_ORDER, ordered=True),
+    'CoffeeHouse': pd.CategoricalDtype(FREQUENCY_ORDER, ordered=True),
+    'CarryAway': pd.CategoricalDtype(FREQUENCY_ORDER, ordered=True),
+    'RestaurantLessThan20': pd.CategoricalDtype(FREQUENCY_ORDER, ordered=True),
+    'Restaurant20To50': pd.CategoricalDtype(FREQUENCY_ORDER, ordered=True),
+    'toCoupon_GEQ5min': 'int8',
+    'toCoupon_GEQ15min': 'int8',
+    'toCoupon_GEQ25min': 'int8',
+    'direction_same': 'int8',
+    'direction_opp': 'int8',
+    'Y': 'int8',
+    'income_bracket': pd.CategoricalDtype(INCOME_BRACKET_ORDER, ordered=True),
+    'travel_time_category': pd.CategoricalDtype(TRAVEL_TIME_ORDER, ordered=True),
+}
+
+try:
+    import pyarrow  # noqa: F401
+    _CACHE_FORMAT = 'feather'
+except ImportError:
+    _CACHE_FORMAT = 'pkl'
+
+
+def apply_schema(df, schema=CLEANED_SCHEMA):
+    """
+    Casts the columns of a DataFrame to the declared schema.
+
+    Parameters:
+    - df (DataFrame): The data as read from CSV.
+    - schema (dict, optional): Mapping of column name to dtype. Default is CLEANED_SCHEMA.
+
+    Returns:
+    - DataFrame: The typed DataFrame.
+
+    Raises:
+    - ValueError: If a declared column is missing or holds values outside its declared categories.
+    """
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise ValueError(f"Columns missing from the dataset: {missing}")
+
+    typed = {}
+    for column in df.columns:
+        dtype = schema.get(column)
+        if dtype is None:
+            typed[column] = df[column]
+            continue
+        values = df[column].astype(dtype)
+        if isinstance(dtype, pd.CategoricalDtype):
+            unknown = values.isna() & df[column].notna()
+            if unknown.any():
+                raise ValueError(f"Column '{column}' has values outside its declared categories: "
+                                 f"{sorted(df.loc[unknown, column].astype(str).unique())}")
+        typed[column] = values
+    return pd.DataFrame(typed, index=df.index)
+
+
+def schema_fingerprint(schema):
+    """
+    Returns a short hash of a schema, so caches written under a different schema are never reused.
+    """
+    description = repr([(column, repr(dtype)) for column, dtype in schema.items()])
+    return hashlib.sha1(description.encode()).hexdigest()[:10]
+
+
+def cache_path_for(csv_path, schema=CLEANED_SCHEMA):
+    """
+    Returns the path of the binary cache file used for a CSV file and schema.
+    """
+    root, _ = os.path.splitext(csv_path)
+    return f'{root}.{schema_fingerprint(schema)}.{_CACHE_FORMAT}'
+
+
+def _read_cache(path):
+    if _CACHE_FORMAT == 'feather':
+        return pd.read_feather(path)
+    return pd.read_pickle(path)
+
+
+def _write_cache(df, path):
+    # Write to a temporary file first so a concurrent reader never sees a partial cache
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    if _CACHE_FORMAT == 'feather':
+        df.reset_index(drop=True).to_feather(temp_path)
+    else:
+        df.to_pickle(temp_path)
+    os.replace(temp_path, path)
+
+
+def load_coupons(csv_path, schema=CLEANED_SCHEMA, use_cache=True):
+    """
+    Loads the coupon dataset with a typed schema, reusing the binary cache when it is up to date.
+
+    Parameters:
+    - csv_path (str): Path to the CSV file, e.g. '../data/coupons_cleaned.csv'.
+    - schema (dict, optional): Mapping of column name to dtype. Default is CLEANED_SCHEMA.
+    - use_cache (bool, optional): Read and write the binary cache next to the CSV. Default is True.
+
+    Returns:
+    - DataFrame: The typed dataset.
+    """
+    cache_path = cache_path_for(csv_path, schema)
+    if use_cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(csv_path):
+        return _read_cache(cache_path)
+
+    # Integer columns are parsed straight into their final dtype, categoricals are cast after parsing
+    integer_dtypes = {column: dtype for column, dtype in schema.items()
+                      if isinstance(dtype, str) and dtype != 'category' and np.dtype(dtype).kind in 'iu'}
+    df = apply_schema(pd.read_csv(csv_path, dtype=integer_dtypes), schema)
+
+    if use_cache:
+        try:
+            _write_cache(df, cache_path)
+        except OSError:
+            # A read-only data directory only costs us the cache, not the load
+            pass
+    return df
@@ -0,0 +1,598 @@
+"""
+Engines Module
+--------------
+
+Aggregation engines that count acceptances where the data lives, instead of in a pandas DataFrame in memory.
+
+Every BarPlotter chart reduces to a group-by count of accepted and rejected offers, optionally restricted by filters.
+An EngineSource answers those two questions (`acceptance_table` and `acceptance_counts`) by pushing them down to an
+engine:
+
+- 'duckdb': embedded DuckDB, over CSV or Parquet files (globs included), pandas DataFrames or DuckDB relations.
+- 'polars': Polars lazy queries over CSV or Parquet files, DataFrames or LazyFrames, collected with the streaming
+  engine.
+- 'pandas': pandas only; files are streamed in chunks of CHUNK_ROWS rows through AcceptanceStats.
+
+DuckDB and Polars run the group-by on all cores and stream files larger than memory without a server. Both receive
+the same SQL: the group-by with COUNT/SUM(CASE ...) tallies, and the filter strings of
+create_stacked_bar_plot_with_filters translated from the pandas query syntax (`==`, `!=`, `<`, `<=`, `>`, `>=`,
+`in`, `not in`, `and`/`&`, `or`/`|`, `not`/`~`) into a WHERE clause with the same handling of missing values as
+DataFrame.query, including its precedence of `&` and `|` below comparisons. Filters beyond that syntax are evaluated
+by pandas on the fetched rows. The engine returns one row per group; the acceptance table is assembled from it exactly
+as AcceptanceStats does, so `results_df` is unchanged.
+
+The create_* functions accept a file path, a Polars LazyFrame/DataFrame or a DuckDB relation wherever they take a
+DataFrame; it is opened with the first installed engine of DEFAULT_ENGINES. Use `open_source` to choose the engine
+and its options, and `where(...)` to narrow a source by column values.
+
+Example usage:
+    image64, results_df = create_subplot_grid('data/coupons_cleaned.csv', columns_to_plot, 'Acceptance Rates', 45)
+    coffee = open_source('data/coupons_*.parquet', engine='duckdb', threads=8).where(coupon='Coffee House')
+    image64, results_df = create_stacked_bar_plot_with_filters(filters, filter_labels, 'Coffee House', None, coffee)
+"""
+
+import ast
+import glob
+import hashlib
+import io
+import os
+import re
+import tokenize
+
+import pandas as pd
+
+from AcceptanceStats import (TARGET_COLUMN, _as_list, acceptance_tables_from_chunks, filtered_counts_from_chunks,
+                             table_from_counts)
+from BitmapIndex import _MIRRORED, _Unsupported, _literal
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# Engines tried in order when a path or lazy frame is passed without choosing one
+DEFAULT_ENGINES = ('duckdb', 'polars', 'pandas')
+
+# Rows per chunk when the pandas engine streams a file
+CHUNK_ROWS = 1_000_000
+
+# Name of the data in the SQL sent to DuckDB and Polars
+SOURCE_TABLE = 'coupons_source'
+
+# SQL spelling of the comparison operators of the query syntax
+_SQL_COMPARISONS = {ast.Eq: '=', ast.NotEq: '<>', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+
+# Backtick-quoted column names of the query syntax
+_BACKTICKS = re.compile(r'`([^`]*)`')
+
+# Data file paths and globs named in a query plan or SQL text
+_PLAN_PATHS = re.compile(r'''[^\s'"\[\](),]+\.(?:csv|tsv|parquet|ipc|arrow|feather|json|ndjson)(?:\.gz|\.zst)?''',
+                         re.IGNORECASE)
+
+
+def sql_name(column):
+    """
+    Returns a column name quoted as an SQL identifier.
+    """
+    return '"' + str(column).replace('"', '""') + '"'
+
+
+def sql_literal(value):
+    """
+    Returns a Python value written as an SQL literal.
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def query_to_sql(query):
+    """
+    Translates a filter in the DataFrame.query syntax into an SQL condition.
+
+    Every comparison is false on a missing value and `!=`/`not in` are the negation of `==`/`in`, as in
+    DataFrame.query, so the condition selects the same rows.
+
+    Parameters:
+    - query (str): The filter, e.g. "coupon == 'Bar' and Bar in ['1~3', '4~8', 'gt8']".
+
+    Returns:
+    - str: The SQL condition.
+
+    Raises:
+    - ValueError: If the filter uses syntax that cannot be pushed down (arithmetic, `@variable` references, ...).
+    """
+    # Backtick-quoted names are not Python syntax; stand-ins are parsed and swapped back afterwards
+    names = {}
+
+    def stand_in(match):
+        return names.setdefault(match.group(1), f'__column_{len(names)}__')
+
+    expression = _BACKTICKS.sub(stand_in, query.strip())
+    columns = {placeholder: name for name, placeholder in names.items()}
+    try:
+        return _compile_sql(ast.parse(_boolean_operators(expression), mode='eval').body, columns)
+    except (_Unsupported, SyntaxError, TypeError, ValueError, tokenize.TokenError):
+        raise ValueError(f"Filter cannot be pushed down to an engine: {query}") from None
+
+
+def _boolean_operators(expression):
+    # DataFrame.query gives & and | the precedence of `and` and `or`, below comparisons, so
+    # "temperature >= 55 & ~(Y == 1)" compares before combining; rewriting them keeps that reading
+    tokens = tokenize.generate_tokens(io.StringIO(expression).readline)
+    return tokenize.untokenize((tokenize.NAME, {'&': 'and', '|': 'or'}[token.string])
+                               if token.type == tokenize.OP and token.string in ('&', '|')
+                               else (token.type, token.string) for token in tokens)
+
+
+def _compile_sql(node, columns):
+    # SQL condition of a query syntax tree node, mirroring BitmapIndex._compile
+    if isinstance(node, ast.BoolOp):
+        joiner = ' AND ' if isinstance(node.op, ast.And) else ' OR '
+        return '(' + joiner.join(_compile_sql(value, columns) for value in node.values) + ')'
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        joiner = ' AND ' if isinstance(node.op, ast.BitAnd) else ' OR '
+        return '(' + _compile_sql(node.left, columns) + joiner + _compile_sql(node.right, columns) + ')'
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+        return f'(NOT {_compile_sql(node.operand, columns)})'
+    if isinstance(node, ast.Compare):
+        # Chained comparisons (a < b < c) are the AND of their links
+        links = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            links.append(_compile_sql_comparison(left, op, right, columns))
+            left = right
+        return links[0] if len(links) == 1 else '(' + ' AND '.join(links) + ')'
+    raise _Unsupported(ast.dump(node))
+
+
+def _compile_sql_comparison(left, op, right, columns):
+    if isinstance(right, ast.Name) and not isinstance(left, ast.Name) and type(op) in _MIRRORED:
+        left, op, right = right, _MIRRORED[type(op)](), left
+    if not isinstance(left, ast.Name):
+        raise _Unsupported(ast.dump(left))
+    column = sql_name(columns.get(left.id, left.id))
+    literal = _literal(right)
+
+    if isinstance(op, (ast.In, ast.NotIn)) or (isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(literal, list)):
+        # As in DataFrame.query, comparing against a list means membership, and a None member matches missing
+        # values
+        members = literal if isinstance(literal, list) else [literal]
+        present = [member for member in members if not pd.isna(member)]
+        condition = (f"COALESCE({column} IN ({', '.join(sql_literal(member) for member in present)}), FALSE)"
+                     if present else 'FALSE')
+        if len(present) < len(members):
+            condition = f'({condition} OR {column} IS NULL)'
+        return f'(NOT {condition})' if isinstance(op, (ast.NotIn, ast.NotEq)) else condition
+    if isinstance(op, ast.NotEq):
+        # Missing values are != everything, so negate the equality instead of comparing
+        return f'(NOT COALESCE({column} = {sql_literal(literal)}, FALSE))'
+    if type(op) in _SQL_COMPARISONS:
+        return f'COALESCE({column} {_SQL_COMPARISONS[type(op)]} {sql_literal(literal)}, FALSE)'
+    raise _Unsupported(ast.dump(op))
+
+
+def _conditions_sql(conditions):
+    # AND of the equality (or membership, for lists) conditions of a view
+    parts = []
+    for column, value in conditions.items():
+        if isinstance(value, (list, tuple, set)):
+            parts.append(f"{sql_name(column)} IN ({', '.join(sql_literal(member) for member in value)})")
+        else:
+            parts.append(f'{sql_name(column)} = {sql_literal(value)}')
+    return parts
+
+
+def _update_file_stamps(hasher, pattern):
+    # Hashes the path, size and modification time of every file matching pattern; returns the number of files
+    paths = sorted(glob.glob(pattern)) or ([pattern] if os.path.isfile(pattern) else [])
+    for path in paths:
+        status = os.stat(path)
+        hasher.update(repr((os.path.abspath(path), status.st_size, status.st_mtime_ns)).encode())
+    return len(paths)
+
+
+def _plan_fingerprint(plan):
+    # A query plan plus the stamps of the files it scans, so a plan over rewritten files hashes differently
+    hasher = hashlib.sha1(plan.encode())
+    for pattern in sorted(set(_PLAN_PATHS.findall(plan))):
+        _update_file_stamps(hasher, pattern)
+    return hasher.hexdigest()
+
+
+def _is_parquet(path):
+    return str(path).lower().endswith(('.parquet', '.pq'))
+
+
+class EngineSource:
+    """
+    Data counted by an aggregation engine, usable wherever BarPlotter takes a DataFrame.
+
+    Parameters:
+    - source: The data, as accepted by the engine (a file path or glob, or an in-memory frame).
+    - conditions (dict, optional): Column name to value (or list of values) restricting the rows. Default is None.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+    - **options: Engine options, see the engine's class.
+    """
+
+    engine = None
+
+    def __init__(self, source, conditions=None, target_column=TARGET_COLUMN, **options):
+        self.source = os.fspath(source) if isinstance(source, os.PathLike) else source
+        self.conditions = dict(conditions or {})
+        self.target_column = target_column
+        self.options = options
+
+    def __repr__(self):
+        source = self.source if isinstance(self.source, str) else type(self.source).__name__
+        return f'{type(self).__name__}({source!r}, conditions={self.conditions})'
+
+    def where(self, conditions=None, **column_values):
+        """
+        Returns a narrower source with additional equality conditions.
+
+        Parameters:
+        - conditions (dict, optional): Mapping of column name to value (or list of values), for column names that
+          are not valid keyword arguments.
+        - **column_values: Column name to value conditions.
+
+        Returns:
+        - EngineSource: The combined source, on the same engine.
+        """
+        combined = dict(self.conditions)
+        combined.update(conditions or {})
+        combined.update(column_values)
+        narrowed = type(self).__new__(type(self))
+        narrowed.__dict__.update(self.__dict__, conditions=combined)
+        return narrowed
+
+    def acceptance_table(self, grouping_columns, ordering=None):
+        """
+        Computes acceptance counts and percentages for every category of the grouping column(s).
+
+        Returns:
+        - DataFrame: Same layout as AcceptanceStats.acceptance_table.
+        """
+        return self.acceptance_tables([grouping_columns], [ordering])[0]
+
+    def acceptance_tables(self, groupings, orderings=None):
+        """
+        Computes one acceptance table per grouping.
+        """
+        orderings = orderings or [None] * len(groupings)
+        return [self._acceptance_table(_as_list(grouping), ordering)
+                for grouping, ordering in zip(groupings, orderings)]
+
+    def acceptance_counts(self, filter_condition=None):
+        """
+        Counts the rows selected by a filter as (total_count, accept_count, reject_count).
+
+        Parameters:
+        - filter_condition (optional): None for all rows, a dict of column values or a query string. Default is
+          None.
+        """
+        return self.filtered_counts([filter_condition])[0]
+
+    def filtered_counts(self, filters):
+        """
+        Returns (total_count, accept_count, reject_count) of the rows selected by each filter.
+        """
+        return [self._filtered_counts(filter_condition) for filter_condition in filters]
+
+    def chunks(self, columns=None):
+        """
+        Yields the rows of the source as pandas DataFrames, limited to the given columns.
+        """
+        yield self.frame(columns)
+
+    def fingerprint(self):
+        """
+        Returns a hash identifying the data and conditions: file paths by size and modification time, in-memory
+        frames by their contents or query plan.
+        """
+        description = (self.engine, self.target_column, sorted(self.conditions.items(), key=repr))
+        hasher = hashlib.sha1(repr(description).encode())
+        if isinstance(self.source, str):
+            if not _update_file_stamps(hasher, self.source):
+                raise FileNotFoundError(self.source)
+        else:
+            hasher.update(self._frame_fingerprint().encode())
+        return hasher.hexdigest()
+
+    def frame(self, columns=None):
+        raise NotImplementedError
+
+    def _acceptance_table(self, grouping_columns, ordering):
+        raise NotImplementedError
+
+    def _filtered_counts(self, filter_condition):
+        raise NotImplementedError
+
+    def _frame_fingerprint(self):
+        raise NotImplementedError
+
+
+class SqlSource(EngineSource):
+    """
+    An EngineSource whose engine runs SQL; subclasses provide `_run(sql)`, returning a pandas DataFrame.
+    """
+
+    def _acceptance_table(self, grouping_columns, ordering):
+        names = [sql_name(column) for column in grouping_columns]
+        valid = [f'{name} IS NOT NULL' for name in names]
+        result = self._run(f"SELECT {', '.join(names + self._tallies())} FROM {SOURCE_TABLE}"
+                           f"{self._where(valid)} GROUP BY {', '.join(names)}")
+        # Groups come back unordered; sort them as AcceptanceStats does
+        result = result.sort_values(grouping_columns, kind='stable')
+        if len(grouping_columns) == 1:
+            index = pd.Index(result[grouping_columns[0]], name=grouping_columns[0])
+        else:
+            index = pd.MultiIndex.from_frame(result[grouping_columns])
+        return table_from_counts(index, result['total_count'].to_numpy('int64'),
+                                 result['accept_count'].to_numpy('int64'), result['reject_count'].to_numpy('int64'),
+                                 ordering)
+
+    def _filtered_counts(self, filter_condition):
+        if filter_condition is None:
+            extra = []
+        elif isinstance(filter_condition, dict):
+            extra = _conditions_sql(filter_condition)
+        elif isinstance(filter_condition, str):
+            try:
+                extra = [query_to_sql(filter_condition)]
+            except ValueError:
+                # Filters beyond the SQL translation are evaluated by pandas on the fetched rows
+                return filtered_counts_from_chunks(self.chunks(), [filter_condition], self.target_column)[0]
+        else:
+            raise ValueError("Filters on an engine source must be None, a dict of column values or a query string")
+        result = self._run(f"SELECT {', '.join(self._tallies())} FROM {SOURCE_TABLE}{self._where(extra)}")
+        total, accept, reject = (int(result[column].fillna(0).iloc[0])
+                                 for column in ('total_count', 'accept_count', 'reject_count'))
+        return total, accept, reject
+
+    def frame(self, columns=None):
+        """
+        Returns the rows of the source as a pandas DataFrame, limited to the given columns.
+        """
+        selected = ', '.join(sql_name(column) for column in columns) if columns else '*'
+        return self._run(f'SELECT {selected} FROM {SOURCE_TABLE}{self._where([])}')
+
+    def _tallies(self):
+        # Responses, acceptances and rejections of a group; missing responses are not counted
+        target = sql_name(self.target_column)
+        return [f'COUNT({target}) AS total_count',
+                f'SUM(CASE WHEN {target} = 1 THEN 1 ELSE 0 END) AS accept_count',
+                f'SUM(CASE WHEN {target} = 0 THEN 1 ELSE 0 END) AS reject_count']
+
+    def _where(self, extra):
+        parts = _conditions_sql(self.conditions) + list(extra)
+        return ' WHERE ' + ' AND '.join(parts) if parts else ''
+
+    def _run(self, sql):
+        raise NotImplementedError
+
+
+class DuckDBSource(SqlSource):
+    """
+    Counts with embedded DuckDB.
+
+    Parameters:
+    - source (str, DataFrame or DuckDBPyRelation): A CSV or Parquet file path or glob, a pandas DataFrame or a
+      relation.
+    - threads (int, optional): Threads DuckDB may use. Default is all cores.
+    - memory_limit (str, optional): Memory DuckDB may use before spilling to disk, e.g. '4GB'. Default is DuckDB's.
+    """
+
+    engine = 'duckdb'
+
+    def __init__(self, source, conditions=None, target_column=TARGET_COLUMN, threads=None, memory_limit=None):
+        if duckdb is None:
+            raise ValueError("The 'duckdb' engine needs the duckdb package")
+        super().__init__(source, conditions, target_column, threads=threads, memory_limit=memory_limit)
+        self._connection = None
+
+    def __getstate__(self):
+        # Connections do not pickle; the receiving process opens its own
+        return dict(self.__dict__, _connection=None)
+
+    def _connect(self):
+        if self._connection is None:
+            config = {key: value for key, value in self.options.items() if value is not None}
+            connection = duckdb.connect(':memory:', config=config)
+            if isinstance(self.source, str):
+                reader = 'read_parquet' if _is_parquet(self.source) else 'read_csv_auto'
+                connection.execute(f'CREATE VIEW {SOURCE_TABLE} AS SELECT * FROM {reader}({sql_literal(self.source)})')
+            elif isinstance(self.source, pd.DataFrame):
+                connection.register(SOURCE_TABLE, self.source)
+            self._connection = connection
+        return self._connection
+
+    def _run(self, sql):
+        if not isinstance(self.source, (str, pd.DataFrame)):
+            # A relation runs the query on its own connection
+            return self.source.query(SOURCE_TABLE, sql).df()
+        return self._connect().execute(sql).df()
+
+    def _frame_fingerprint(self):
+        if isinstance(self.source, pd.DataFrame):
+            return hashlib.sha1(pd.util.hash_pandas_object(self.source).to_numpy().tobytes()).hexdigest()
+        return _plan_fingerprint(self.source.sql_query())
+
+
+class PolarsSource(SqlSource):
+    """
+    Counts with Polars lazy queries, collected with the streaming engine.
+
+    Parameters:
+    - source (str, polars.DataFrame or polars.LazyFrame): A CSV or Parquet file path or glob, or a Polars frame.
+    - streaming (bool, optional): Collect with the streaming engine, for data larger than memory. Default is True.
+    """
+
+    engine = 'polars'
+
+    def __init__(self, source, conditions=None, target_column=TARGET_COLUMN, streaming=True):
+        if pl is None:
+            raise ValueError("The 'polars' engine needs the polars package")
+        super().__init__(source, conditions, target_column, streaming=streaming)
+
+    def _lazy_frame(self):
+        if isinstance(self.source, str):
+            return pl.scan_parquet(self.source) if _is_parquet(self.source) else pl.scan_csv(self.source)
+        return self.source.lazy()
+
+    def _run(self, sql):
+        query = pl.SQLContext({SOURCE_TABLE: self._lazy_frame()}).execute(sql, eager=False)
+        if not self.options['streaming']:
+            result = query.collect()
+        else:
+            try:
+                result = query.collect(engine='streaming')
+            except TypeError:
+                # Polars releases before the engine argument
+                result = query.collect(streaming=True)
+        columns = {}
+        for name, dtype in result.schema.items():
+            values = result[name].to_list()
+            if isinstance(dtype, pl.Enum):
+                # Enums keep their declared order, like ordered categoricals
+                values = pd.Categorical(values, categories=dtype.categories.to_list(), ordered=True)
+            columns[name] = values
+        return pd.DataFrame(columns)
+
+    def _frame_fingerprint(self):
+        if isinstance(self.source, pl.DataFrame):
+            return str(self.source.hash_rows().sum())
+        return _plan_fingerprint(self.source.explain())
+
+
+class PandasSource(EngineSource):
+    """
+    Counts with pandas, streaming files in chunks.
+
+    Parameters:
+    - source (str or DataFrame): A CSV or Parquet file path or glob, or a DataFrame.
+    - chunksize (int, optional): Rows per chunk when streaming CSV files. Default is CHUNK_ROWS.
+    """
+
+    engine = 'pandas'
+
+    def __init__(self, source, conditions=None, target_column=TARGET_COLUMN, chunksize=CHUNK_ROWS):
+        super().__init__(source, conditions, target_column, chunksize=chunksize)
+
+    def acceptance_tables(self, groupings, orderings=None):
+        # One pass over the file for all groupings
+        columns = sorted({column for grouping in groupings for column in _as_list(grouping)} | {self.target_column})
+        return acceptance_tables_from_chunks(self.chunks(columns), groupings, orderings, self.target_column)
+
+    def filtered_counts(self, filters):
+        for filter_condition in filters:
+            if not (filter_condition is None or isinstance(filter_condition, (str, dict))):
+                raise ValueError("Filters on an engine source must be None, a dict of column values or a query string")
+        # Dict filters are conditions of a narrower source; the others share one pass over the file
+        queries = [filter_condition for filter_condition in filters if not isinstance(filter_condition, dict)]
+        counts = iter(filtered_counts_from_chunks(self.chunks(), queries, self.target_column) if queries else [])
+        return [self.where(filter_condition).acceptance_counts() if isinstance(filter_condition, dict) else next(counts)
+                for filter_condition in filters]
+
+    def chunks(self, columns=None):
+        if isinstance(self.source, pd.DataFrame):
+            frames = [self.source]
+        else:
+            paths = sorted(glob.glob(self.source)) or [self.source]
+            frames = self._read(paths, columns)
+        for frame in frames:
+            for column, value in self.conditions.items():
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                frame = frame[frame[column].isin(values)]
+            yield frame if columns is None else frame[columns]
+
+    def frame(self, columns=None):
+        """
+        Returns the rows of the source as a pandas DataFrame, limited to the given columns.
+        """
+        return pd.concat(self.chunks(columns), ignore_index=True)
+
+    def _read(self, paths, columns):
+        # Conditions need their columns read along with the requested ones
+        usecols = None if columns is None else sorted(set(columns) | set(self.conditions))
+        for path in paths:
+            if _is_parquet(path):
+                yield pd.read_parquet(path, columns=usecols)
+            else:
+                yield from pd.read_csv(path, usecols=usecols, chunksize=self.options['chunksize'])
+
+    def _frame_fingerprint(self):
+        return hashlib.sha1(pd.util.hash_pandas_object(self.source).to_numpy().tobytes()).hexdigest()
+
+
+# Engine name to EngineSource class
+ENGINES = {'duckdb': DuckDBSource, 'polars': PolarsSource, 'pandas': PandasSource}
+
+
+def available_engines():
+    """
+    Returns the names of the engines whose packages are installed, in order of preference.
+    """
+    installed = {'duckdb': duckdb is not None, 'polars': pl is not None, 'pandas': True}
+    return [engine for engine in DEFAULT_ENGINES if installed[engine]]
+
+
+def _native_engine(source):
+    # The engine owning a Polars frame or DuckDB relation, or None for other data
+    if duckdb is not None and isinstance(source, duckdb.DuckDBPyRelation):
+        return 'duckdb'
+    if pl is not None and isinstance(source, (pl.DataFrame, pl.LazyFrame)):
+        return 'polars'
+    return None
+
+
+def is_engine_input(source):
+    """
+    Returns True for data that BarPlotter hands to an engine: file paths, Polars frames and DuckDB relations.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return True
+    return _native_engine(source) is not None
+
+
+def open_source(source, engine=None, **options):
+    """
+    Opens data with an aggregation engine.
+
+    Parameters:
+    - source: A CSV or Parquet file path or glob, a DataFrame, a Polars frame or a DuckDB relation.
+    - engine (str, optional): 'duckdb', 'polars' or 'pandas'. Default is the engine matching a Polars or DuckDB
+      object, else the first installed engine of DEFAULT_ENGINES.
+    - **options: Options of the engine's EngineSource class, e.g. threads for DuckDB.
+
+    Returns:
+    - EngineSource: The opened source.
+
+    Raises:
+    - ValueError: If the engine is unknown or not installed.
+    """
+    if isinstance(source, EngineSource):
+        return source
+    if engine is None:
+        engine = _native_engine(source) or available_engines()[0]
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}; choose one of {sorted(ENGINES)}")
+    return ENGINES[engine](source, **options)
+
+
+def as_source(source):
+    """
+    Opens paths, Polars frames and DuckDB relations with the default engine; other sources are returned unchanged.
+    """
+    if is_engine_input(source):
+        return open_source(source)
+    return source
@@ -0,0 +1,90 @@
+"""
+FigurePool Module
+-----------------
+
+Reusable figure templates for charts that are served over and over with fresh counts.
+
+Drawing a BarPlotter chart from scratch creates the figure, axes and every bar, then lays it out twice with
+`tight_layout` and `subplots_adjust`. When a dashboard re-renders the same chart with new counts, all of that
+repeats although only the bar heights and percentage labels change. Passing a FigurePool to a `create_*` function
+keeps the finished figure as a template. The next call drawing the same chart checks the template out, updates the
+bars, labels and y-axis limits in place, and saves it without another layout pass.
+
+Templates are keyed by plot kind, number of panels and categories, category labels and the text arguments (title,
+axis labels, rotation, scale, ...). Each key therefore has one fixed layout. Layout is computed when a template is
+first drawn; later renders keep it, so y tick labels that grow by a digit (e.g. counts passing 10,000) can shift the
+margins slightly compared to a fresh render. `bbox_inches='tight'` still frames every saved image.
+
+A template is used by one render at a time. Concurrent calls for the same chart draw a fresh figure instead of
+waiting, and the pool keeps the first one returned. Figures cannot leave their process, so use a pool with
+`render_many(..., executor='thread')` only.
+
+Example usage:
+    pool = FigurePool(max_templates=64)
+    grid1_image64, result_df1 = create_subplot_grid(coffee_df, columns_to_plot, 'Coffee House Coupon Acceptance Rates',
+                                                    45, pool=pool)
+    pool.stats()
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class FigurePool:
+    """
+    A bounded LRU pool of laid-out figures keyed by chart.
+
+    Parameters:
+    - max_templates (int, optional): Number of idle figures kept. Default is 32.
+    """
+
+    def __init__(self, max_templates=32):
+        if max_templates < 1:
+            raise ValueError("max_templates must be at least 1")
+        self.max_templates = max_templates
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        # A constant repr, so RenderCache keys do not depend on which pool a call used
+        return f'{type(self).__name__}(max_templates={self.max_templates})'
+
+    def checkout(self, key):
+        """
+        Removes and returns the idle figure for a key, or None when the chart has to be drawn.
+        """
+        with self._lock:
+            fig = self._templates.pop(key, None)
+            if fig is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return fig
+
+    def checkin(self, key, fig):
+        """
+        Returns a rendered figure to the pool under its key, evicting the least recently used templates.
+        """
+        with self._lock:
+            if key in self._templates:
+                return
+            self._templates[key] = fig
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops every template and resets the counters.
+        """
+        with self._lock:
+            self._templates.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the number of idle templates as a dict.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'templates': len(self._templates)}
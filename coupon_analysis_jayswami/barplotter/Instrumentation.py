@@ -0,0 +1,250 @@
+"""
+Instrumentation Module
+----------------------
+
+Per-stage timing of the BarPlotter pipeline, for finding out which stage makes a report slow.
+
+Every `create_*` and `*_results` call becomes a CallRecord holding the call's duration split into stages, the
+number of rows aggregated, the number of categories in the resulting tables and the number of artists drawn:
+
+- aggregate: grouping and counting (acceptance tables, filter counts)
+- layout: every `tight_layout` run, in the function and again when saving
+- savefig: rasterizing (or writing SVG / WebP) with `bbox_inches='tight'`
+- encode: base64 encoding or JSON serialization
+- draw: the rest of the call, i.e. figure, axes and artist creation
+
+Finished records go to the registered listeners. `instrument()` collects them for a block of code, and
+StageCounters sums them into counters that can be exported in the Prometheus text format for a metrics agent.
+
+Nothing is recorded while no listener is registered: instrumented functions then cost one list check per call and
+stages one context-variable lookup. Calls running in a process pool (render_many with executor='process') report to
+the listeners of the worker process, not of the caller.
+
+Example usage:
+    with instrument() as records:
+        create_subplot_grid(coffee_df, columns_to_plot, 'Coffee House Coupon Acceptance Rates', 45)
+    records[0].as_dict()
+    # {'function': 'create_subplot_grid', 'duration': 1.1, 'rows': 3996, 'categories': 17, 'artists': 102,
+    #  'stages': {'aggregate': 0.01, 'layout': 0.45, 'savefig': 0.3, 'encode': 0.001, 'draw': 0.34}, ...}
+
+    counters = StageCounters()
+    add_listener(counters)
+    ...
+    counters.prometheus_text()
+"""
+
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+
+# Callables receiving every finished CallRecord
+_listeners = []
+_listeners_lock = threading.Lock()
+
+# Record of the instrumented call running in the current thread / task, if any
+_current_record = contextvars.ContextVar('barplotter_call_record', default=None)
+
+# Shared no-op context manager returned by stage() while nothing is being recorded
+_NOT_RECORDING = contextlib.nullcontext()
+
+# Stages measured directly; 'draw' is the remainder of the call
+STAGES = ('aggregate', 'layout', 'savefig', 'encode')
+
+
+class CallRecord:
+    """
+    Timings and sizes of one instrumented call.
+
+    Parameters:
+    - function (str): Name of the called function.
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.started = time.time()
+        self.duration = 0.0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.rows = 0
+        self.categories = 0
+        self.artists = 0
+        self.error = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.function}, duration={self.duration:.4f})'
+
+    def as_dict(self):
+        """
+        Returns the record as a plain dict, ready for JSON logging.
+        """
+        return {'function': self.function, 'started': self.started, 'duration': self.duration,
+                'stages': dict(self.stages), 'rows': self.rows, 'categories': self.categories,
+                'artists': self.artists, 'error': self.error}
+
+
+def add_listener(listener):
+    """
+    Registers a callable that receives every finished CallRecord, from any thread.
+    """
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    """
+    Unregisters a listener added with add_listener.
+    """
+    with _listeners_lock:
+        _listeners.remove(listener)
+
+
+@contextlib.contextmanager
+def instrument():
+    """
+    Collects the records of every instrumented call finished inside the block.
+
+    Returns:
+    - list: The CallRecords, filled in as calls finish.
+    """
+    records = []
+    add_listener(records.append)
+    try:
+        yield records
+    finally:
+        remove_listener(records.append)
+
+
+def stage(name):
+    """
+    Returns a context manager adding the time spent in its block to a stage of the current call.
+    """
+    record = _current_record.get()
+    if record is None:
+        return _NOT_RECORDING
+    return _Stage(record, name)
+
+
+def note(rows=0, categories=0, artists=0):
+    """
+    Adds row, category and artist counts to the current call, if one is being recorded.
+    """
+    record = _current_record.get()
+    if record is not None:
+        record.rows += rows
+        record.categories += categories
+        record.artists += artists
+
+
+def recording():
+    """
+    Returns True while the current call is being recorded, so counts that are costly to compute can be skipped.
+    """
+    return _current_record.get() is not None
+
+
+def instrumented(func):
+    """
+    Decorator recording each top-level call of func; calls nested inside a recorded call add to the outer record.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _listeners or _current_record.get() is not None:
+            return func(*args, **kwargs)
+
+        record = CallRecord(func.__name__)
+        token = _current_record.set(record)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            record.error = type(error).__name__
+            raise
+        finally:
+            record.duration = time.perf_counter() - start
+            record.stages['draw'] = max(record.duration - sum(record.stages[name] for name in STAGES), 0.0)
+            _current_record.reset(token)
+            _emit(record)
+    return wrapper
+
+
+class _Stage:
+    # Times one stage block of a recorded call
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.record.stages[self.name] = self.record.stages.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+def _emit(record):
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(record)
+
+
+class StageCounters:
+    """
+    A listener summing call records into monotonically increasing counters per function (and stage).
+
+    Register it with add_listener(counters) and expose counters.prometheus_text() on the metrics endpoint.
+    """
+
+    def __init__(self, prefix='barplotter'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._errors = {}
+        self._seconds = {}
+        self._stage_seconds = {}
+        self._rows = {}
+        self._categories = {}
+        self._artists = {}
+
+    def __call__(self, record):
+        function = record.function
+        with self._lock:
+            self._calls[function] = self._calls.get(function, 0) + 1
+            if record.error:
+                self._errors[function] = self._errors.get(function, 0) + 1
+            self._seconds[function] = self._seconds.get(function, 0.0) + record.duration
+            for name, seconds in record.stages.items():
+                key = (function, name)
+                self._stage_seconds[key] = self._stage_seconds.get(key, 0.0) + seconds
+            self._rows[function] = self._rows.get(function, 0) + record.rows
+            self._categories[function] = self._categories.get(function, 0) + record.categories
+            self._artists[function] = self._artists.get(function, 0) + record.artists
+
+    def snapshot(self):
+        """
+        Returns the current counters as a dict of {counter name: {label tuple: value}}.
+        """
+        with self._lock:
+            return {'calls_total': dict(self._calls), 'errors_total': dict(self._errors),
+                    'seconds_total': dict(self._seconds), 'stage_seconds_total': dict(self._stage_seconds),
+                    'rows_total': dict(self._rows), 'categories_total': dict(self._categories),
+                    'artists_total': dict(self._artists)}
+
+    def prometheus_text(self):
+        """
+        Returns the counters in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, values in self.snapshot().items():
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} counter')
+            for key, value in sorted(values.items()):
+                if isinstance(key, tuple):
+                    labels = f'function="{key[0]}",stage="{key[1]}"'
+                else:
+                    labels = f'function="{key}"'
+                lines.append(f'{metric}{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,520 @@
+"""
+PlotService Module
+------------------
+
+Asyncio front end that serves the BarPlotter charts to a dashboard without blocking the event loop.
+
+The `create_*` functions are CPU bound: aggregation and rendering hold the interpreter for tens to hundreds of
+milliseconds. Called directly from an async handler, one render stalls every other connection. A PlotService runs
+them in a bounded process pool (or thread pool) and adds what a dashboard under load needs:
+
+- Coalescing: identical requests that arrive while a render is in flight share that render. A burst of users
+  opening the same `create_subplot_grid` chart costs one render, not one per user.
+- Backpressure: at most `max_queue` distinct renders are admitted at a time. Further requests fail fast with
+  ServiceOverloaded (HTTP 503 with Retry-After) rather than queueing without bound and timing out late.
+- Timeouts: each request waits at most `timeout` seconds. A render that every waiter has given up on is cancelled if
+  it has not started yet.
+- An optional RenderCache answers repeated requests after their render has finished.
+
+Datasets are registered once by name. With a process pool, DataFrames are published as SharedDatasets that every
+worker attaches to when the pool starts, so requests only carry the dataset name and the plot arguments. A request names a dataset (or a list of names for `dfs`) and the remaining
+arguments of the create_* function, in the layout of a ReportPipeline plot:
+
+    {"function": "create_subplot_grid", "data": "coffee",
+     "args": {"columns": ["time", "weather"], "plot_title": "Coffee House Coupon Acceptance Rates", "rotation": 45}}
+
+A create_stacked_bar_plot_multi request with `page_size` renders one page, chosen by a `page` argument (default 0);
+the response adds the number of `pages`.
+
+`service.asgi` is an ASGI application (POST /plot, GET /stats, GET /health) that any ASGI server can host. `serve`
+hosts it on a minimal standard-library HTTP server, and StubClient calls it in-process for local tests.
+
+Example usage:
+    service = PlotService({'coupons': df_cleaned, 'coffee': coffee_df}, max_workers=4, timeout=10)
+    async with service:
+        image64, result_df = await service.plot('create_subplot_grid', 'coffee', columns=columns_to_plot,
+                                                plot_title='Coffee House Coupon Acceptance Rates', rotation=45)
+        status, body = await StubClient(service.asgi).post('/plot', {'function': 'create_overall_stacked_bar_plot',
+                                                                      'data': 'coupons',
+                                                                      'args': {'plot_title': 'Overall'}})
+
+Command line usage (from the project root):
+    python barplotter/PlotService.py --data coupons=data/coupons_cleaned.csv --port 8050 --workers 4
+"""
+
+import argparse
+import asyncio
+import collections
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from BarPlotter import PLOT_FUNCTIONS
+from RenderCache import fingerprint
+from SharedDataset import SharedDataset
+
+# Parameter names under which the create_* functions take their data, as in ReportPipeline
+DATA_PARAMETERS = ('df_cleaned', 'df', 'dfs')
+
+# Latencies kept for the percentiles reported by stats()
+LATENCY_WINDOW = 1000
+
+# Datasets of a worker process, installed once by the pool initializer
+_worker_datasets = {}
+
+
+class ServiceOverloaded(RuntimeError):
+    """
+    Raised when a request would exceed the service's queue of distinct renders.
+    """
+
+
+def _install_datasets(datasets):
+    # Pool initializer: keeps the registered datasets in the worker, so requests only name them
+    global _worker_datasets
+    _worker_datasets = datasets
+
+
+def _render_request(function, data_parameter, data, arguments, page=None, datasets=None):
+    # Runs one plot request in a worker; module level so process pools can pickle it
+    datasets = _worker_datasets if datasets is None else datasets
+    frames = [datasets[name] for name in data] if isinstance(data, list) else datasets[data]
+    result = PLOT_FUNCTIONS[function](**arguments, **{data_parameter: frames})
+    if page is None:
+        return result
+    # Paginated charts render only the requested page, returned with the number of pages
+    pages, results = result
+    if page >= len(pages):
+        raise ValueError(f"page {page} out of range for {len(pages)} pages")
+    return pages[page], results, len(pages)
+
+
+def _render_call(function, args, kwargs):
+    # Runs a create_* call with explicit arguments in a worker
+    return PLOT_FUNCTIONS[function](*args, **kwargs)
+
+
+def _copy_frames(result):
+    # Every waiter of a shared render gets its own results DataFrame
+    if isinstance(result, tuple):
+        return tuple(_copy_frames(item) for item in result)
+    if isinstance(result, pd.DataFrame):
+        return result.copy()
+    return result
+
+
+class _Render:
+    # One admitted render and the number of requests still waiting for it
+    def __init__(self, future):
+        self.future = future
+        self.waiters = 0
+
+
+class PlotService:
+    """
+    Serves create_* calls as coroutines with request coalescing, bounded queueing and per-request timeouts.
+
+    Parameters:
+    - datasets (dict, optional): Dataset name to DataFrame (or list of DataFrames) available to requests. Default is
+      None.
+    - executor (str, optional): 'process' renders in worker processes, 'thread' in threads of this process. Default
+      is 'process'.
+    - max_workers (int, optional): Size of the render pool. Default is None (one worker per core).
+    - max_queue (int, optional): Distinct renders admitted at once, running or waiting for a worker. Default is 64.
+    - timeout (float, optional): Seconds a request waits for its render. Default is 30.
+    - cache (RenderCache, optional): Keeps finished renders to answer repeated requests. Default is None.
+    """
+
+    def __init__(self, datasets=None, executor='process', max_workers=None, max_queue=64, timeout=30.0, cache=None):
+        if executor not in ('thread', 'process'):
+            raise ValueError("executor must be 'thread' or 'process'")
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1")
+        self.datasets = dict(datasets or {})
+        self.executor = executor
+        self.max_workers = max_workers or os.cpu_count()
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.cache = cache
+        self._pool = None
+        self._shared = {}
+        self._renders = {}
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.counters = dict.fromkeys(('requests', 'coalesced', 'renders', 'cache_hits', 'rejected', 'timeouts',
+                                       'cancelled', 'failed'), 0)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self):
+        """
+        Starts the render pool and has every worker load matplotlib, so the first requests are not slowed down.
+        """
+        if self._pool is not None:
+            return
+        if self.executor == 'process':
+            # Workers attach to one shared copy of each DataFrame rather than unpickling their own
+            self._shared = {name: SharedDataset.publish(dataset) for name, dataset in self.datasets.items()
+                            if isinstance(dataset, pd.DataFrame)}
+            self._pool = ProcessPoolExecutor(self.max_workers, initializer=_install_datasets,
+                                             initargs=({**self.datasets, **self._shared},))
+        else:
+            self._pool = ThreadPoolExecutor(self.max_workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _warm_up) for _ in range(self.max_workers)))
+
+    async def close(self):
+        """
+        Shuts the render pool down, cancelling renders that have not started, and releases the shared datasets.
+        """
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.get_running_loop().run_in_executor(None, lambda: pool.shutdown(cancel_futures=True))
+        for shared in self._shared.values():
+            shared.unlink()
+            shared.close()
+        self._shared = {}
+
+    async def plot(self, function, data, timeout=None, **arguments):
+        """
+        Renders a create_* function on a registered dataset.
+
+        Parameters:
+        - function (str): Name of a create_* function.
+        - data (str or list): Name of the registered dataset, or a list of names for functions taking `dfs`.
+        - timeout (float, optional): Seconds to wait for this request. Default is the service's timeout.
+        - **arguments: The remaining arguments of the function, by name. With page_size, `page` selects the page
+          to render (default 0).
+
+        Returns:
+        - The return value of the function; for paginated requests, (image of the page, results, number of pages).
+
+        Raises:
+        - ValueError: If the function, dataset, arguments or page are invalid.
+        - ServiceOverloaded: If the render queue is full.
+        - TimeoutError: If the render did not finish in time.
+        """
+        page = arguments.pop('page', None)
+        data_parameter = self._check_plot(function, data, arguments)
+        if arguments.get('page_size') is not None:
+            page = 0 if page is None else page
+            if isinstance(page, bool) or not isinstance(page, int) or page < 0:
+                raise ValueError(f"page must be a non-negative integer, got {page!r}")
+        elif page is not None:
+            raise ValueError("'page' can only be requested with 'page_size'")
+        if self.executor == 'process':
+            call = (_render_request, function, data_parameter, data, arguments, page)
+        else:
+            call = (_render_request, function, data_parameter, data, arguments, page, self.datasets)
+        return await self._request(fingerprint(function, data, arguments, page), call, timeout)
+
+    async def render(self, function, *args, timeout=None, **kwargs):
+        """
+        Renders a create_* call with explicit arguments, e.g. an ad-hoc DataFrame. The arguments are fingerprinted
+        to coalesce identical calls and, with a process pool, pickled to the worker on every render.
+
+        Returns:
+        - The return value of the function.
+        """
+        if function not in PLOT_FUNCTIONS:
+            raise ValueError(f"Unknown plot function: {function}")
+        try:
+            bound = inspect.signature(PLOT_FUNCTIONS[function]).bind(*args, **kwargs)
+        except TypeError as error:
+            raise ValueError(f"Invalid arguments for {function}: {error}") from None
+        bound.apply_defaults()
+        key = fingerprint(function, dict(bound.arguments))
+        return await self._request(key, (_render_call, function, args, kwargs), timeout)
+
+    def stats(self):
+        """
+        Returns the request counters, the renders in flight and latency percentiles in seconds as a dict.
+        """
+        stats = dict(self.counters, in_flight=len(self._renders))
+        if self._latencies:
+            p50, p90, p99 = np.percentile(self._latencies, [50, 90, 99])
+            stats.update(p50=float(p50), p90=float(p90), p99=float(p99))
+        return stats
+
+    async def asgi(self, scope, receive, send):
+        """
+        ASGI application: POST /plot renders a JSON plot request, GET /stats and GET /health report on the service.
+        """
+        if scope['type'] != 'http':
+            return
+        method, path = scope['method'], scope['path']
+        if method == 'GET' and path == '/health':
+            await _send_json(send, 200, {'status': 'ok'})
+        elif method == 'GET' and path == '/stats':
+            await _send_json(send, 200, self.stats())
+        elif method == 'POST' and path == '/plot':
+            body = b''
+            while True:
+                message = await receive()
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+            await self._handle_plot(body, send)
+        else:
+            await _send_json(send, 404, {'error': f'No route for {method} {path}'})
+
+    async def _handle_plot(self, body, send):
+        # Maps a JSON plot request onto plot() and its outcome onto an HTTP status
+        try:
+            request = json.loads(body or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("The request body must be a JSON object")
+            result = await self.plot(request.get('function'), request.get('data'), request.get('timeout'),
+                                     **(request.get('args') or {}))
+            if not isinstance(result, tuple):
+                result = (result, None)
+            payload = {'image': result[0], 'results': _records(result[1])}
+            if len(result) == 3:
+                payload['pages'] = result[2]
+            await _send_json(send, 200, payload)
+        except (ValueError, TypeError) as error:
+            await _send_json(send, 400, {'error': str(error)})
+        except ServiceOverloaded as error:
+            await _send_json(send, 503, {'error': str(error)}, [(b'retry-after', b'1')])
+        except TimeoutError:
+            await _send_json(send, 504, {'error': 'The render did not finish in time'})
+        except Exception as error:
+            await _send_json(send, 500, {'error': f'{type(error).__name__}: {error}'})
+
+    def _check_plot(self, function, data, arguments):
+        # Validates a plot request in the event loop, so bad requests never reach a worker
+        if function not in PLOT_FUNCTIONS:
+            raise ValueError(f"Unknown plot function: {function}")
+        names = data if isinstance(data, list) else [data]
+        unknown = [name for name in names if name not in self.datasets]
+        if unknown:
+            raise ValueError(f"Unknown datasets: {unknown}")
+        parameters = inspect.signature(PLOT_FUNCTIONS[function]).parameters
+        data_parameter = next(parameter for parameter in DATA_PARAMETERS if parameter in parameters)
+        if data_parameter in arguments or 'output' in arguments:
+            raise ValueError(f"'{data_parameter}' and 'output' cannot be set by a request")
+        try:
+            inspect.signature(PLOT_FUNCTIONS[function]).bind(**arguments, **{data_parameter: None})
+        except TypeError as error:
+            raise ValueError(f"Invalid arguments for {function}: {error}") from None
+        return data_parameter
+
+    async def _request(self, key, call, timeout):
+        # Joins the render in flight for key, or admits a new one, and waits for it within the timeout
+        if self._pool is None:
+            raise RuntimeError("The PlotService is not started; use 'async with service:' or await start()")
+        start = time.perf_counter()
+        self.counters['requests'] += 1
+
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.counters['cache_hits'] += 1
+                self._latencies.append(time.perf_counter() - start)
+                return _copy_frames(cached)
+
+        render = self._renders.get(key)
+        if render is not None:
+            self.counters['coalesced'] += 1
+        else:
+            if len(self._renders) >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise ServiceOverloaded(f"{len(self._renders)} renders are queued; retry later")
+            render = self._admit(key, call)
+
+        render.waiters += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(render.future), timeout or self.timeout)
+        except TimeoutError:
+            self.counters['timeouts'] += 1
+            raise
+        finally:
+            render.waiters -= 1
+            if render.waiters == 0 and not render.future.done():
+                # Nobody waits any more: a render still queued in the pool is dropped
+                if render.future.cancel():
+                    self.counters['cancelled'] += 1
+        self._latencies.append(time.perf_counter() - start)
+        return _copy_frames(result)
+
+    def _admit(self, key, call):
+        # Submits a new render to the pool; it leaves the in-flight table as soon as it is done
+        future = asyncio.get_running_loop().run_in_executor(self._pool, *call)
+        render = self._renders[key] = _Render(future)
+        self.counters['renders'] += 1
+
+        def finished(done):
+            self._renders.pop(key, None)
+            if done.cancelled():
+                return
+            if done.exception() is not None:
+                self.counters['failed'] += 1
+            elif self.cache is not None:
+                self.cache.put(key, done.result())
+
+        future.add_done_callback(finished)
+        return render
+
+
+def _warm_up():
+    # Imports matplotlib in a worker ahead of its first render
+    import matplotlib.figure  # noqa: F401
+    return os.getpid()
+
+
+def _records(results):
+    # A results DataFrame as JSON-ready rows, with missing values as null
+    if results is None:
+        return None
+    return json.loads(results.to_json(orient='records'))
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode()), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class StubClient:
+    """
+    Calls an ASGI application in-process, without sockets, for local tests of the service.
+
+    Parameters:
+    - app (callable): The ASGI application, e.g. `service.asgi`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def get(self, path):
+        """
+        Sends a GET request and returns (status, decoded JSON body).
+        """
+        return await self.request('GET', path)
+
+    async def post(self, path, payload):
+        """
+        Sends a POST request with a JSON body and returns (status, decoded JSON body).
+        """
+        return await self.request('POST', path, json.dumps(payload).encode())
+
+    async def request(self, method, path, body=b''):
+        """
+        Sends a request and returns (status, decoded JSON body).
+        """
+        scope = {'type': 'http', 'method': method, 'path': path, 'headers': [(b'content-type', b'application/json')]}
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app(scope, receive, send)
+        status = sent[0]['status']
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        return status, json.loads(body) if body else None
+
+
+async def serve(service, host='127.0.0.1', port=8050):
+    """
+    Hosts the service's ASGI application on a minimal HTTP/1.1 server (one request per connection) until cancelled.
+    """
+    async def connection(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            status, response_headers, response_body = await _call_asgi(service.asgi, request_line, body)
+            writer.write(f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\n'.encode())
+            for name, value in response_headers:
+                writer.write(name + b': ' + value + b'\r\n')
+            writer.write(b'connection: close\r\n\r\n' + response_body)
+            await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async with service:
+        server = await asyncio.start_server(connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+# Reason phrases of the statuses the service answers with
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error',
+            503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+async def _call_asgi(app, request_line, body):
+    # Runs one request through the ASGI app and collects (status, headers, body)
+    if len(request_line) < 2:
+        raise ValueError("Malformed request line")
+    method, target = request_line[0], request_line[1]
+    scope = {'type': 'http', 'method': method, 'path': target.split('?', 1)[0], 'headers': []}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status'], sent[0]['headers'], b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def main(argv=None):
+    """
+    Command line entry point: loads the datasets and serves plot requests over HTTP.
+    """
+    parser = argparse.ArgumentParser(description='Serve BarPlotter charts over HTTP.')
+    parser.add_argument('--data', action='append', default=[], metavar='NAME=CSV',
+                        help='Register a dataset from a CSV file; repeat for several datasets.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on. Default is 127.0.0.1.')
+    parser.add_argument('--port', type=int, default=8050, help='Port to listen on. Default is 8050.')
+    parser.add_argument('--executor', choices=('thread', 'process'), default='process',
+                        help='Pool used to render. Default is process.')
+    parser.add_argument('--workers', type=int, help='Number of render workers. Default is one per core.')
+    parser.add_argument('--max-queue', type=int, default=64, help='Distinct renders admitted at once. Default is 64.')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds a request may wait. Default is 30.')
+    args = parser.parse_args(argv)
+
+    datasets = {}
+    for item in args.data:
+        name, _, path = item.partition('=')
+        if not path:
+            parser.error(f"--data expects NAME=CSV, got {item!r}")
+        datasets[name] = pd.read_csv(path)
+    service = PlotService(datasets, args.executor, args.workers, args.max_queue, args.timeout)
+    print(f"Serving {sorted(datasets)} on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
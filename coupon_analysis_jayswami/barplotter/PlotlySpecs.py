@@ -0,0 +1,144 @@
+"""
+PlotlySpecs Module
+------------------
+
+Plotly figure JSON for the BarPlotter charts, so browsers can draw them instead of the server.
+
+Rasterizing every chart with Agg is the bulk of the CPU spent by a dashboard serving BarPlotter plots. With
+`backend='plotly'` the `create_*` functions skip matplotlib entirely and return a Plotly figure spec (plain JSON,
+ready for `Plotly.newPlot(div, spec.data, spec.layout)`) carrying the same green accepted / red rejected stacks and
+percentage labels. The spec is assembled from dicts and lists, so plotly itself is not needed on the server.
+
+Example usage:
+    spec_json, results_df = create_subplot_grid(coffee_df, columns_to_plot, 'Coffee House Coupon Acceptance Rates',
+                                                45, backend='plotly')
+"""
+
+import json
+import math
+
+import numpy as np
+
+from Instrumentation import note, recording, stage
+
+# Same colors as the matplotlib bars (green / red at alpha 0.6)
+ACCEPT_COLOR = 'rgba(0,128,0,0.6)'
+REJECT_COLOR = 'rgba(255,0,0,0.6)'
+
+# Space between subplot panels, as a fraction of the figure
+_HORIZONTAL_GAP = 0.08
+_VERTICAL_GAP = 0.15
+
+
+def _json_numbers(values):
+    # Counts as JSON numbers; missing categories (NaN) become null so the bar is simply absent
+    numbers = []
+    for value in np.asarray(values, dtype=float):
+        if math.isnan(value):
+            numbers.append(None)
+        elif value.is_integer():
+            numbers.append(int(value))
+        else:
+            numbers.append(float(value))
+    return numbers
+
+
+def stacked_bar_traces(labels, accept, reject, accept_text, reject_text, panel=0, showlegend=False):
+    """
+    Returns the accepted and rejected bar traces of one panel.
+
+    Parameters:
+    - labels (list): The category of each bar.
+    - accept, reject (array-like): Accepted and rejected counts aligned with labels.
+    - accept_text, reject_text (list): Percentage labels drawn inside each stack.
+    - panel (int, optional): Position of the panel in the grid, selecting its axes. Default is 0.
+    - showlegend (bool, optional): List the two series in the legend. Default is False.
+
+    Returns:
+    - list: Two Plotly bar trace dicts.
+    """
+    suffix = str(panel + 1) if panel else ''
+    categories = [str(label) for label in labels]
+    common = {'type': 'bar', 'x': categories, 'xaxis': f'x{suffix}', 'yaxis': f'y{suffix}', 'showlegend': showlegend,
+              'textposition': 'inside', 'insidetextanchor': 'middle', 'textfont': {'color': 'black'}}
+    return [
+        dict(common, name='Accepted (Y=1)', legendgroup='accepted', y=_json_numbers(accept), text=list(accept_text),
+             marker={'color': ACCEPT_COLOR}),
+        dict(common, name='Rejected (Y=0)', legendgroup='rejected', y=_json_numbers(reject), text=list(reject_text),
+             marker={'color': REJECT_COLOR}),
+    ]
+
+
+def figure_spec(panels, plot_title, nrows=1, ncols=1, rotation=0, yscale='linear', legend=False, annotation=None):
+    """
+    Assembles a Plotly figure dict from stacked bar panels laid out on a grid.
+
+    Parameters:
+    - panels (list): One dict per panel with 'traces' (see stacked_bar_traces), 'xlabel' and optionally 'title'.
+    - plot_title (str): The title of the figure.
+    - nrows, ncols (int, optional): Grid shape. Default is a single panel.
+    - rotation (int, optional): Rotation of the x-axis labels in degrees, counter-clockwise as in matplotlib.
+    - yscale (str, optional): The y-axis scale type ('linear' or 'log'). Default is 'linear'.
+    - legend (bool, optional): Show the legend. Default is False.
+    - annotation (str, optional): Text shown in a box in the upper right corner, e.g. group descriptions. Default is
+      None.
+
+    Returns:
+    - dict: A figure with 'data' and 'layout' keys.
+    """
+    data = []
+    annotations = []
+    layout = {'title': {'text': plot_title}, 'barmode': 'stack', 'showlegend': legend}
+    width = (1 - _HORIZONTAL_GAP * (ncols - 1)) / ncols
+    height = (1 - _VERTICAL_GAP * (nrows - 1)) / nrows
+
+    for i, panel in enumerate(panels):
+        row, column = divmod(i, ncols)
+        x_start = column * (width + _HORIZONTAL_GAP)
+        y_end = 1 - row * (height + _VERTICAL_GAP)
+        suffix = str(i + 1) if i else ''
+        layout[f'xaxis{suffix}'] = {'domain': [x_start, x_start + width], 'anchor': f'y{suffix}',
+                                    'title': {'text': panel['xlabel']}, 'tickangle': -rotation}
+        layout[f'yaxis{suffix}'] = {'domain': [y_end - height, y_end], 'anchor': f'x{suffix}',
+                                    'title': {'text': 'Frequency'}, 'type': 'log' if yscale == 'log' else 'linear'}
+        if panel.get('title'):
+            annotations.append({'text': str(panel['title']), 'showarrow': False, 'xref': 'paper', 'yref': 'paper',
+                                'x': x_start + width / 2, 'y': y_end, 'xanchor': 'center', 'yanchor': 'bottom'})
+        data.extend(panel['traces'])
+
+    if annotation:
+        annotations.append({'text': annotation, 'showarrow': False, 'xref': 'paper', 'yref': 'paper', 'x': 1, 'y': 1,
+                            'xanchor': 'right', 'yanchor': 'top', 'align': 'left', 'bordercolor': 'black',
+                            'borderwidth': 1, 'bgcolor': 'white'})
+    if annotations:
+        layout['annotations'] = annotations
+    return {'data': data, 'layout': layout}
+
+
+def save_spec(spec, output='base64'):
+    """
+    Serializes a figure spec to compact JSON and returns it the way save_figure returns images.
+
+    Parameters:
+    - spec (dict): The figure, see figure_spec.
+    - output (str, path or stream, optional): 'base64' (the default, kept for symmetry with the image outputs)
+      returns the JSON string, 'memoryview' a view of its UTF-8 bytes, and a file path or binary stream receives
+      the bytes directly.
+
+    Returns:
+    - str, memoryview or None: The JSON, or None when it was written to a file or stream.
+    """
+    if recording():
+        note(artists=sum(len(trace['x']) for trace in spec['data']))
+    with stage('encode'):
+        text = json.dumps(spec, separators=(',', ':'))
+    if output == 'base64':
+        return text
+    if output == 'memoryview':
+        return memoryview(text.encode())
+    if hasattr(output, 'write'):
+        output.write(text.encode())
+    else:
+        with open(output, 'wb') as file:
+            file.write(text.encode())
+    return None
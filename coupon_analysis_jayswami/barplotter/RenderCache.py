@@ -0,0 +1,382 @@
+"""
+RenderCache Module
+------------------
+
+Content-addressed cache for the outputs of the BarPlotter `create_*` functions.
+
+Rendering and base64-encoding a PNG is by far the most expensive part of a BarPlotter call, and re-running report
+cells or re-serving a dashboard repeats it with identical inputs. A RenderCache keys every call by a fingerprint of
+the function, the input data (DataFrame contents, AcceptanceCube, CountStore or AcceptanceSketch counts and view
+conditions, engine sources, data file sizes and modification times, lists of DataFrames, filter masks) and every
+plot argument, so an unchanged call is answered from the cache. Calls reading generators or chunked readers are not
+cached, as their content is only known by consuming them.
+
+A DataFrame is hashed once, on its first lookup, and its fingerprint is reused for as long as the object lives, so a
+hit costs the same at any row count. A frame changed in place therefore needs a new key: call
+`forget_fingerprint(df)` after changing it, or pass a new frame.
+
+Entries live in a bounded in-memory LRU. An optional on-disk tier keeps pickled results in a directory and evicts the
+least recently used files once the directory grows past a size limit.
+
+Example usage:
+    cache = RenderCache(max_entries=256, disk_dir='../.render_cache')
+    cached_grid = cache.wrap(create_subplot_grid)
+    grid1_image64, result_df1 = cached_grid(coffee_df, columns_to_plot, 'Coffee House Coupon Acceptance Rates', 45)
+    cache.stats()
+"""
+
+import functools
+import glob
+import hashlib
+import inspect
+import io
+import os
+import pickle
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Iterator
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceCube import CubeView
+from AcceptanceSketch import AcceptanceSketch
+from BitmapIndex import BitmapIndex
+from CountStore import StoreView
+from Engines import EngineSource
+from SharedDataset import SharedView
+
+# Fingerprints of live DataFrames and Series by id, see frame_fingerprint
+_frame_digests = {}
+
+
+def _update_fingerprint(hasher, value):
+    # Feed a type tag plus the value's content into the hasher, recursing into containers
+    hasher.update(type(value).__name__.encode())
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        hasher.update(frame_fingerprint(value).encode())
+    elif isinstance(value, pd.Index):
+        hasher.update(str(value.dtype).encode())
+        hasher.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        hasher.update(str(value.dtype).encode())
+        hasher.update(repr(value.shape).encode())
+        hasher.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, io.IOBase):
+        # Output buffers do not change what is rendered
+        pass
+    elif isinstance(value, BitmapIndex):
+        # An index renders exactly like the DataFrame it was built from
+        _update_fingerprint(hasher, value.df)
+    elif isinstance(value, CubeView):
+        hasher.update(cube_fingerprint(value.cube).encode())
+        _update_fingerprint(hasher, value.conditions)
+    elif isinstance(value, StoreView):
+        hasher.update(value.store.fingerprint().encode())
+        _update_fingerprint(hasher, value.conditions)
+    elif isinstance(value, AcceptanceSketch):
+        hasher.update(value.fingerprint().encode())
+    elif isinstance(value, SharedView):
+        hasher.update(value.dataset.fingerprint().encode())
+        _update_fingerprint(hasher, value.conditions)
+    elif isinstance(value, EngineSource):
+        hasher.update(value.fingerprint().encode())
+    elif isinstance(value, (str, os.PathLike)) and _data_paths(value):
+        # Data files are keyed by their size and modification time, so a rewritten partition is read again
+        for path in _data_paths(value):
+            status = os.stat(path)
+            hasher.update(repr((os.path.abspath(path), status.st_size, status.st_mtime_ns)).encode())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            _update_fingerprint(hasher, key)
+            _update_fingerprint(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(str(len(value)).encode())
+        for item in value:
+            _update_fingerprint(hasher, item)
+    else:
+        hasher.update(repr(value).encode())
+
+
+def _data_paths(value):
+    # The files a path or glob argument names, or [] for a plain string such as a title
+    path = os.fspath(value)
+    if os.path.isfile(path):
+        return [path]
+    if any(character in path for character in '*?['):
+        return sorted(file for file in glob.glob(path) if os.path.isfile(file))
+    return []
+
+
+def fingerprint(*values):
+    """
+    Returns a hex digest identifying the contents of the given values.
+
+    Parameters:
+    - *values: DataFrames, Series, arrays, cube views, containers of those, or plain values with a stable repr.
+
+    Returns:
+    - str: A SHA-1 hex digest.
+    """
+    hasher = hashlib.sha1()
+    for value in values:
+        _update_fingerprint(hasher, value)
+    return hasher.hexdigest()
+
+
+def frame_fingerprint(frame):
+    """
+    Returns the fingerprint of a DataFrame's or Series' contents, computed once per object and reused until it is
+    garbage collected, so a cache hit does not rehash the data.
+
+    A frame changed in place keeps its old fingerprint; call forget_fingerprint(frame) after changing it, or pass a
+    new frame (e.g. a copy).
+    """
+    digest = _frame_digests.get(id(frame))
+    if digest is None:
+        hasher = hashlib.sha1()
+        if isinstance(frame, pd.DataFrame):
+            hasher.update(repr(list(frame.columns)).encode())
+            hasher.update(repr([str(dtype) for dtype in frame.dtypes]).encode())
+            hasher.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+        else:
+            hasher.update(str(frame.dtype).encode())
+            hasher.update(pd.util.hash_pandas_object(frame).to_numpy().tobytes())
+        digest = _frame_digests[id(frame)] = hasher.hexdigest()
+        # The entry goes with the frame, before its id can be reused
+        weakref.finalize(frame, _frame_digests.pop, id(frame), None)
+    return digest
+
+
+def forget_fingerprint(frame):
+    """
+    Drops the stored fingerprint of a DataFrame or Series that was changed in place, so the next lookup rehashes it.
+    """
+    _frame_digests.pop(id(frame), None)
+
+
+def cube_fingerprint(cube):
+    """
+    Returns the fingerprint of an AcceptanceCube's counts, computed once and kept on the cube.
+    """
+    digest = getattr(cube, '_fingerprint', None)
+    if digest is None:
+        hasher = hashlib.sha1()
+        _update_fingerprint(hasher, cube.slice_by)
+        for column in sorted(cube.uniques, key=str):
+            _update_fingerprint(hasher, column)
+            _update_fingerprint(hasher, pd.Index(cube.uniques[column]))
+        for key in sorted(cube._arrays):
+            _update_fingerprint(hasher, key)
+            _update_fingerprint(hasher, cube._arrays[key])
+        _update_fingerprint(hasher, cube._totals)
+        digest = cube._fingerprint = hasher.hexdigest()
+    return digest
+
+
+def _copy_result(result):
+    # Hand out copies of DataFrames so callers cannot mutate a cached entry, and read-only views of image bytes
+    if isinstance(result, tuple):
+        return tuple(_copy_result(item) for item in result)
+    if isinstance(result, pd.DataFrame):
+        return result.copy()
+    if isinstance(result, bytes):
+        return memoryview(result)
+    return result
+
+
+def _storable(result):
+    # memoryview outputs point into a render buffer and cannot be pickled, so entries keep an immutable copy
+    if isinstance(result, tuple):
+        return tuple(_storable(item) for item in result)
+    if isinstance(result, memoryview):
+        return result.tobytes()
+    return result
+
+
+def _writes_to_sink(bound_arguments):
+    # Calls that write the image to a file or stream have to run every time
+    output = bound_arguments.get('output', 'base64')
+    return not (isinstance(output, str) and output in ('base64', 'memoryview'))
+
+
+def _one_shot(value):
+    # Generators and chunked readers are consumed by the call, so their content cannot be fingerprinted
+    if isinstance(value, Iterator):
+        return True
+    if isinstance(value, (list, tuple)):
+        return any(_one_shot(item) for item in value)
+    if isinstance(value, dict):
+        return any(_one_shot(item) for item in value.values())
+    return False
+
+
+class RenderCache:
+    """
+    A two-tier (memory LRU + optional disk) cache of BarPlotter outputs.
+
+    Parameters:
+    - max_entries (int, optional): Number of results kept in memory. Default is 128.
+    - disk_dir (str, optional): Directory for the on-disk tier. Default is None (memory only).
+    - max_disk_bytes (int, optional): Size limit of the on-disk tier. Default is 256 MB.
+    """
+
+    def __init__(self, max_entries=128, disk_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key_for(self, func, *args, **kwargs):
+        """
+        Returns the cache key of a call, with positional and keyword arguments normalized against the signature.
+        """
+        return fingerprint(f'{func.__module__}.{func.__qualname__}', self._bind(func, *args, **kwargs))
+
+    def render(self, func, *args, **kwargs):
+        """
+        Calls func(*args, **kwargs) unless an identical call is already cached. Calls that write their image to a
+        file or stream (output=<path or stream>) or read one-shot iterators (generators, chunked readers) are never
+        cached. File path arguments are keyed by the files' size and modification time.
+
+        Returns:
+        - The (cached) return value of func.
+        """
+        arguments = self._bind(func, *args, **kwargs)
+        if _writes_to_sink(arguments) or _one_shot(arguments):
+            return func(*args, **kwargs)
+        key = fingerprint(f'{func.__module__}.{func.__qualname__}', arguments)
+        result = self.get(key)
+        if result is None:
+            result = _storable(func(*args, **kwargs))
+            self.put(key, result)
+        return _copy_result(result)
+
+    def wrap(self, func):
+        """
+        Returns a cached version of a BarPlotter function with the same signature.
+        """
+        @functools.wraps(func)
+        def cached(*args, **kwargs):
+            return self.render(func, *args, **kwargs)
+        return cached
+
+    def get(self, key):
+        """
+        Returns the cached result for a key, or None. Disk hits are promoted into memory.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store_memory(key, result)
+        return result
+
+    def put(self, key, result):
+        """
+        Stores a result under a key in memory and, if configured, on disk.
+        """
+        with self._lock:
+            self._store_memory(key, result)
+        self._write_disk(key, result)
+
+    def clear(self):
+        """
+        Drops every in-memory entry and resets the counters. Files on disk are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and current sizes as a dict.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'entries': len(self._entries), 'disk_bytes': self._disk_usage()}
+
+    @staticmethod
+    def _bind(func, *args, **kwargs):
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        return dict(bound.arguments)
+
+    def _store_memory(self, key, result):
+        # Caller holds the lock
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.pkl')
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                result = pickle.load(file)
+            os.utime(path)  # Mark as recently used for eviction
+            return result
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key, result):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        self._evict_disk()
+
+    def _disk_files(self):
+        if not self.disk_dir:
+            return []
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.pkl'):
+                path = os.path.join(self.disk_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._disk_files())
+
+    def _evict_disk(self):
+        # Remove the least recently used files until the directory fits the size limit
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
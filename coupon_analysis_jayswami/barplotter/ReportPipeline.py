@@ -0,0 +1,401 @@
+"""
+ReportPipeline Module
+---------------------
+
+Builds a markdown report, such as docs/Report.md, from a declarative spec instead of running notebook cells in order.
+
+The notebooks recompute the same filtered frames (`coffee_df`, `df_list`) and the same plots cell after cell, one at
+a time. A report spec (YAML or JSON) instead declares:
+
+- source: the CSV the report is built from (`loader: coupons` loads it with DataLoader's typed schema, `loader: raw`
+  cleans a raw extract such as data/coupons.csv with DataCleaner first; the cleaned copy is kept in `cache_dir`,
+  default `.render_cache/` next to the spec, so the files beside the raw extract are never touched).
+- datasets: named subsets derived from the source or from each other, by `query`, by `where` (column: value or list
+  of values) or split into a list of frames with `split_by` (and optional `values`), as create_subplot_grid_dflist
+  expects.
+- plots: named create_* calls with the dataset to plot (`data`), the remaining arguments (`args`) and a caption.
+- sections: a heading, markdown text and the plots to show below it.
+
+The spec is compiled into a DAG. Only datasets that some plot needs are computed, each once. Plot calls that are
+identical (same function, data and arguments) are rendered once and shared by every name and section using them.
+The unique plots have no dependencies on each other and are rendered in parallel with render_many.
+
+Section text is a Python format string. Each plot is available by name: `{grid1}` inserts the figure,
+`{grid1.results[14][accept_percentage]:.2f}` a value of its results table (row 14, by the table's index), so the
+findings that the notebooks write as f-strings keep working. Literal braces are written as `{{` and `}}`.
+
+Command line usage (from the project root):
+    python barplotter/ReportPipeline.py reports/coffee_house.yaml -o docs/CoffeeHouseReport.md
+    python barplotter/ReportPipeline.py reports/coffee_house.yaml --plan
+    python barplotter/ReportPipeline.py reports/coffee_house.yaml -o docs/CoffeeHouseReport.md --image-dir images/report
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from BarPlotter import PLOT_FUNCTIONS, render_many
+from DataCleaner import clean_coupons_file
+from DataLoader import load_coupons
+from RenderCache import fingerprint
+from SharedDataset import SharedDataset
+
+# Parameter names under which the create_* functions take their data
+DATA_PARAMETERS = ('df_cleaned', 'df', 'dfs')
+
+# MIME type of each image format for embedded images
+_MIME_TYPES = {'png': 'image/png', 'webp': 'image/webp', 'svg': 'image/svg+xml'}
+
+# Figure block laid out like the figures of docs/Report.md and the notebooks
+_FIGURE_TEMPLATE = """<div align="center">
+    <table>
+        <tr>
+            <td style="text-align: center;">
+                <img src="{src}" alt="{caption}" style="width: 100%;"/>
+                <em>Figure: {caption}</em>
+            </td>
+        </tr>
+    </table>
+</div>"""
+
+
+def load_spec(path):
+    """
+    Reads a report spec from a YAML (.yaml / .yml) or JSON file.
+
+    Returns:
+    - dict: The spec, with 'base_dir' set to the spec's directory so relative paths resolve against it.
+    """
+    with open(path) as file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML report specs requires PyYAML (pip install pyyaml); "
+                                  "JSON specs need no extra package") from None
+            spec = yaml.safe_load(file)
+        else:
+            spec = json.load(file)
+    if not isinstance(spec, dict):
+        raise ValueError(f"The report spec in {path} must be a mapping")
+    spec.setdefault('base_dir', os.path.dirname(os.path.abspath(path)))
+    return spec
+
+
+class PlotOutput:
+    """
+    The rendered image and results of one plot, as seen from section text.
+
+    Parameters:
+    - name (str): The plot's name in the spec.
+    - caption (str): Figure caption.
+    - src (str): The image source, a data URI or a path relative to the report.
+    - results (DataFrame or None): The results table returned by the create_* function, if any.
+    """
+
+    def __init__(self, name, caption, src, results=None):
+        self.name = name
+        self.caption = caption
+        self.src = src
+        self.results = ResultRows(results) if results is not None else None
+
+    def __str__(self):
+        return self.figure
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+    @property
+    def figure(self):
+        """
+        The HTML figure block showing the image with its caption.
+        """
+        return _FIGURE_TEMPLATE.format(src=self.src, caption=self.caption)
+
+
+class ResultRows:
+    """
+    Row access to a results table for format strings: `results[14][accept_percentage]` reads
+    `frame.loc[14, 'accept_percentage']`.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __getitem__(self, row):
+        return self.frame.loc[row]
+
+    def __str__(self):
+        return self.frame.to_string()
+
+
+class ReportPlan:
+    """
+    A report spec compiled into a DAG of dataset, plot and section nodes.
+
+    Parameters:
+    - spec (dict): The report spec, see load_spec and the module docstring.
+
+    Raises:
+    - ValueError: If the spec references unknown datasets, plots or functions, or datasets depend on each other in a
+      cycle.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.base_dir = spec.get('base_dir', '.')
+        self.datasets = {name: _dataset_node(name, node) for name, node in (spec.get('datasets') or {}).items()}
+        self.plots = {name: self._plot_node(name, node) for name, node in (spec.get('plots') or {}).items()}
+        self.sections = spec.get('sections') or []
+        if 'source' not in spec:
+            raise ValueError("The report spec needs a 'source' CSV file")
+
+        for section in self.sections:
+            for plot_name in section.get('plots', []):
+                if plot_name not in self.plots:
+                    raise ValueError(f"Section '{section.get('heading')}' shows unknown plot: {plot_name}")
+
+        # Datasets in dependency order, limited to those the plots need
+        self.dataset_order = self._dataset_order({plot['data'] for plot in self.plots.values()})
+
+        # Identical plot calls share one render; the first name using a call owns it
+        self.renders = {}
+        self.render_of = {}
+        for name, plot in self.plots.items():
+            key = fingerprint(plot['function'], plot['data'], plot['args'])
+            self.renders.setdefault(key, name)
+            self.render_of[name] = self.renders[key]
+
+    def describe(self):
+        """
+        Returns a text outline of the DAG: datasets in computation order and the unique renders.
+        """
+        lines = [f"source: {self.spec['source']}"]
+        for name in self.dataset_order:
+            lines.append(f"dataset {name} <- {self.datasets[name]['from']}")
+        for name in self.renders.values():
+            shared = [other for other, owner in self.render_of.items() if owner == name and other != name]
+            suffix = f" (shared by {', '.join(shared)})" if shared else ''
+            lines.append(f"plot {name}: {self.plots[name]['function']}({self.plots[name]['data']}){suffix}")
+        lines.append(f"{len(self.plots)} plots, {len(self.renders)} unique renders, {len(self.sections)} sections")
+        return '\n'.join(lines)
+
+    def build(self, executor='process', max_workers=None, image_dir=None, report_dir=None):
+        """
+        Computes the datasets, renders the unique plots in parallel and assembles the markdown report.
+
+        Parameters:
+        - executor (str, optional): 'thread' or 'process' pool for rendering, see render_many. Default is 'process'.
+          Process workers attach to the datasets in shared memory instead of unpickling a copy per plot.
+        - max_workers (int, optional): Size of the pool. Default is None (one worker per core).
+        - image_dir (str, optional): Directory to write the images to, linked from the report. Default is None
+          (images are embedded as base64 data URIs).
+        - report_dir (str, optional): Directory of the report file, for relative image links. Default is the current
+          directory.
+
+        Returns:
+        - str: The markdown report.
+        """
+        frames = self._compute_datasets()
+        if executor == 'process':
+            # Workers attach to one shared copy of each dataset instead of unpickling the frames with every plot
+            needed = {self.plots[name]['data'] for name in self.renders.values()}
+            shared = {name: _publish(frames[name]) for name in needed}
+        else:
+            shared = {}
+
+        plot_specs = []
+        image_paths = {}
+        for name in self.renders.values():
+            plot = self.plots[name]
+            kwargs = dict(plot['args'])
+            kwargs[plot['data_parameter']] = shared.get(plot['data'], frames[plot['data']])
+            if image_dir is not None:
+                os.makedirs(image_dir, exist_ok=True)
+                image_format = kwargs.get('image_format', 'png')
+                image_paths[name] = os.path.join(image_dir, f'{name}.{image_format}')
+                kwargs['output'] = image_paths[name]
+            plot_specs.append((plot['function'], (), kwargs))
+        try:
+            rendered = dict(zip(self.renders.values(), render_many(plot_specs, executor, max_workers)))
+        finally:
+            for datasets in shared.values():
+                for dataset in datasets if isinstance(datasets, list) else [datasets]:
+                    dataset.unlink()
+                    dataset.close()
+
+        outputs = {}
+        for name, plot in self.plots.items():
+            owner = self.render_of[name]
+            result = rendered[owner]
+            image, results = result if isinstance(result, tuple) else (result, None)
+            if owner in image_paths:
+                src = os.path.relpath(image_paths[owner], report_dir or '.').replace(os.sep, '/')
+            else:
+                mime_type = _MIME_TYPES[self.plots[owner]['args'].get('image_format', 'png')]
+                src = f'data:{mime_type};base64,{image}'
+            outputs[name] = PlotOutput(name, plot['caption'], src, results)
+        return self._markdown(outputs)
+
+    def _plot_node(self, name, node):
+        function = node.get('function')
+        if function not in PLOT_FUNCTIONS:
+            raise ValueError(f"Plot '{name}' uses unknown function: {function}")
+        parameters = inspect.signature(PLOT_FUNCTIONS[function]).parameters
+        data_parameter = next(parameter for parameter in DATA_PARAMETERS if parameter in parameters)
+        args = dict(node.get('args') or {})
+        if data_parameter in args or 'output' in args:
+            raise ValueError(f"Plot '{name}' sets '{data_parameter}' or 'output' in args; use 'data' and the "
+                             f"report options instead")
+        data = node.get('data', 'source')
+        if data != 'source' and data not in self.datasets:
+            raise ValueError(f"Plot '{name}' uses unknown dataset: {data}")
+        # Check the arguments against the signature now rather than in a worker
+        try:
+            inspect.signature(PLOT_FUNCTIONS[function]).bind(**args, **{data_parameter: None})
+        except TypeError as error:
+            raise ValueError(f"Plot '{name}' has invalid args for {function}: {error}") from None
+        caption = node.get('caption', args.get('plot_title', name))
+        return {'function': function, 'data': data, 'data_parameter': data_parameter, 'args': args,
+                'caption': caption}
+
+    def _dataset_order(self, needed):
+        # Depth-first topological order of the needed datasets and their ancestors
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if name == 'source' or state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Datasets depend on each other in a cycle: {' -> '.join(path + [name])}")
+            if name not in self.datasets:
+                raise ValueError(f"Dataset '{path[-1]}' is derived from unknown dataset: {name}")
+            state[name] = 'visiting'
+            visit(self.datasets[name]['from'], path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in sorted(needed):
+            visit(name, [])
+        return order
+
+    def _compute_datasets(self):
+        source = self.spec['source']
+        if isinstance(source, str):
+            source = {'path': source}
+        path = os.path.join(self.base_dir, source['path'])
+        cache_dir = os.path.join(self.base_dir, source.get('cache_dir', '.render_cache'))
+        if source.get('loader', 'csv') == 'coupons':
+            frames = {'source': load_coupons(path)}
+        elif source.get('loader') == 'raw':
+            frames = {'source': load_coupons(clean_coupons_file(path, _cleaned_path(path, cache_dir)))}
+        else:
+            frames = {'source': pd.read_csv(path)}
+
+        for name in self.dataset_order:
+            node = self.datasets[name]
+            parent = frames[node['from']]
+            if isinstance(parent, list):
+                raise ValueError(f"Dataset '{name}' is derived from '{node['from']}', which is split into a list")
+            frames[name] = _derive(parent, node)
+        return frames
+
+    def _markdown(self, outputs):
+        parts = []
+        if self.spec.get('title'):
+            parts.append(f"# {self.spec['title']}")
+        if self.spec.get('intro'):
+            parts.append(self.spec['intro'].strip())
+        for section in self.sections:
+            if section.get('heading'):
+                parts.append(f"{'#' * section.get('level', 2)} {section['heading']}")
+            if section.get('text'):
+                parts.append(section['text'].strip().format_map(outputs))
+            for plot_name in section.get('plots', []):
+                parts.append(outputs[plot_name].figure)
+        return '\n\n'.join(parts) + '\n'
+
+
+def _cleaned_path(raw_path, cache_dir):
+    # Cleaned copy of a raw extract in the cache directory, named after the raw file and a hash of its full path
+    os.makedirs(cache_dir, exist_ok=True)
+    root, extension = os.path.splitext(os.path.basename(raw_path))
+    digest = hashlib.sha1(os.path.abspath(raw_path).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f'{root}_cleaned_{digest}{extension or ".csv"}')
+
+
+def _dataset_node(name, node):
+    # A bare string is a query on the source
+    if isinstance(node, str):
+        node = {'query': node}
+    node = dict(node)
+    node.setdefault('from', 'source')
+    if not any(key in node for key in ('query', 'where', 'split_by')):
+        raise ValueError(f"Dataset '{name}' needs a 'query', 'where' or 'split_by'")
+    return node
+
+
+def _derive(df, node):
+    # Applies a dataset node's query, where and split_by, in that order
+    if node.get('query'):
+        df = df.query(node['query'])
+    for column, value in (node.get('where') or {}).items():
+        df = df[df[column].isin(value)] if isinstance(value, list) else df[df[column] == value]
+    if node.get('split_by'):
+        column = node['split_by']
+        values = node.get('values')
+        if values is None:
+            values = sorted(df[column].dropna().unique(), key=str)
+        return [df[df[column] == value] for value in values]
+    return df
+
+
+def _publish(frame):
+    # A dataset (or split list of datasets) in shared memory
+    if isinstance(frame, list):
+        return [SharedDataset.publish(part) for part in frame]
+    return SharedDataset.publish(frame)
+
+
+def main(argv=None):
+    """
+    Command line entry point: compiles a report spec and writes the markdown report.
+    """
+    parser = argparse.ArgumentParser(description='Build a markdown report from a YAML/JSON report spec.')
+    parser.add_argument('spec', help='Path of the report spec (.yaml, .yml or .json)')
+    parser.add_argument('-o', '--output', help='Markdown file to write. Default is standard output.')
+    parser.add_argument('--image-dir', help='Write the images to this directory and link them instead of embedding '
+                                            'them as base64')
+    parser.add_argument('--executor', choices=('thread', 'process'), default='process',
+                        help='Pool used to render the plots in parallel. Default is process.')
+    parser.add_argument('--workers', type=int, help='Number of render workers. Default is one per core.')
+    parser.add_argument('--plan', action='store_true', help='Print the compiled DAG and exit')
+    args = parser.parse_args(argv)
+
+    plan = ReportPlan(load_spec(args.spec))
+    if args.plan:
+        print(plan.describe())
+        return 0
+
+    start = time.perf_counter()
+    report_dir = os.path.dirname(os.path.abspath(args.output)) if args.output else None
+    report = plan.build(args.executor, args.workers, args.image_dir, report_dir)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(report)
+    else:
+        sys.stdout.write(report)
+    print(f"Built {len(plan.sections)} sections, {len(plan.plots)} plots ({len(plan.renders)} unique renders) in "
+          f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+SegmentMiner Module
+-------------------
+
+Finds the driver segments with the highest coupon acceptance, instead of hand-writing filters one at a time.
+
+A segment is a combination of up to `max_order` column values, such as `age == '21-25' and passenger == 'Friend(s)'`,
+within one coupon type. mine_segments counts every segment of the categorical columns Apriori style, level by level:
+
+- Level 1 counts every (coupon, column, value) cell.
+- Level k only considers cells whose (k-1)-value subsets all reached the minimum support. Candidate cells come from
+  broadcasting the frequent cell grids of those subsets, so column combinations with no candidate are skipped
+  without touching the rows.
+- A segment whose count equals the count of one of its subsets adds a condition without narrowing the rows (e.g.
+  `direction_same == 1 and direction_opp == 0`). It is dropped together with its supersets.
+
+Each column combination is counted for all coupon types at once with a single np.bincount over the rows; no Python
+loop runs over rows or cells. Every segment gets its acceptance lift over its coupon type's acceptance rate and a
+Wilson score interval for its acceptance rate.
+
+The result holds a query string per segment, which `create_stacked_bar_plot_with_filters` accepts as a filter, and a
+dict of the same conditions for AcceptanceCube and CountStore views.
+
+Example usage:
+    segments = mine_segments(df_cleaned, max_order=3)
+    bar_segments = segments[segments['coupon'] == 'Bar'].head(5)
+    filters, filter_labels = segment_filters(bar_segments)
+    image64, result_df = create_stacked_bar_plot_with_filters(filters, filter_labels, 'Top Bar Coupon Segments',
+                                                              None, df_cleaned, rotation=45)
+"""
+
+import itertools
+import math
+import statistics
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceStats import TARGET_COLUMN, _target_codes
+
+SEGMENT_COLUMNS = ['segment', 'filter', 'conditions', 'order', 'total_count', 'accept_count', 'reject_count',
+                   'accept_percentage', 'baseline_percentage', 'lift', 'ci_low', 'ci_high']
+
+RANKINGS = ('lift', 'lift_low')
+
+# Largest count grid of one column combination; keys then fit in int32, which numpy adds and counts fastest
+MAX_CELLS = 2 ** 26
+
+# Cells counted by one bincount: several combinations share a pass over the rows while the counts stay in cache
+BLOCK_CELLS = 2 ** 16
+
+
+def wilson_interval(accept, total, confidence=0.95):
+    """
+    Computes Wilson score intervals for acceptance rates, element-wise.
+
+    Parameters:
+    - accept (array-like): Accepted counts.
+    - total (array-like): Total counts.
+    - confidence (float, optional): Confidence level of the interval. Default is 0.95.
+
+    Returns:
+    - tuple of ndarray: (low, high) bounds of the acceptance rate as fractions, NaN where the total is 0.
+    """
+    accept = np.asarray(accept, dtype=float)
+    total = np.asarray(total, dtype=float)
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = accept / total
+        denominator = 1 + z ** 2 / total
+        center = (rate + z ** 2 / (2 * total)) / denominator
+        margin = z * np.sqrt(rate * (1 - rate) / total + z ** 2 / (4 * total ** 2)) / denominator
+    return center - margin, center + margin
+
+
+def candidate_columns(df, slice_by='coupon', target_column=TARGET_COLUMN, max_cardinality=25):
+    """
+    Returns the columns worth mining: every column except the target and slice columns with between 2 and
+    max_cardinality distinct values.
+    """
+    counts = df.nunique()
+    return [column for column in df.columns
+            if column not in (target_column, slice_by) and 2 <= counts[column] <= max_cardinality]
+
+
+def mine_segments(df, columns=None, slice_by='coupon', max_order=3, min_support=0.02, top=10, confidence=0.95,
+                  rank_by='lift', target_column=TARGET_COLUMN):
+    """
+    Searches the column value combinations of each coupon type for the segments with the highest acceptance lift.
+
+    Parameters:
+    - df (DataFrame): The cleaned data, e.g. coupons_cleaned.csv.
+    - columns (list, optional): Columns to combine. Default is candidate_columns(df, slice_by).
+    - slice_by (str, optional): Column whose values are mined separately. Default is 'coupon'; None mines all rows
+      as one population.
+    - max_order (int, optional): Largest number of column values in a segment. Default is 3.
+    - min_support (int or float, optional): Minimum number of offers in a segment, or when below 1 the minimum
+      share of its coupon type's offers. Default is 0.02.
+    - top (int, optional): Number of segments returned per coupon type. Default is 10; None returns all.
+    - confidence (float, optional): Confidence level of the Wilson intervals. Default is 0.95.
+    - rank_by (str, optional): 'lift' ranks by observed lift, 'lift_low' by the lift at the lower bound of the
+      interval, which favors large segments over small lucky ones. Default is 'lift'.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+
+    Returns:
+    - DataFrame: One row per segment with the slice value (if slice_by is set) followed by SEGMENT_COLUMNS,
+      ranked within each slice. Percentages and interval bounds are in percent.
+    """
+    if rank_by not in RANKINGS:
+        raise ValueError(f"rank_by must be one of {RANKINGS}, got {rank_by!r}")
+    if max_order < 1:
+        raise ValueError("max_order must be at least 1")
+    if columns is None:
+        columns = candidate_columns(df, slice_by, target_column)
+    missing = [column for column in columns + ([slice_by] if slice_by else []) if column not in df.columns]
+    if missing:
+        raise ValueError(f"Columns missing from the dataset: {missing}")
+
+    # Rows with a response; each column becomes codes 0..n-1, with missing values in an extra code n
+    y = _target_codes(df[target_column])
+    rows = y >= 0
+    if not rows.all():
+        df = df[rows]
+        y = y[rows]
+    y = y.astype(np.int32)
+    if slice_by:
+        slice_codes, slice_values = pd.factorize(df[slice_by], sort=True)
+        if (slice_codes < 0).any():
+            raise ValueError(f"Column '{slice_by}' has missing values")
+    else:
+        slice_codes, slice_values = np.zeros(len(y), dtype=np.int32), pd.Index([None])
+    n_slices = len(slice_values)
+
+    codes = {}
+    values = {}
+    for column in columns:
+        column_codes, uniques = pd.factorize(df[column], sort=True)
+        codes[column] = np.where(column_codes < 0, len(uniques), column_codes).astype(np.int32)
+        values[column] = uniques
+
+    # Per-slice totals, acceptance rates and support thresholds
+    slice_total = np.bincount(slice_codes, minlength=n_slices)
+    slice_accept = np.bincount(slice_codes, weights=y, minlength=n_slices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baseline = slice_accept / slice_total
+    threshold = np.full(n_slices, float(min_support)) if min_support >= 1 else min_support * slice_total
+
+    # Row keys start as (response, slice); each column of a combination is appended as another digit
+    base_key = (y * n_slices + slice_codes).astype(np.int32)
+    buffer = np.empty(len(y), dtype=np.int32)
+
+    # Frequent cells per column combination: (frequent grid, total grid), each (slices, values...)
+    levels = {}
+    found = []
+    for order in range(1, max_order + 1):
+        # Candidate combinations grouped by their first columns, which share one row key
+        groups = {}
+        for combo in itertools.combinations(columns, order):
+            candidate = _candidate_cells(combo, values, n_slices, levels)
+            if candidate is not None:
+                groups.setdefault(combo[:-1], []).append((combo[-1], candidate))
+
+        for prefix, tails in groups.items():
+            prefix_key = base_key
+            for column in prefix:
+                prefix_key = prefix_key * (len(values[column]) + 1) + codes[column]
+            prefix_shape = (2, n_slices) + tuple(len(values[column]) + 1 for column in prefix)
+
+            # One bincount over a block of last columns; each combination's counts are a marginal of the block
+            for block in _blocks(tails, math.prod(prefix_shape)):
+                np.copyto(buffer, prefix_key)
+                for column, candidate in block:
+                    np.multiply(buffer, candidate.shape[-1], out=buffer)
+                    np.add(buffer, codes[column], out=buffer)
+                block_shape = prefix_shape + tuple(candidate.shape[-1] for _, candidate in block)
+                block_tallies = np.bincount(buffer, minlength=math.prod(block_shape)).reshape(block_shape)
+
+                for position, (column, candidate) in enumerate(block):
+                    others = tuple(len(prefix_shape) + i for i in range(len(block)) if i != position)
+                    tallies = block_tallies.sum(axis=others) if others else block_tallies
+                    combo = prefix + (column,)
+                    frequent, total = _frequent_cells(combo, candidate, tallies, threshold, levels)
+                    if frequent is None:
+                        continue
+                    levels[combo] = frequent, total
+                    positions = np.nonzero(frequent)
+                    found.append((combo, positions, total[positions], tallies[1][positions]))
+
+    return _rank_segments(found, values, slice_values, slice_by, baseline, confidence, rank_by, top)
+
+
+def _subsets(combo):
+    # The subsets of a combination that are one column smaller, with the position of the dropped column
+    if len(combo) == 1:
+        return []
+    return [(dropped, combo[:dropped] + combo[dropped + 1:]) for dropped in range(len(combo))]
+
+
+def _blocks(tails, prefix_cells):
+    # Splits the last columns of a prefix into runs whose joint count grid stays within BLOCK_CELLS
+    block, cells = [], prefix_cells
+    for tail in tails:
+        size = tail[1].shape[-1]
+        if block and cells * size > BLOCK_CELLS:
+            yield block
+            block, cells = [], prefix_cells
+        block.append(tail)
+        cells *= size
+    if block:
+        yield block
+
+
+def _frequent_cells(combo, candidate, tallies, threshold, levels):
+    # The candidate cells reaching the support threshold that narrow every subset; (None, None) when there are none
+    total = tallies[0] + tallies[1]
+    frequent = candidate & (total >= np.expand_dims(threshold, tuple(range(1, candidate.ndim))))
+    # Drop cells that select exactly the rows of one of their subsets
+    for dropped, subset in _subsets(combo):
+        frequent &= total != np.expand_dims(levels[subset][1], dropped + 1)
+    if not frequent.any():
+        return None, None
+    return frequent, total
+
+
+def _candidate_cells(combo, values, n_slices, levels):
+    # Apriori: a cell is a candidate only if every subset one column smaller is frequent; None when no cell is
+    shape = (n_slices,) + tuple(len(values[column]) + 1 for column in combo)
+    if 2 * math.prod(shape) > MAX_CELLS:
+        raise ValueError(f"Combination {combo} has too many value combinations to count; lower max_order or leave "
+                         f"out high-cardinality columns")
+    candidate = np.ones(shape, dtype=bool)
+    if len(combo) == 1:
+        # The missing-value code never forms a segment
+        candidate[:, -1] = False
+        return candidate
+    for dropped, subset in _subsets(combo):
+        if subset not in levels:
+            return None
+        candidate &= np.expand_dims(levels[subset][0], dropped + 1)
+    return candidate if candidate.any() else None
+
+
+def _rank_segments(found, values, slice_values, slice_by, baseline, confidence, rank_by, top):
+    # Scores every frequent segment with vectorized arithmetic, then labels only the ones returned
+    if not found:
+        columns = ([slice_by] if slice_by else []) + SEGMENT_COLUMNS
+        return pd.DataFrame(columns=columns)
+
+    slices = np.concatenate([positions[0] for _, positions, _, _ in found])
+    total = np.concatenate([counts for _, _, counts, _ in found]).astype(np.int64)
+    accept = np.concatenate([counts for _, _, _, counts in found]).astype(np.int64)
+    combo_ids = np.concatenate([np.full(len(counts), i) for i, (_, _, counts, _) in enumerate(found)])
+    offsets = np.concatenate([np.arange(len(counts)) for _, _, counts, _ in found])
+
+    rate = accept / total
+    low, high = wilson_interval(accept, total, confidence)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift = rate / baseline[slices]
+        lift_low = low / baseline[slices]
+    score = lift if rank_by == 'lift' else lift_low
+
+    # Best first within each slice, keeping the top rows of every slice
+    order = np.lexsort((-total, -score, slices))
+    if top is not None:
+        rank = np.arange(len(order)) - np.searchsorted(slices[order], slices[order])
+        order = order[rank < top]
+
+    records = []
+    for i in order:
+        combo, positions = found[combo_ids[i]][:2]
+        conditions = {column: _python_value(values[column][positions[level + 1][offsets[i]]])
+                      for level, column in enumerate(combo)}
+        slice_conditions = {slice_by: _python_value(slice_values[slices[i]])} if slice_by else {}
+        record = dict(slice_conditions)
+        record.update({
+            'segment': ', '.join(f'{column}={value}' for column, value in conditions.items()),
+            'filter': _query({**slice_conditions, **conditions}),
+            'conditions': {**slice_conditions, **conditions},
+            'order': len(combo),
+            'total_count': int(total[i]),
+            'accept_count': int(accept[i]),
+            'reject_count': int(total[i] - accept[i]),
+            'accept_percentage': rate[i] * 100,
+            'baseline_percentage': baseline[slices[i]] * 100,
+            'lift': lift[i],
+            'ci_low': low[i] * 100,
+            'ci_high': high[i] * 100,
+        })
+        records.append(record)
+    return pd.DataFrame(records, columns=([slice_by] if slice_by else []) + SEGMENT_COLUMNS)
+
+
+def segment_filters(segments):
+    """
+    Returns the filters and labels of mined segments, ready for create_stacked_bar_plot_with_filters.
+
+    Parameters:
+    - segments (DataFrame): Rows of the mine_segments result.
+
+    Returns:
+    - tuple: (filters, filter_labels), query strings and segment labels in the order of segments.
+    """
+    return list(segments['filter']), list(segments['segment'])
+
+
+def _python_value(value):
+    # numpy scalars become plain Python values, so queries and dicts read naturally
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _query(conditions):
+    # A DataFrame.query / BitmapIndex expression selecting the rows of a segment
+    terms = []
+    for column, value in conditions.items():
+        name = column if column.isidentifier() else f'`{column}`'
+        terms.append(f'{name} == {value!r}')
+    return ' and '.join(terms)
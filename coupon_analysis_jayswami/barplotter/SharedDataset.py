@@ -0,0 +1,438 @@
+"""
+SharedDataset Module
+--------------------
+
+Publishes an encoded coupon dataset once, for worker processes to attach to without copying it.
+
+A process pool that renders reports (render_many, ReportPipeline, PlotService) normally pickles `df_cleaned` into
+every task or worker, or has each worker re-read the CSV: memory grows with the worker count and each task pays
+for the serialization. A SharedDataset stores the dataset column by column in one block of shared memory
+(`multiprocessing.shared_memory`) or in a memory-mapped file:
+
+- categorical and text columns as int8/int16 category codes (-1 for missing values),
+- small integer columns (the 0/1 flags, temperature) as int8/int16 offsets from the column's minimum, so they serve
+  as codes too,
+- the `Y` vector as int8 values, -1 marking missing responses.
+
+Pickling a SharedDataset only pickles its name (or file path), so it can be passed as the data of any create_*
+call sent to a process pool. The worker attaches to the same memory once per process and counts straight from
+the shared code arrays, never copying them: `acceptance_table` and `acceptance_counts` combine the codes with
+np.bincount like AcceptanceStats does, and `where(...)` narrows the rows with a mask. String and boolean filters of
+create_stacked_bar_plot_with_filters are compiled by a BitmapIndex over `frame()`, a DataFrame of categoricals
+whose columns are views of the shared arrays (integer columns whose minimum is not 0 are shifted back to their
+values, which copies them once per process).
+
+The publishing process owns the memory: use it as a context manager, or call `unlink()` once the workers are done.
+A shared memory block is meant for the publisher's own worker pools; use `path=` to share a dataset with unrelated
+processes, which open it with `SharedDataset.open(path)`.
+
+Example usage:
+    with SharedDataset.publish(df_cleaned) as shared:
+        results = render_many([('create_subplot_grid', (shared.where(coupon='Coffee House'), columns_to_plot,
+                                                         'Coffee House Coupon Acceptance Rates', 45)),
+                               ('create_overall_stacked_bar_plot', ('Overall Acceptance Rate', shared))],
+                              executor='process')
+"""
+
+import atexit
+import hashlib
+import mmap
+import os
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceStats import (TARGET_COLUMN, _as_list, _target_codes, count_acceptance, encode_codes, table_from_counts,
+                             tally_groups)
+from BitmapIndex import BitmapIndex
+
+# Leading bytes of a shared dataset, followed by the layout length and the pickled layout
+MAGIC = b'CPNSHM02'
+
+# Every array starts on a cache line
+ALIGNMENT = 64
+
+# Datasets this process has attached to, by location, so every unpickled handle shares one mapping
+_attached = {}
+
+
+def _code_dtype(n_values):
+    # Smallest signed integer type holding the codes 0..n_values-1 and -1 for missing values
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _encode_column(series):
+    # (kind, array, details) of one column: small integer columns are stored as offsets from their minimum, every
+    # other column as category codes
+    values = series.to_numpy() if not isinstance(series.dtype, pd.CategoricalDtype) else None
+    if values is not None and values.dtype.kind in 'biu' and len(values):
+        low, high = int(values.min()), int(values.max())
+        if high - low < np.iinfo(np.int16).max:
+            offsets = (values - low).astype(_code_dtype(high - low + 1))
+            return 'values', offsets, {'low': low, 'high': high, 'dtype': series.dtype}
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        dtype = series.dtype
+        codes = series.cat.codes.to_numpy()
+    else:
+        codes, uniques = pd.factorize(series, sort=True)
+        dtype = pd.CategoricalDtype(uniques)
+    return 'codes', codes.astype(_code_dtype(len(dtype.categories))), {'dtype': dtype}
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class SharedView:
+    """
+    Rows of a SharedDataset matching equality conditions, usable wherever BarPlotter takes a DataFrame.
+
+    Parameters:
+    - dataset (SharedDataset): The published or attached dataset.
+    - conditions (dict, optional): Column name to value (or list of values). Default is None (all rows).
+    """
+
+    def __init__(self, dataset, conditions=None):
+        self.dataset = dataset
+        self.conditions = dict(conditions or {})
+        self._rows = None
+        self._index = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}(rows={len(self)}, conditions={self.conditions})'
+
+    def __reduce__(self):
+        # Pickles as the dataset's handle plus the conditions
+        return SharedView, (self.dataset, self.conditions)
+
+    def __len__(self):
+        if not self.conditions:
+            return self.dataset.n_rows
+        return int(np.count_nonzero(self._mask()))
+
+    @property
+    def columns(self):
+        return list(self.dataset.layout['columns'])
+
+    def where(self, conditions=None, **column_values):
+        """
+        Returns a narrower view with additional equality conditions.
+
+        Parameters:
+        - conditions (dict, optional): Mapping of column name to value (or list of values), for column names that
+          are not valid keyword arguments.
+        - **column_values: Column name to value conditions.
+
+        Returns:
+        - SharedView: The combined view.
+        """
+        combined = dict(self.conditions)
+        combined.update(conditions or {})
+        combined.update(column_values)
+        return SharedView(self.dataset, combined)
+
+    def acceptance_table(self, grouping_columns, ordering=None):
+        """
+        Computes acceptance counts and percentages for every category of the grouping column(s) of the view.
+
+        Parameters:
+        - grouping_columns (str or list): Column name(s) to group by.
+        - ordering (list, optional): Specific order for the categories. Default is None.
+
+        Returns:
+        - DataFrame: Same layout as AcceptanceStats.acceptance_table.
+        """
+        grouping_columns = _as_list(grouping_columns)
+        levels = [self.dataset._codes(column) for column in grouping_columns]
+        group_ids, index = encode_codes([codes for codes, _ in levels], [uniques for _, uniques in levels],
+                                        grouping_columns, self.dataset.n_rows, self._mask())
+        total, accept, reject = tally_groups(group_ids, self.dataset.target, len(index))
+        return table_from_counts(index, total, accept, reject, ordering)
+
+    def acceptance_counts(self, filter_condition=None):
+        """
+        Counts the rows of the view selected by a filter as (total_count, accept_count, reject_count).
+
+        Parameters:
+        - filter_condition (optional): None for all rows, a dict of column values, or a query string or boolean
+          mask as taken by create_stacked_bar_plot_with_filters. Default is None.
+        """
+        if filter_condition is None:
+            return count_acceptance(self.dataset.target, self._mask())
+        if isinstance(filter_condition, dict):
+            return self.where(filter_condition).acceptance_counts()
+        if self._index is None:
+            # Query strings and masks are compiled into bitsets once per view
+            self._index = BitmapIndex(self.frame())
+        return self._index.acceptance_counts(filter_condition)
+
+    def frame(self):
+        """
+        Returns the view as a DataFrame. The frame of a whole dataset shares the dataset's memory; a view with
+        conditions copies its rows.
+        """
+        if not self.conditions:
+            return self.dataset._frame()
+        return self.dataset._frame()[self._mask()].reset_index(drop=True)
+
+    def _mask(self):
+        # Boolean mask of the rows meeting every condition, None for the whole dataset
+        if not self.conditions:
+            return None
+        if self._rows is None:
+            rows = np.ones(self.dataset.n_rows, dtype=bool)
+            for column, value in self.conditions.items():
+                rows &= self.dataset._matches(column, value)
+            self._rows = rows
+        return self._rows
+
+
+class SharedDataset(SharedView):
+    """
+    An encoded dataset in shared memory or a memory-mapped file. Create one with `publish`, attach with `attach`
+    or `open`, or receive one pickled from the publishing process.
+    """
+
+    def __init__(self, location, buffer, handle, owner=False):
+        self.location = location
+        self.owner = owner
+        self._buffer = buffer
+        self._handle = handle
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"Not a shared coupon dataset: {location}")
+        size = int(np.frombuffer(buffer, np.uint64, 1, len(MAGIC))[0])
+        self.layout = pickle.loads(bytes(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + size]))
+        self.n_rows = self.layout['rows']
+        self.arrays = {}
+        for column, (kind, dtype, offset, details) in self.layout['columns'].items():
+            array = np.frombuffer(buffer, dtype, self.n_rows, offset)
+            array.flags.writeable = False
+            self.arrays[column] = array
+        self.target = self.arrays[self.layout['target_column']]
+        self._full_frame = None
+        super().__init__(self)
+
+    def __reduce__(self):
+        # Pickles as the location only; the receiving process attaches to the same memory
+        return _attach_location, (self.location,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.owner:
+            self.unlink()
+        self.close()
+
+    @classmethod
+    def publish(cls, df, columns=None, path=None, target_column=TARGET_COLUMN):
+        """
+        Encodes a DataFrame and publishes it in shared memory, or in a memory-mapped file when path is given.
+
+        Parameters:
+        - df (DataFrame): The data, e.g. df_cleaned or a typed frame from DataLoader.load_coupons.
+        - columns (list, optional): The columns to publish besides the target. Default is every column.
+        - path (str, optional): File to write the dataset to instead of shared memory. Default is None.
+        - target_column (str, optional): Name of the response column. Default is 'Y'.
+
+        Returns:
+        - SharedDataset: The published dataset, owned by this process.
+
+        Raises:
+        - ValueError: If the target column or a requested column is missing.
+        """
+        columns = list(df.columns) if columns is None else list(columns)
+        missing = [column for column in columns + [target_column] if column not in df.columns]
+        if missing:
+            raise ValueError(f"Columns missing from the dataset: {missing}")
+        if target_column not in columns:
+            columns.append(target_column)
+
+        encoded = {}
+        for column in columns:
+            if column == target_column:
+                encoded[column] = ('target', _target_codes(df[column].to_numpy()), {'dtype': np.dtype(np.int8)})
+            else:
+                encoded[column] = _encode_column(df[column])
+
+        # Lay the arrays out after the header; the header's size depends on the offsets, so they are padded
+        hasher = hashlib.sha1()
+        layout = {'rows': len(df), 'target_column': target_column, 'columns': {}}
+        offset = 0
+        for column, (kind, array, details) in encoded.items():
+            layout['columns'][column] = (kind, array.dtype, offset, details)
+            offset = _aligned(offset + array.nbytes)
+            hasher.update(repr((column, kind, str(array.dtype), details)).encode())
+            hasher.update(array.tobytes())
+        layout['fingerprint'] = hasher.hexdigest()
+        header_size = _aligned(len(MAGIC) + 8 + len(pickle.dumps(layout)) + 32 * len(encoded) + ALIGNMENT)
+        layout['columns'] = {column: (kind, dtype, array_offset + header_size, details)
+                             for column, (kind, dtype, array_offset, details) in layout['columns'].items()}
+        header = pickle.dumps(layout)
+        if len(MAGIC) + 8 + len(header) > header_size:
+            raise ValueError("The dataset layout does not fit its header")
+        size = max(header_size + offset, 1)
+
+        if path is None:
+            memory = shared_memory.SharedMemory(create=True, size=size)
+            _write(memory.buf, header, layout, encoded)
+            dataset = cls(('shm', memory.name), memory.buf, memory, owner=True)
+        else:
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb+') as file:
+                file.truncate(size)
+                with mmap.mmap(file.fileno(), size) as buffer:
+                    _write(buffer, header, layout, encoded)
+            os.replace(temp_path, path)
+            dataset = cls._open_file(path, owner=True)
+        _attached[dataset.location] = dataset
+        return dataset
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attaches to a dataset published in shared memory under the given name (the publisher's `name`).
+        """
+        return _attach_location(('shm', name))
+
+    @classmethod
+    def open(cls, path):
+        """
+        Opens a dataset published to a file, mapping it read-only.
+        """
+        return _attach_location(('file', os.path.abspath(path)))
+
+    @classmethod
+    def _open_file(cls, path, owner=False):
+        path = os.path.abspath(path)
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(('file', path), buffer, buffer, owner)
+
+    @property
+    def name(self):
+        """
+        Name of the shared memory block, or path of the file.
+        """
+        return self.location[1]
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def fingerprint(self):
+        """
+        Returns a hash of the encoded contents, computed when the dataset was published.
+        """
+        return self.layout['fingerprint']
+
+    def stats(self):
+        """
+        Returns the location, rows, columns and bytes of the dataset as a dict.
+        """
+        return {'location': self.location[0], 'name': self.name, 'rows': self.n_rows,
+                'columns': len(self.arrays), 'nbytes': self.nbytes, 'owner': self.owner}
+
+    def close(self):
+        """
+        Detaches this process from the dataset. Frames and arrays taken from it must not be used afterwards.
+        """
+        _attached.pop(self.location, None)
+        self._full_frame = self._index = None
+        self.arrays = {}
+        self.target = None
+        try:
+            self._handle.close()
+        except BufferError:
+            # Arrays still referenced elsewhere keep the mapping alive until they are released
+            pass
+
+    def unlink(self):
+        """
+        Removes the shared memory block or file; processes already attached keep their mapping.
+        """
+        if self.location[0] == 'shm':
+            try:
+                self._handle.unlink()
+            except FileNotFoundError:
+                pass
+        elif os.path.exists(self.location[1]):
+            os.remove(self.location[1])
+
+    def _codes(self, column):
+        # (codes, uniques) of a column in the form encode_codes takes
+        if column not in self.arrays:
+            raise ValueError(f"Column not in the shared dataset: {column}")
+        return self.arrays[column], self._uniques(column)
+
+    def _uniques(self, column):
+        # The labels of a column's codes: its categories, the values low..high, or the 0/1 responses
+        kind, _, _, details = self.layout['columns'][column]
+        if kind == 'codes':
+            dtype = details['dtype']
+            return pd.Categorical.from_codes(np.arange(len(dtype.categories)), dtype=dtype)
+        if kind == 'values':
+            return pd.Index(np.arange(details['low'], details['high'] + 1).astype(details['dtype']))
+        return pd.Index(np.arange(2).astype(details['dtype']))
+
+    def _matches(self, column, value):
+        # Boolean mask of the rows whose column equals value (or one of a list of values)
+        if column not in self.arrays:
+            raise ValueError(f"Column not in the shared dataset: {column}")
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        codes = pd.Index(self._uniques(column)).get_indexer(values)
+        return np.isin(self.arrays[column], codes[codes >= 0])
+
+    def _frame(self):
+        # The whole dataset as a DataFrame whose columns are views of the shared arrays
+        if self._full_frame is None:
+            columns = {}
+            for column, (kind, _, _, details) in self.layout['columns'].items():
+                array = self.arrays[column]
+                if kind == 'codes':
+                    columns[column] = pd.Categorical.from_codes(array, dtype=details['dtype'], validate=False)
+                elif kind == 'values' and details['low'] != 0:
+                    columns[column] = array.astype(np.int32) + details['low']
+                else:
+                    columns[column] = array
+            self._full_frame = pd.DataFrame(columns, copy=False)
+        return self._full_frame
+
+
+def _write(buffer, header, layout, encoded):
+    # Writes the header and every encoded array into a freshly created buffer
+    buffer[:len(MAGIC)] = MAGIC
+    np.frombuffer(buffer, np.uint64, 1, len(MAGIC))[0] = len(header)
+    buffer[len(MAGIC) + 8:len(MAGIC) + 8 + len(header)] = header
+    for column, (_, array, _) in encoded.items():
+        offset = layout['columns'][column][2]
+        np.frombuffer(buffer, array.dtype, len(array), offset)[:] = array
+
+
+def _attach_location(location):
+    # Attaches to a shared memory block or file once per process; also used to unpickle datasets
+    dataset = _attached.get(location)
+    if dataset is None:
+        if location[0] == 'file':
+            dataset = SharedDataset._open_file(location[1])
+        else:
+            try:
+                # Python 3.13+: an attaching process must not unlink the block when it exits
+                memory = shared_memory.SharedMemory(name=location[1], track=False)
+            except TypeError:
+                memory = shared_memory.SharedMemory(name=location[1])
+            dataset = SharedDataset(location, memory.buf, memory)
+        _attached[location] = dataset
+    return dataset
+
+
+@atexit.register
+def _close_attached():
+    # Releases the arrays before the interpreter tears the mappings down, which would otherwise fail noisily
+    for dataset in list(_attached.values()):
+        dataset.close()
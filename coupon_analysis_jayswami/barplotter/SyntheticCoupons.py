@@ -0,0 +1,122 @@
+"""
+SyntheticCoupons Module
+-----------------------
+
+Scalable synthetic data modeled on data/coupons.csv, for benchmarking BarPlotter from 12.7k rows up to 100M.
+
+A SyntheticCoupons model is fitted to a source file and records, for every column, its set of values (missing
+values included) and the distribution of those values among accepted and among rejected offers. Rows are sampled by
+drawing Y with the source acceptance rate and then every column from its distribution given Y. This keeps each
+column's value set, value frequencies and per-value acceptance rate of the source (up to sampling noise). Columns
+are drawn independently given Y, so joint patterns between columns are not reproduced.
+
+String columns are generated as categoricals and numeric ones with the smallest fitting integer dtype, so 100M rows
+can be streamed in chunks (`iter_chunks`) straight into the BarPlotter functions without building one huge frame.
+
+Example usage:
+    model = SyntheticCoupons.fit('../data/coupons.csv')
+    df_1m = model.sample(1_000_000, seed=0)
+    image64, results_df = create_subplot_grid(model.iter_chunks(100_000_000), columns_to_plot, 'Scaled', 45)
+"""
+
+import numpy as np
+import pandas as pd
+
+from AcceptanceStats import TARGET_COLUMN
+
+
+class SyntheticCoupons:
+    """
+    Per-column value distributions given the response, fitted to a coupons dataset.
+
+    Parameters:
+    - columns (dict): Column name to (values, probabilities) where probabilities has shape (2, len(values)): row 0
+      holds the distribution among rejected offers, row 1 among accepted ones. A missing value is stored as NaN.
+    - accept_rate (float): Share of accepted offers.
+    - target_column (str, optional): Name of the response column. Default is 'Y'.
+    """
+
+    def __init__(self, columns, accept_rate, target_column=TARGET_COLUMN):
+        self.columns = columns
+        self.accept_rate = accept_rate
+        self.target_column = target_column
+
+    @classmethod
+    def fit(cls, source, target_column=TARGET_COLUMN):
+        """
+        Fits the model to a DataFrame or the path of a CSV file in the coupons.csv schema.
+
+        Returns:
+        - SyntheticCoupons: The fitted model.
+        """
+        df = pd.read_csv(source) if isinstance(source, str) else source
+        y = df[target_column].to_numpy()
+        if not np.isin(y, [0, 1]).all():
+            raise ValueError(f"Column '{target_column}' must only hold 0 and 1 to fit a model")
+
+        columns = {}
+        for column in df.columns:
+            if column == target_column:
+                continue
+            codes, values = pd.factorize(df[column], sort=True, use_na_sentinel=False)
+            probabilities = np.zeros((2, len(values)))
+            for response in (0, 1):
+                tallies = np.bincount(codes[y == response], minlength=len(values))
+                probabilities[response] = tallies / max(tallies.sum(), 1)
+            columns[column] = (values, probabilities)
+        return cls(columns, float(y.mean()), target_column)
+
+    def sample(self, n_rows, seed=None):
+        """
+        Draws n_rows synthetic offers.
+
+        Parameters:
+        - n_rows (int): Number of rows.
+        - seed (int, optional): Seed for a reproducible sample. Default is None.
+
+        Returns:
+        - DataFrame: Categorical string columns, integer numeric columns and an int8 target column.
+        """
+        return self._sample(n_rows, np.random.default_rng(seed))
+
+    def iter_chunks(self, n_rows, chunksize=1_000_000, seed=0):
+        """
+        Yields n_rows synthetic offers as DataFrame chunks with a continuing RangeIndex.
+
+        The chunks are generated lazily, so memory stays bounded by the chunk size however many rows are requested.
+        Every call with the same seed yields the same rows.
+        """
+        rng = np.random.default_rng(seed)
+        for start in range(0, n_rows, chunksize):
+            chunk = self._sample(min(chunksize, n_rows - start), rng)
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            yield chunk
+
+    def _sample(self, n_rows, rng):
+        y = (rng.random(n_rows) < self.accept_rate).astype(np.int8)
+        accepted = y == 1
+        data = {}
+        for column, (values, probabilities) in self.columns.items():
+            codes = np.empty(n_rows, dtype=np.int64)
+            for response, rows in ((0, ~accepted), (1, accepted)):
+                # Inverse-CDF sampling of the value codes for rows with this response
+                cumulative = np.cumsum(probabilities[response])
+                draws = rng.random(int(rows.sum())) * cumulative[-1]
+                codes[rows] = np.minimum(np.searchsorted(cumulative, draws, side='right'), len(values) - 1)
+            data[column] = _column_from_codes(codes, values)
+        data[self.target_column] = y
+        return pd.DataFrame(data)
+
+
+def _column_from_codes(codes, values):
+    # Numeric columns keep compact integer values, everything else becomes a categorical (NaN stays missing)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        small = np.asarray(values)
+        dtype = np.result_type(np.min_scalar_type(small.min()), np.min_scalar_type(small.max()))
+        return small.astype(dtype).take(codes)
+    missing = pd.isna(values)
+    categories = values[~missing]
+    # Map codes onto the categories without the missing value, which becomes code -1
+    remap = np.cumsum(~missing) - 1
+    remap[missing] = -1
+    return pd.Categorical.from_codes(remap[codes], categories=categories)
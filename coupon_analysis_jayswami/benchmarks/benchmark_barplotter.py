@@ -0,0 +1,369 @@
+"""
+BarPlotter Benchmarks
+---------------------
+
+Measures how the BarPlotter functions scale, from aggregation through rendering and encoding, on synthetic data
+generated by SyntheticCoupons from data/coupons.csv.
+
+For every case and row count the suite reports per-call latency percentiles (p50/p90/p99/max), the wall time of all
+timed calls and the peak memory allocated during one call (tracemalloc, measured in a separate untimed run). Results
+can be saved as a JSON baseline and later runs compared against it, failing with exit status 1 when a case's median
+latency regresses beyond the tolerance.
+
+When the pooled cases are selected, a pooled chart refreshed with new counts is also checked to get the same y-axis
+limits as a chart drawn afresh; a mismatch fails the run as well.
+
+Row counts above --max-in-memory are streamed to the functions as chunks instead of being materialized, so runs up to
+100M rows only need memory for one chunk; cases that need an in-memory DataFrame are skipped at those sizes.
+
+Example usage (from the project root):
+    python benchmarks/benchmark_barplotter.py --rows 12684 1000000 --save-baseline benchmarks/baseline.json
+    python benchmarks/benchmark_barplotter.py --rows 12684 1000000 --baseline benchmarks/baseline.json
+    python benchmarks/benchmark_barplotter.py --rows 100000000 --repeat 1 --cases 'grid|overall'
+    python benchmarks/benchmark_barplotter.py --rows 12684 1000000 10000000 --cases 'grid.cached'
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'barplotter'))
+
+import BarPlotter  # noqa: E402
+from AcceptanceCube import AcceptanceCube  # noqa: E402
+from AcceptanceSketch import AcceptanceSketch  # noqa: E402
+from AcceptanceStats import acceptance_table  # noqa: E402
+from BitmapIndex import BitmapIndex  # noqa: E402
+from CountStore import CountStore  # noqa: E402
+from DataCleaner import clean_coupons  # noqa: E402
+from Engines import available_engines, open_source  # noqa: E402
+from FigurePool import FigurePool  # noqa: E402
+from RenderCache import RenderCache  # noqa: E402
+from SegmentMiner import mine_segments  # noqa: E402
+from SharedDataset import SharedDataset  # noqa: E402
+from SyntheticCoupons import SyntheticCoupons  # noqa: E402
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'coupons.csv')
+
+# Columns plotted by the cases, as in the notebooks
+GRID_COLUMNS = ['expiration', 'destination', 'direction_same', 'weather', 'time', 'temperature']
+TIME_ORDER = ['7AM', '10AM', '2PM', '6PM', '10PM']
+PASSENGERS = ['Alone', 'Friend(s)', 'Partner', 'Kid(s)']
+
+
+def build_cases(model, n_rows, max_in_memory, chunksize, resources):
+    """
+    Returns the benchmark cases for one row count as (name, function) pairs; each function performs one call.
+
+    Fixtures (the sample, cubes, indexes, files, ...) are built on the first call of a case that uses them, which is
+    the untimed warm-up call, so only the selected cases pay for theirs.
+
+    Parameters:
+    - model (SyntheticCoupons): The data generator.
+    - n_rows (int): Number of synthetic rows.
+    - max_in_memory (int): Largest row count that is materialized as one DataFrame.
+    - chunksize (int): Rows per chunk when streaming.
+    - resources (ExitStack): Owns the temporary files and shared datasets of the fixtures; closing it removes them.
+    """
+    # The raw file spells the column 'passanger', the cleaned one 'passenger'
+    passenger = 'passenger' if 'passenger' in model.columns else 'passanger'
+    filters = [None] + [f"coupon == 'Coffee House' and {passenger} == '{value}'" for value in PASSENGERS]
+    filter_labels = ['All'] + PASSENGERS
+
+    if n_rows > max_in_memory:
+        # Streamed: every call regenerates the chunks, so the time includes generating them
+        def source():
+            return model.iter_chunks(n_rows, chunksize)
+
+        return [
+            ('acceptance_table', lambda: BarPlotter.stacked_bar_plot_multi_results(['coupon', 'age'], source())),
+            ('subplot_grid_results', lambda: BarPlotter.subplot_grid_results(source(), GRID_COLUMNS)),
+            ('filters_results', lambda: BarPlotter.stacked_bar_plot_with_filters_results(filters, filter_labels,
+                                                                                       source())),
+            ('create_subplot_grid', lambda: BarPlotter.create_subplot_grid(source(), GRID_COLUMNS, 'Grid', 45)),
+            ('create_overall_stacked_bar_plot', lambda: BarPlotter.create_overall_stacked_bar_plot('Overall',
+                                                                                                 source())),
+        ]
+
+    # Each fixture is built once, on first use
+    df = functools.cache(lambda: model.sample(n_rows, seed=0))
+    coffee_df = functools.cache(lambda: df()[df()['coupon'] == 'Coffee House'])
+    df_list = functools.cache(lambda: [coffee_df()[coffee_df()[passenger] == value] for value in PASSENGERS])
+    cube = functools.cache(lambda: AcceptanceCube(df(), slice_by='coupon'))
+    index = functools.cache(lambda: BitmapIndex(df()))
+    workdir = functools.cache(lambda: resources.enter_context(tempfile.TemporaryDirectory()))
+    shared = functools.cache(lambda: resources.enter_context(
+        SharedDataset.publish(df(), path=os.path.join(workdir(), 'shared.bin'))))
+
+    @functools.cache
+    def csv_path():
+        path = os.path.join(workdir(), 'coupons.csv')
+        df().to_csv(path, index=False)
+        return path
+
+    @functools.cache
+    def cached_grid():
+        grid = RenderCache().wrap(BarPlotter.create_subplot_grid)
+        grid(df(), GRID_COLUMNS, 'Grid', 45)
+        return grid
+
+    @functools.cache
+    def pool():
+        figure_pool = FigurePool()
+        BarPlotter.create_subplot_grid(df(), GRID_COLUMNS, 'Grid', 45, pool=figure_pool)
+        return figure_pool
+
+    def publish_shared():
+        with SharedDataset.publish(df()) as published:
+            return published.nbytes
+
+    def render_figure(image_format, compress_level=None):
+        fig = BarPlotter._new_figure(figsize=(12, 8))
+        BarPlotter._draw_stacked_bars(fig.add_subplot(), ['Overall'],
+                                      BarPlotter.overall_stacked_bar_plot_results(df()))
+        return BarPlotter.save_figure(fig, image_format=image_format, compress_level=compress_level)
+
+    def legacy_pyplot():
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(12, 8))
+        plt.bar(['Overall'], [len(df())])
+        return BarPlotter.save_plot_as_base64(io.BytesIO(), plt)
+
+    def count_store_append():
+        path = os.path.join(workdir(), 'counts.pkl')
+        if os.path.exists(path):
+            os.remove(path)
+        batch = df().iloc[:max(n_rows // 10, 1)]
+        return CountStore(path, [('coupon', column) for column in GRID_COLUMNS]).append(batch)
+
+    def render_specs():
+        specs = [('create_subplot_grid', (df(), GRID_COLUMNS, 'Grid', 45)),
+                 ('create_stacked_bar_plot_multi', (['coupon', 'age'], 'Multi', df(), 45))] * 2
+        return BarPlotter.render_many(specs)
+
+    def engine_case(engine):
+        source = functools.cache(lambda: open_source(csv_path(), engine=engine))
+        return f'subplot_grid_results.{engine}_csv', lambda: BarPlotter.subplot_grid_results(source(), GRID_COLUMNS)
+
+    engine_cases = [engine_case(engine) for engine in available_engines()]
+
+    return [
+        # Aggregation
+        ('acceptance_table', lambda: acceptance_table(df(), ['coupon', 'age'])),
+        ('AcceptanceCube.build', lambda: AcceptanceCube(df(), columns=GRID_COLUMNS + [passenger], slice_by='coupon')),
+        ('AcceptanceCube.lookup', lambda: cube().where(coupon='Coffee House').acceptance_table('time', TIME_ORDER)),
+        ('AcceptanceSketch.build', lambda: AcceptanceSketch.from_source(df(), ['occupation', 'income', 'age',
+                                                                               passenger])),
+        ('BitmapIndex.filters', lambda: [BitmapIndex(df()).acceptance_counts(f) for f in filters]),
+        ('BitmapIndex.filters_reused', lambda: [index().acceptance_counts(f) for f in filters]),
+        ('CountStore.append_10pct', count_store_append),
+        ('SharedDataset.publish', publish_shared),
+        ('subplot_grid_results', lambda: BarPlotter.subplot_grid_results(df(), GRID_COLUMNS)),
+        ('subplot_grid_results.shared', lambda: BarPlotter.subplot_grid_results(shared(), GRID_COLUMNS)),
+        ('filters_results', lambda: BarPlotter.stacked_bar_plot_with_filters_results(filters, filter_labels, df())),
+        ('facets_results', lambda: BarPlotter.subplot_grid_facets_results(coffee_df(), passenger, 'time', PASSENGERS,
+                                                                          TIME_ORDER)),
+        *engine_cases,
+        ('mine_segments', lambda: mine_segments(df(), max_order=3)),
+        ('clean_coupons', lambda: clean_coupons(df())),
+        # Render and encode
+        ('create_stacked_bar_plot', lambda: BarPlotter.create_stacked_bar_plot('age', 'Age', df(), 45)),
+        ('create_stacked_bar_plot_multi', lambda: BarPlotter.create_stacked_bar_plot_multi(['coupon', 'age'],
+                                                                                           'Multi', df(), 45)),
+        ('create_stacked_bar_plot_multi.top20',
+         lambda: BarPlotter.create_stacked_bar_plot_multi(['occupation', 'income'], 'Multi', df(), 45, top=20)),
+        ('create_stacked_bar_plot_multi.page',
+         lambda: BarPlotter.create_stacked_bar_plot_multi(['occupation', 'income'], 'Multi', df(), 45,
+                                                          page_size=20)[0][0]),
+        ('create_subplot_grid', lambda: BarPlotter.create_subplot_grid(df(), GRID_COLUMNS, 'Grid', 45)),
+        ('create_subplot_grid.cube', lambda: BarPlotter.create_subplot_grid(cube().where(coupon='Coffee House'),
+                                                                            GRID_COLUMNS, 'Grid', 45)),
+        ('create_subplot_grid.cached', lambda: cached_grid()(df(), GRID_COLUMNS, 'Grid', 45)),
+        ('create_subplot_grid.pooled', lambda: BarPlotter.create_subplot_grid(df(), GRID_COLUMNS, 'Grid', 45,
+                                                                              pool=pool())),
+        ('create_subplot_grid.plotly', lambda: BarPlotter.create_subplot_grid(df(), GRID_COLUMNS, 'Grid', 45,
+                                                                              backend='plotly')),
+        ('create_overall_stacked_bar_plot', lambda: BarPlotter.create_overall_stacked_bar_plot('Overall', df())),
+        ('create_stacked_bar_plot_with_filters',
+         lambda: BarPlotter.create_stacked_bar_plot_with_filters(filters, filter_labels, 'Filters', None, df(), 45)),
+        ('create_subplot_grid_dflist', lambda: BarPlotter.create_subplot_grid_dflist(df_list(), 'time', 'Passengers',
+                                                                                     PASSENGERS, 0, 'linear',
+                                                                                     TIME_ORDER)),
+        ('create_subplot_grid_facets', lambda: BarPlotter.create_subplot_grid_facets(coffee_df(), passenger, 'time',
+                                                                                     'Passengers', PASSENGERS, 0,
+                                                                                     'linear', TIME_ORDER)),
+        ('save_figure.png', lambda: render_figure('png')),
+        ('save_figure.png_level1', lambda: render_figure('png', 1)),
+        ('save_figure.webp', lambda: render_figure('webp')),
+        ('save_figure.svg', lambda: render_figure('svg')),
+        ('save_plot_as_base64', legacy_pyplot),
+        ('render_many.thread_x4', render_specs),
+    ]
+
+
+def measure(function, repeat, warmup=1):
+    """
+    Times repeated calls of a function and measures the peak memory of one call.
+
+    Returns:
+    - dict: Latency percentiles and max in seconds, the total wall time of the timed calls and the peak memory in
+      bytes.
+    """
+    for _ in range(warmup):
+        function()
+
+    latencies = []
+    wall_start = time.perf_counter()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+
+    # Peak memory in a separate run: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {'calls': repeat, 'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': max(latencies),
+            'wall': wall, 'peak_bytes': int(peak)}
+
+
+def check_pooled_limits(df, column='time'):
+    """
+    Compares the y-axis limits of a pooled chart refreshed with new counts against a chart drawn afresh, so the
+    pooled cases time renders that look the same.
+
+    Returns:
+    - list: (yscale, pooled limits, fresh limits) for every mismatch.
+    """
+    template = acceptance_table(df.iloc[:max(len(df) // 10, 1)], column)
+    counts = acceptance_table(df, column)
+    mismatches = []
+    for yscale in ('linear', 'log'):
+        axes = []
+        for table in (template, counts):
+            fig = BarPlotter._new_figure(figsize=(12, 8))
+            axes.append(fig.add_subplot())
+            BarPlotter._draw_stacked_bars(axes[-1], [str(label) for label in table.index], table)
+            BarPlotter.save_figure(fig, yscale=yscale)
+        pool = FigurePool()
+        pool.checkin('check', axes[0].figure)
+        pooled = BarPlotter._pooled_figure(pool, 'check', [counts])
+        BarPlotter.save_figure(pooled, yscale=yscale, relayout=False)
+        pooled_limits, fresh_limits = pooled.axes[0].get_ylim(), axes[1].get_ylim()
+        if not np.allclose(pooled_limits, fresh_limits):
+            mismatches.append((yscale, pooled_limits, fresh_limits))
+    return mismatches
+
+
+def environment():
+    """
+    Returns the interpreter, library versions and machine a run was made on, stored with baselines.
+    """
+    import matplotlib
+    import pandas as pd
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__, 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpus': os.cpu_count()}
+
+
+def compare(results, baseline, tolerance, noise_floor):
+    """
+    Lists the cases whose median latency grew by more than tolerance (a fraction) and noise_floor (seconds).
+
+    Returns:
+    - list: (key, baseline p50, current p50) for every regression.
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get('results', {}).get(key)
+        if previous is None:
+            continue
+        if current['p50'] > previous['p50'] * (1 + tolerance) and current['p50'] - previous['p50'] > noise_floor:
+            regressions.append((key, previous['p50'], current['p50']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[12684], help='Row counts to benchmark.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed calls per case.')
+    parser.add_argument('--cases', default=None, help='Regular expression selecting case names.')
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help='CSV file the synthetic data is modeled on.')
+    parser.add_argument('--max-in-memory', type=int, default=20_000_000,
+                        help='Largest row count materialized as one DataFrame; larger runs are streamed.')
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help='Rows per chunk when streaming.')
+    parser.add_argument('--save-baseline', default=None, help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', default=None, help='Compare against this JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p50 slowdown as a fraction.')
+    parser.add_argument('--noise-floor', type=float, default=0.002,
+                        help='p50 increases below this many seconds never count as regressions.')
+    args = parser.parse_args(argv)
+
+    model = SyntheticCoupons.fit(args.source)
+    pattern = re.compile(args.cases) if args.cases else None
+    results = {}
+
+    print(f"{'case':<42}{'rows':>12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'wall s':>9}"
+          f"{'peak MB':>9}")
+    for n_rows in args.rows:
+        # Temporary files and shared datasets of this row count's fixtures are removed once its cases have run
+        with contextlib.ExitStack() as resources:
+            cases = build_cases(model, n_rows, args.max_in_memory, args.chunksize, resources)
+            for name, function in cases:
+                if pattern and not pattern.search(name):
+                    continue
+                stats = measure(function, args.repeat)
+                stats['rows'] = n_rows
+                results[f'{n_rows}/{name}'] = stats
+                print(f"{name:<42}{n_rows:>12}{stats['p50'] * 1e3:>10.1f}{stats['p90'] * 1e3:>10.1f}"
+                      f"{stats['p99'] * 1e3:>10.1f}{stats['max'] * 1e3:>10.1f}{stats['wall']:>9.2f}"
+                      f"{stats['peak_bytes'] / 2 ** 20:>9.1f}", flush=True)
+
+    status = 0
+    if not pattern or pattern.search('pooled'):
+        mismatches = check_pooled_limits(model.sample(min(args.rows), seed=1))
+        for yscale, pooled, fresh in mismatches:
+            print(f'POOLED LIMITS ({yscale}): {pooled[0]:.1f}..{pooled[1]:.1f}, '
+                  f'drawn afresh {fresh[0]:.1f}..{fresh[1]:.1f}')
+        if mismatches:
+            status = 1
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance, args.noise_floor)
+        for key, previous, current in regressions:
+            print(f'REGRESSION {key}: p50 {previous * 1e3:.1f} ms -> {current * 1e3:.1f} ms '
+                  f'({current / previous - 1:+.0%})')
+        if regressions:
+            status = 1
+        else:
+            print(f'No regressions against {args.baseline}')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.save_baseline}')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())